@@ -3,22 +3,55 @@ load_dotenv()
 
 import os
 import json
-try:
-    from rag.gemini_fs import GeminiFileSearchManager
-except Exception:
+if os.getenv("RAG_CLIENT", "sdk").lower() == "async":
+    from rag.file_search_async import SyncFileSearchAdapter as GeminiFileSearchManager
+elif os.getenv("RAG_CLIENT", "sdk").lower() == "rest":
     from rag.file_search_rest import GeminiFileSearchREST as GeminiFileSearchManager
+else:
+    try:
+        from rag.gemini_fs import GeminiFileSearchManager
+    except Exception:
+        from rag.file_search_rest import GeminiFileSearchREST as GeminiFileSearchManager
+from rag.ingest_manifest import sync_document
+from rag.store_leader import init_store_once
+from rag.spec_catalog import SpecCatalog, answer_spec, compare_specs, detect_spec_field
+from rag.model_resolver import ModelResolver
+from rag.catalog_query import parse_catalog_query, run_catalog_query
+from rag.llm_scheduler import SCHEDULER, SchedulerBusy
+from rag.hedging import CircuitBreaker, HedgedCall
+from intent_matcher import INTENT_MATCHER, TASK_INTENTS
+from history_store import create_history_store
+from metrics import METRICS
+from tracing import span
 import sys
 import re
+import threading
+import contextvars
 from datetime import datetime
 from groq import Groq
 
+# Destino dos pedaços de resposta transmitidos durante a mensagem atual (None = sem streaming)
+_stream_sink = contextvars.ContextVar("stream_sink", default=None)
+
+# Enviado quando a resposta transmitida em partes falha no meio (o início já chegou ao cliente)
+STREAM_CUT_NOTICE = "⚠️ Tive um problema para terminar essa resposta. Se faltou alguma informação, é só perguntar de novo."
+
+# Fim de frase seguido de espaço, ou quebra de parágrafo
+_CHUNK_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\n\s*\n")
+
 class AIAgent:
-    def __init__(self):
+    def __init__(self, warmup_async: bool = True):
         self.file_search = GeminiFileSearchManager()
-        self.conversation_histories = {}
         groq_key = os.environ.get("GROQ_API_KEY")
         self.groq = Groq(api_key=groq_key) if groq_key else None
         self.groq_model = "llama-3.1-70b-versatile"
+        # Gemini demorando além do orçamento dispara a Groq em paralelo; disjuntores por provedor
+        self.gemini_breaker = CircuitBreaker("gemini")
+        self.groq_breaker = CircuitBreaker("groq")
+        self.hedge = HedgedCall(self.gemini_breaker, self.groq_breaker)
+        # Respostas do RAG enviadas em pedaços enquanto são geradas (opt-in)
+        self.stream_replies = os.getenv("STREAM_REPLIES", "0").lower() in ("1", "true", "yes")
+        self.stream_min_chars = int(os.getenv("STREAM_MIN_CHARS", "120"))
         self.system_prompt = f"""
 Você é Renato Tanner, vendedor especialista da PHONES PARAGUAY, atendendo via WhatsApp.
 
@@ -34,84 +67,184 @@ Guardrails técnicos (NUNCA violar):
 
 Data: {datetime.now().strftime('%d/%m/%Y')}.
 """
+        self.conversation_histories = create_history_store(self.system_prompt)
+        # Catálogo local extraído do PDF: responde fichas técnicas sem chamar a Gemini
+        self.catalog = SpecCatalog.from_pdf(os.path.abspath("celularrag.pdf"))
+        self.model_resolver = ModelResolver.from_catalog(self.catalog)
+        # Inicialização do File Search em segundo plano: saudações e handlers
+        # locais respondem imediatamente enquanto a store é preparada
+        self.rag_status = "warming"
+        self.rag_ready = threading.Event()
+        self.rag_warmup_wait = float(os.getenv("RAG_WARMUP_WAIT", "20"))
+        if warmup_async:
+            threading.Thread(target=self._init_file_search, name="rag-warmup", daemon=True).start()
+        else:
+            self._init_file_search()
+
+    def _init_file_search(self) -> None:
         try:
             print("\n--- INICIALIZANDO FILE SEARCH ---", file=sys.stderr)
-            store_name = self.file_search.ensure_store(display_name="celulares-fichas-tecnicas")
-            pdf_path = os.path.abspath("celularrag.pdf")
-            if os.path.exists(pdf_path):
-                print(f"📄 Encontrado: {pdf_path}", file=sys.stderr)
-                self.file_search.upload_file(pdf_path, "celularrag.pdf")
+            if os.getenv("DEPLOY_MODE", "single").lower() == "prefork":
+                # Vários workers: só o líder eleito por trava de arquivo faz a ingestão
+                init_store_once(self.file_search, self._ingest_knowledge_base)
             else:
-                print(f"⚠️  Arquivo 'celularrag.pdf' não encontrado no diretório.", file=sys.stderr)
+                self._ingest_knowledge_base()
+            self.rag_status = "ready"
             print("--- FILE SEARCH PRONTO ---\n", file=sys.stderr)
         except Exception as e:
+            self.rag_status = "failed"
             print(f"🚨 CRÍTICO: Falha ao inicializar o File Search (RAG): {e}", file=sys.stderr)
             # A aplicação pode continuar, mas o RAG não funcionará.
-            pass
+        finally:
+            self.rag_ready.set()
+
+    def _ingest_knowledge_base(self) -> None:
+        store_name = self.file_search.ensure_store(display_name="celulares-fichas-tecnicas")
+        pdf_path = os.path.abspath("celularrag.pdf")
+        if os.path.exists(pdf_path):
+            print(f"📄 Encontrado: {pdf_path}", file=sys.stderr)
+            sync_document(self.file_search, pdf_path, "celularrag.pdf")
+        else:
+            print(f"⚠️  Arquivo 'celularrag.pdf' não encontrado no diretório.", file=sys.stderr)
+
+    def _wait_for_rag(self) -> bool:
+        """Retorna False se o RAG ainda está aquecendo e a mensagem deve ir para o fallback."""
+        if self.rag_ready.is_set():
+            return True
+        if self.groq:
+            return False
+        # Sem fallback: segura a mensagem até a store ficar pronta
+        return self.rag_ready.wait(self.rag_warmup_wait)
+
+    def _groq_complete(self, history) -> str:
+        # O histórico da sessão já inclui a mensagem atual do usuário
+        msgs = history.messages()
+        with span("groq"):
+            comp = SCHEDULER.call("groq", self.groq.chat.completions.create, messages=msgs, model=self.groq_model, max_tokens=512)
+        return comp.choices[0].message.content
+
+    def _groq_reply(self, history, user_message: str) -> dict | None:
+        if not self.groq or not self.groq_breaker.allow():
+            METRICS.inc("fallback_groq_total", resultado="indisponivel")
+            return None
+        try:
+            txt = self._groq_complete(history)
+        except SchedulerBusy:
+            self.groq_breaker.record_neutral()
+            METRICS.inc("fallback_groq_total", resultado="fila_cheia")
+            return None
+        except Exception:
+            self.groq_breaker.record_failure()
+            METRICS.inc("fallback_groq_total", resultado="erro")
+            return None
+        self.groq_breaker.record_success()
+        METRICS.inc("fallback_groq_total", resultado="ok")
+        return {"tipo": "texto", "conteudo": txt}
+
+    def _stream_chunks(self, deltas):
+        """Agrupa os trechos do modelo em frases/parágrafos com pelo menos `stream_min_chars`."""
+        buffer = ""
+        for delta in deltas:
+            buffer += delta
+            while True:
+                cut = next((m for m in _CHUNK_BOUNDARY.finditer(buffer)
+                            if m.start() >= self.stream_min_chars or "\n" in m.group()), None)
+                if not cut:
+                    break
+                chunk, buffer = buffer[:cut.start()].strip(), buffer[cut.end():]
+                if chunk:
+                    yield chunk
+        if buffer.strip():
+            yield buffer.strip()
+
+    def _rag_query(self, pergunta: str, history=None) -> str | None:
+        """Consulta o File Search; com Groq configurada, usa hedge e disjuntores."""
+        with span("file_search"):
+            texto, origem = self._rag_answer(pergunta, history)
+        METRICS.inc("rag_respostas_total", origem=origem or "sem_resposta")
+        return texto
+
+    def _rag_answer(self, pergunta: str, history) -> tuple[str | None, str | None]:
+        sink = _stream_sink.get()
+        if sink and self.stream_replies and hasattr(self.file_search, "query_stream"):
+            # Streaming: cada pedaço completo já sai para o cliente; sem hedge nesse modo
+            chunks = []
+            for chunk in self._stream_chunks(self.file_search.query_stream(pergunta)):
+                if sink(chunk) is False:
+                    # Mensagem mais nova do cliente já tem resposta a caminho; esta para aqui
+                    return None, "substituida"
+                chunks.append(chunk)
+            return "\n\n".join(chunks), "principal"
+        cache = getattr(self.file_search, "cache", None)
+        if not self.groq or history is None or (cache and cache.contains(self.file_search.store_name, pergunta)):
+            # Resposta em cache sai direto: não passa pelo hedge nem entra no p95 do orçamento
+            return self.file_search.query(pergunta), "principal"
+        texto, origem = self.hedge.call(
+            lambda: self.file_search.query(pergunta),
+            lambda: self._groq_complete(history),
+            lambda t: bool(t) and t != "Erro ao processar",
+        )
+        if origem == "reserva":
+            print(f"⏱️ Resposta pela Groq (Gemini acima de {self.hedge.budget() * 1000:.0f} ms ou indisponível)", file=sys.stderr)
+        return texto, origem
 
     def _get_tools_definitions(self) -> list:
         return []
 
     def _extract_model_name(self, user_message: str) -> str:
-        message_lower = user_message.lower()
-        message_clean = re.sub(r'[^\w\s]', '', message_lower)
-        model_map = {
-            "iphone 15 pro max": "iPhone 15 Pro Max",
-            "iphone 15 pro": "iPhone 15 Pro",
-            "iphone 15": "iPhone 15 Pro",
-            "moto g54": "Motorola Moto G54",
-            "motorola g54": "Motorola Moto G54",
-            "a54": "Samsung Galaxy A54",
-            "galaxy a54": "Samsung Galaxy A54",
-            "s24 ultra": "Samsung Galaxy S24 Ultra",
-            "galaxy s24 ultra": "Samsung Galaxy S24 Ultra",
-            "xiaomi 13t": "Xiaomi 13T",
-            "13t": "Xiaomi 13T",
-            "redmi note 13": "Xiaomi Redmi Note 13",
-            "note 13": "Xiaomi Redmi Note 13",
-        }
-        for alias, full_name in model_map.items():
-            if alias in message_clean:
-                return full_name
-        return None
+        return self.model_resolver.resolve(user_message)
+
+    def _refresh_catalog(self) -> None:
+        """Recarrega o catálogo se o PDF mudou e reconstrói o resolvedor de modelos."""
+        if self.catalog.refresh():
+            self.model_resolver = ModelResolver.from_catalog(self.catalog)
 
-    def _extract_name_question(self, user_message: str) -> bool:
+    def _extract_name_question(self, user_message: str, matches: set | None = None) -> bool:
         """Detecta se a mensagem está perguntando sobre o nome do vendedor."""
-        name_patterns = [
-            'qual seu nome', 'como você se chama', 'seu nome é', 'como se chama',
-            'quem é você', 'qual é seu nome', 'me diga seu nome', 'posso saber seu nome'
-        ]
-        return any(pattern in user_message.lower() for pattern in name_patterns)
+        matches = INTENT_MATCHER.labels(user_message) if matches is None else matches
+        return 'nome' in matches
 
-    def _extract_greeting_or_wellbeing(self, user_message: str) -> dict:
+    def _extract_greeting_or_wellbeing(self, user_message: str, matches: set | None = None) -> dict:
         """Detecta cumprimentos e perguntas sobre bem-estar."""
-        greetings = ['oi', 'olá', 'opa', 'e aí', 'bom dia', 'boa tarde', 'boa noite']
-        wellbeing = ['como você está', 'como vai', 'tudo bem com você', 'tudo certo', 'tudo bem']
-        
-        message_lower = user_message.lower()
-        
-        if any(g in message_lower for g in greetings):
+        matches = INTENT_MATCHER.labels(user_message) if matches is None else matches
+        if 'cumprimento' in matches:
             return {'tipo': 'cumprimento'}
-        elif any(w in message_lower for w in wellbeing):
+        elif 'bem_estar' in matches:
             return {'tipo': 'bem_estar'}
         return {'tipo': 'conversa_geral'}
 
-    def _extract_intent(self, message_lower: str) -> dict:
-        if any(p in message_lower for p in ['foto', 'imagem', 'mostre', 'ver o', 'quero ver']):
+    def _extract_intent(self, message_lower: str, matches: set | None = None) -> dict:
+        matches = INTENT_MATCHER.labels(message_lower) if matches is None else matches
+        if 'pedido_foto' in matches:
             return {'tipo': 'pedido_foto'}
-        palavras_tecnicas = [
-            'processador','ram','memória','armazenamento','câmera','bateria','tela','display','preço','valor','ficha técnica','comparar','diferença','melhor'
-        ]
-        if any(p in message_lower for p in palavras_tecnicas):
+        consulta = parse_catalog_query(message_lower)
+        # "o s25 ultra tem 1TB?" pergunta sobre um aparelho citado, não pede uma listagem do catálogo
+        sobre_modelo = bool(consulta) and bool(self.model_resolver.resolve_all(message_lower))
+        if consulta and not sobre_modelo:
+            return {'tipo': 'consulta_catalogo', 'consulta': consulta}
+        for tipo in ('pergunta_tecnica', 'pergunta_nfc', 'pergunta_dual_sim', 'pergunta_vendas'):
+            if tipo in matches:
+                return {'tipo': tipo}
+        if sobre_modelo:
             return {'tipo': 'pergunta_tecnica'}
-        if any(p in message_lower for p in ['nfc','pagamento por aproximação','aproximação','google pay','apple pay','samsung pay']):
-            return {'tipo': 'pergunta_nfc'}
-        if any(p in message_lower for p in ['dois chips','2 chips','dual sim','e-sim','esim']):
-            return {'tipo': 'pergunta_dual_sim'}
-        if any(p in message_lower for p in ['vendido','vendas','mais vendeu','vendeu mais','campeão','líder','top','receita','faturamento']):
-            return {'tipo': 'pergunta_vendas'}
         return {'tipo': 'conversa_geral'}
 
+    def _classify(self, user_message: str) -> dict:
+        """Intenção da mensagem, com uma única passada do matcher de palavras-chave.
+
+        Ordem: pergunta sobre o nome, cumprimento/bem-estar (só se não houver
+        pedido junto, ex.: "oi\no s24 tem nfc?" de um lote agrupado) e as
+        intenções de tarefa.
+        """
+        matches = INTENT_MATCHER.labels(user_message)
+        if self._extract_name_question(user_message, matches):
+            return {'tipo': 'pergunta_nome'}
+        if not matches & TASK_INTENTS:
+            greeting_intent = self._extract_greeting_or_wellbeing(user_message, matches)
+            if greeting_intent.get('tipo') in ('cumprimento', 'bem_estar'):
+                return greeting_intent
+        return self._extract_intent(user_message.lower(), matches)
+
     def _handle_greeting_response(self) -> dict:
         """Retorna resposta para cumprimentos."""
         import random
@@ -160,27 +293,95 @@ Data: {datetime.now().strftime('%d/%m/%Y')}.
         
         return [{"tipo": "texto", "conteudo": f"Não encontrei uma imagem para {model_name}, mas posso te dar todas as especificações técnicas! 📋"}]
 
-    def process_message(self, user_id: str, user_message: str) -> dict:
-        if user_id not in self.conversation_histories:
-            self.conversation_histories[user_id] = [{"role": "system", "content": self.system_prompt}]
-        self.conversation_histories[user_id].append({"role": "user", "content": user_message})
+    def process_message(self, user_id: str, user_message: str, claim=None, on_chunk=None) -> dict | None:
+        """Processa a mensagem; com `on_chunk` e STREAM_REPLIES, respostas do RAG saem em pedaços.
+
+        Quando a resposta final já foi toda entregue por `on_chunk`, ela volta
+        com `"transmitido": True` e não deve ser enviada de novo; se saiu só em
+        parte, volta apenas o restante (ou um aviso curto, se a geração falhou
+        no meio). Antes do primeiro pedaço, `claim(started=True)` reserva a
+        resposta do lote. `on_chunk` retorna False quando o pedaço não pôde
+        ser enviado; a transmissão para e só o que chegou ao cliente vai
+        para o histórico.
+        """
+        stream = {"chunks": [], "substituida": False, "cortada": False}
+
+        def _emit(chunk):
+            if stream["cortada"]:
+                return False
+            if not stream["chunks"] and claim is not None and not claim(started=True):
+                stream["substituida"] = True
+            if stream["substituida"]:
+                return False
+            if on_chunk(chunk) is False:
+                stream["cortada"] = True
+                return False
+            stream["chunks"].append(chunk)
+            return True
+
+        token = _stream_sink.set(_emit if on_chunk else None)
         try:
-            
-            # Verificar se é pergunta sobre o nome
-            if self._extract_name_question(user_message):
-                response_action = self._handle_name_question_response()
-                return response_action
-            
-            # Verificar cumprimentos e bem-estar
-            greeting_intent = self._extract_greeting_or_wellbeing(user_message)
-            if greeting_intent.get('tipo') == 'cumprimento':
-                response_action = self._handle_greeting_response()
-                return response_action
-            elif greeting_intent.get('tipo') == 'bem_estar':
-                response_action = self._handle_wellbeing_response()
-                return response_action
-            
-            intent = self._extract_intent(user_message.lower())
+            return self._run_message(user_id, user_message, claim, stream)
+        finally:
+            _stream_sink.reset(token)
+
+    def _run_message(self, user_id: str, user_message: str, claim, stream: dict) -> dict | None:
+        # Uma leitura do histórico ao entrar e uma gravação ao sair, qualquer que seja o backend
+        with self.conversation_histories.session(user_id) as history:
+            history.append("user", user_message)
+            response = self._process_message(user_id, user_message, history)
+            streamed = stream["chunks"]
+            if stream["cortada"]:
+                # O envio foi recusado (ex.: aviso de timeout já saiu): nada mais vai ao cliente
+                if streamed:
+                    history.append("assistant", "\n\n".join(streamed))
+                return response
+            delivered = None
+            if streamed and not stream["substituida"]:
+                response, delivered = self._finish_stream(response, streamed)
+            # `claim()` falso: chegou mensagem nova do cliente; esta resposta é descartada
+            # e as mensagens voltam no próximo lote agrupado. Com algum pedaço já
+            # transmitido o lote foi reservado no primeiro pedaço e a resposta fica
+            if stream["substituida"] or (claim is not None and not streamed and not claim()):
+                history.discard()
+                return None
+            if delivered is not None:
+                history.append("assistant", delivered)
+            elif response and response.get("tipo") == "texto":
+                history.append("assistant", response.get("conteudo", ""))
+            return response
+
+    @staticmethod
+    def _finish_stream(response: dict | None, streamed: list) -> tuple[dict, str]:
+        """Completa uma resposta que já saiu em parte; devolve (o que ainda enviar, texto para o histórico).
+
+        Nunca reenvia a resposta inteira: se o texto final continua o que já
+        foi transmitido, só o restante sai; se é outro (falha no meio e
+        resposta de fallback), sai apenas um aviso curto.
+        """
+        sent = "\n\n".join(streamed)
+        final = (response or {}).get("conteudo") or ""
+        if (response or {}).get("tipo") == "texto" and final.startswith(sent):
+            tail = final[len(sent):].strip()
+            if not tail:
+                return {"tipo": "texto", "conteudo": sent, "transmitido": True}, sent
+            return {"tipo": "texto", "conteudo": tail}, final
+        print(f"⚠️ Resposta interrompida após {len(streamed)} parte(s) já enviada(s); enviando só um aviso", file=sys.stderr)
+        return {"tipo": "texto", "conteudo": STREAM_CUT_NOTICE}, sent
+
+    def _process_message(self, user_id: str, user_message: str, history) -> dict:
+        try:
+            with span("deteccao_intencao"):
+                intent = self._classify(user_message)
+            METRICS.inc("intencoes_total", intencao=intent.get('tipo'))
+
+            if intent.get('tipo') == 'pergunta_nome':
+                return self._handle_name_question_response()
+            if intent.get('tipo') == 'cumprimento':
+                return self._handle_greeting_response()
+            if intent.get('tipo') == 'bem_estar':
+                return self._handle_wellbeing_response()
+
             if intent.get('tipo') == 'pedido_foto':
                 actions = self._handle_photo_request(self._extract_model_name(user_message))
                 response_action = actions[0] if actions else {"tipo": "texto", "conteudo": "Não encontrei imagem."}
@@ -189,26 +390,44 @@ Data: {datetime.now().strftime('%d/%m/%Y')}.
                 except Exception:
                     pass
                 return response_action
+            if intent.get('tipo') == 'consulta_catalogo':
+                self._refresh_catalog()
+                data = run_catalog_query(self.catalog, intent['consulta'])
+                if data:
+                    return self._format_response("consulta_catalogo", data)[0]
+            if intent.get('tipo') in ['pergunta_tecnica', 'pergunta_nfc', 'pergunta_dual_sim']:
+                self._refresh_catalog()
+                models = self.model_resolver.resolve_all(user_message)
+                if len(models) > 1:
+                    local = self._compare_from_catalog(models, user_message)
+                else:
+                    local = self._answer_from_catalog(models[0] if models else None, intent.get('tipo'), user_message)
+                if local:
+                    return local
+            if not self._wait_for_rag():
+                fallback = self._groq_reply(history, user_message)
+                if fallback:
+                    return fallback
+                return {"tipo": "texto", "conteudo": "Estou terminando de carregar as fichas técnicas. Me manda a pergunta de novo em instantes?"}
             if intent.get('tipo') in ['pergunta_nfc','pergunta_dual_sim']:
                 model = self._extract_model_name(user_message)
-                content = self._answer_features_with_rag(model, intent.get('tipo'))
+                content = self._answer_features_with_rag(model, intent.get('tipo'), history)
                 return content
             # Perguntas técnicas e gerais vão para o RAG da Gemini
             if intent.get('tipo') in ['pergunta_tecnica', 'pergunta_nfc', 'pergunta_dual_sim']:
                 model = self._extract_model_name(user_message)
-                content = self._answer_features_with_rag(model, intent.get('tipo'))
+                content = self._answer_features_with_rag(model, intent.get('tipo'), history)
                 return content
-            texto = self.file_search.query(user_message) or "Me diga o modelo e sua prioridade (câmera, desempenho, bateria) que eu te oriento."
+            texto = self._rag_query(user_message, history) or "Me diga o modelo e sua prioridade (câmera, desempenho, bateria) que eu te oriento."
             return {"tipo": "texto", "conteudo": texto}
+        except SchedulerBusy as e:
+            # Fila do LLM cheia: responder logo em vez de gastar mais chamadas com fallback
+            print(f"🚦 {e}", file=sys.stderr)
+            return {"tipo": "texto", "conteudo": "Estou atendendo muita gente agora. Me manda a pergunta de novo em um minutinho?"}
         except Exception as e:
-            if self.groq:
-                try:
-                    msgs = self.conversation_histories.get(user_id, []) + [{"role": "user", "content": user_message}]
-                    comp = self.groq.chat.completions.create(messages=msgs, model=self.groq_model, max_tokens=512)
-                    txt = comp.choices[0].message.content
-                    return {"tipo": "texto", "conteudo": txt}
-                except Exception:
-                    pass
+            fallback = self._groq_reply(history, user_message)
+            if fallback:
+                return fallback
             return {"tipo": "texto", "conteudo": "Desculpe, estou com um problema técnico. Tente novamente em alguns instantes."}
 
     def _format_response(self, tool_name: str, data: list) -> list[dict]:
@@ -264,6 +483,17 @@ Data: {datetime.now().strftime('%d/%m/%Y')}.
                     texto = "\n".join(linhas)
                 actions.append({"tipo": "texto", "conteudo": texto})
                 return actions
+            elif tool_name == "consulta_catalogo":
+                c = data[0]
+                linhas = [c.get('titulo') or "📋 *RESULTADO:*"]
+                for p in c['itens'][:5]:
+                    linhas.append(f"\n📱 *{p['modelo']}* ({p['fabricante']})")
+                    linhas.append(f"   {p['destaque']}")
+                if len(c['itens']) > 5:
+                    linhas.append(f"\n...e mais {len(c['itens']) - 5} modelos.")
+                linhas.append("\nPreços de referência, podem variar.")
+                actions.append({"tipo": "texto", "conteudo": "\n".join(linhas)})
+                return actions
             elif tool_name == "get_monthly_revenue":
                 d = data[0]
                 texto = f"RECEITA DO PERÍODO:\n\nTotal: R$ {d['receita_total']:,.2f}\nUnidades: {d['total_unidades']:,}"
@@ -284,7 +514,26 @@ Data: {datetime.now().strftime('%d/%m/%Y')}.
     def _ensure_base_docs(self):
         return None
 
-    def _answer_features_with_rag(self, model_name: str, tipo: str) -> dict:
+    def _answer_from_catalog(self, model_name: str, tipo: str, user_message: str) -> dict | None:
+        """Responde pelo catálogo local; retorna None quando o PDF não traz o dado pedido."""
+        idx = self.catalog.find(model_name)
+        if idx is None:
+            return None
+        field = {'pergunta_nfc': 'nfc', 'pergunta_dual_sim': 'dual_sim'}.get(tipo) or detect_spec_field(user_message)
+        if field:
+            texto = answer_spec(self.catalog, idx, field)
+            return {"tipo": "texto", "conteudo": texto} if texto else None
+        return self._format_response("get_smartphone_details_and_photos", [self.catalog.as_details(idx)])[0]
+
+    def _compare_from_catalog(self, models: list[str], user_message: str) -> dict | None:
+        """Comparação lado a lado; só responde se todos os modelos citados estão no catálogo."""
+        idxs = [self.catalog.find(m) for m in models]
+        if any(i is None for i in idxs):
+            return None
+        texto = compare_specs(self.catalog, idxs, detect_spec_field(user_message))
+        return {"tipo": "texto", "conteudo": texto} if texto else None
+
+    def _answer_features_with_rag(self, model_name: str, tipo: str, history=None) -> dict:
         if not model_name:
             complemento = "NFC" if tipo == 'pergunta_nfc' else "Dual SIM/eSIM"
             return {"tipo": "texto", "conteudo": f"Qual modelo você quer confirmar {complemento}?"}
@@ -296,7 +545,7 @@ Data: {datetime.now().strftime('%d/%m/%Y')}.
         else:
             pergunta = f"Especificações sobre {model_name}"
         try:
-            texto = self.file_search.query(pergunta)
+            texto = self._rag_query(pergunta, history)
             texto = texto or f"Sem resposta técnica para {model_name}."
             return {"tipo": "texto", "conteudo": texto}
         except Exception:
@@ -306,7 +555,7 @@ def main():
     if len(sys.argv) < 3:
         print(json.dumps({'tipo': 'erro', 'conteudo': 'Parâmetros: user_id mensagem'}))
         sys.exit(1)
-    agent = AIAgent()
+    agent = AIAgent(warmup_async=False)
     response = agent.process_message(sys.argv[1], sys.argv[2])
     print(json.dumps(response, ensure_ascii=False))
 
@@ -1,11 +1,22 @@
 import subprocess
 import json
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from dotenv import load_dotenv
 import os
 import sys
+import time
+import threading
 import requests # Importa a biblioteca requests
 from ai_agent import AIAgent
+from webhook_queue import WebhookWorkerPool
+from ocr_pipeline import OCRPipeline, OCRRejected
+from message_coalescer import MessageCoalescer
+from rag.llm_scheduler import SCHEDULER, request_context
+from reply_outbox import ReplyOutbox
+from metrics import METRICS
+from tracing import Trace, TRACER, current_trace, use_trace, record, span
+from sampling_profiler import sample_stacks, collapsed, ProfilerBusy
+from traffic_capture import TrafficCapture
 
 # Carrega as variáveis de ambiente do arquivo .env
 load_dotenv()
@@ -25,22 +36,272 @@ except Exception as e:
 wpp_server_url = os.getenv("WPP_SERVER_URL", "http://localhost:3000")
 print(f"ℹ️  URL do servidor WPPConnect: {wpp_server_url}", file=sys.stderr)
 
+# Gravação opcional do tráfego do webhook para reprodução (CAPTURE_TRAFFIC=1)
+capture = TrafficCapture()
+
 
 def send_response_to_node(payload):
     """Envia a resposta processada para o servidor Node.js."""
     headers = {'Content-Type': 'application/json'}
+    trace = current_trace()
+    if trace:
+        headers['X-Trace-Id'] = trace.trace_id
     from datetime import datetime
     ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     try:
         # O endpoint no Node.js que vai receber a resposta
         node_endpoint = f"{wpp_server_url}/process-response"
-        response = requests.post(node_endpoint, json=payload, headers=headers)
+        with span("envio_node", tipo=payload.get('tipo')):
+            response = requests.post(node_endpoint, json=payload, headers=headers)
         response.raise_for_status()
+        METRICS.inc("envios_node_total", resultado="ok")
+        capture.outbound(trace.trace_id if trace else None, payload, ok=True)
         print(f"[{ts}] ✅ Resposta enviada ao Node.js: tipo={payload.get('tipo')} destino={payload.get('recipient_phone')}", file=sys.stderr)
     except requests.exceptions.RequestException as e:
+        METRICS.inc("envios_node_total", resultado="erro")
+        capture.outbound(trace.trace_id if trace else None, payload, ok=False)
         print(f"[{ts}] 🚨 Erro ao enviar resposta para o Node.js: {e}", file=sys.stderr)
 
 
+# Envio ordenado por destinatário (pedaços de respostas transmitidas, OCR e avisos)
+outbox = ReplyOutbox(lambda payload: send_response_to_node(payload))
+
+
+def start_ocr(job: dict) -> None:
+    """Agenda o OCR da mídia do job (se houver) e a remove do job."""
+    ts = job['ts']
+    sender_id = job['sender_id']
+    is_group_msg = job['is_group_msg']
+
+    media = job.pop('media', None) or job.pop('media_base64', None)
+    if media and str(job.get('mimetype','')).startswith('image'):
+        # OCR roda no pool de processos; o texto é enviado quando ficar pronto
+        trace = job.get('trace')
+        t_ocr = time.perf_counter()
+
+        def _send_ocr(result):
+            record("ocr", t_ocr, time.perf_counter() - t_ocr, trace=trace, cache=bool(result.get('cache')))
+            print(f"[{ts}] 🧾 OCR ({'cache' if result.get('cache') else 'novo'}, {result['tempos']}): {result['texto'][:200]}", file=sys.stderr)
+            with use_trace(trace):
+                outbox.put({
+                    "tipo": "texto",
+                    "conteudo": f"OCR: {result['texto']}",
+                    "recipient_phone": sender_id,
+                    "is_group_msg": is_group_msg
+                })
+        try:
+            perform_ocr(media, _send_ocr)
+        except OCRRejected as e:
+            print(f"[{ts}] 🚦 OCR recusado: {e}", file=sys.stderr)
+            outbox.put({
+                "tipo": "texto",
+                "conteudo": "Não consegui ler essa imagem agora (muito grande ou muitas na fila). Pode tentar de novo?",
+                "recipient_phone": sender_id,
+                "is_group_msg": is_group_msg
+            })
+        except Exception as e:
+            print(f"[{ts}] ⚠️ Falha no OCR: {e}", file=sys.stderr)
+        finally:
+            if hasattr(media, 'close'):
+                media.close()
+
+
+def process_webhook_job(job: dict) -> None:
+    """Executa OCR, agente e envio da resposta para uma mensagem já validada."""
+    trace = job.get('trace') or Trace()
+    if job.get('coalesced'):
+        trace.set(agrupadas=job['coalesced'])
+    try:
+        with use_trace(trace):
+            _process_webhook_job(job, trace)
+    finally:
+        # Lote agrupado: libera o remetente se a resposta não reservou o lote (ex.: erro no agente)
+        if job.get('release'):
+            job['release']()
+
+
+def _process_webhook_job(job: dict, trace: Trace) -> None:
+    ts = job['ts']
+    sender_id = job['sender_id']
+    is_group_msg = job['is_group_msg']
+    actual_sender = job['actual_sender']
+    message_body = job['message_body']
+
+    start_ocr(job)
+
+    if is_group_msg:
+        print(f"[{ts}] Tipo: Mensagem de Grupo", file=sys.stderr)
+
+    # Processar com agente
+    t0 = job.get('t0') or time.monotonic()
+    first_sent = threading.Event()
+
+    def _on_sent():
+        if not first_sent.is_set():
+            first_sent.set()
+            outbox.record("primeira_mensagem", time.monotonic() - t0)
+
+    # No modo assíncrono, depois do aviso de timeout nada mais desta mensagem vai ao cliente
+    may_reply = job.get('may_reply') or (lambda: True)
+
+    def _send_chunk(chunk) -> bool:
+        if not may_reply():
+            return False
+        outbox.put({"tipo": "texto", "conteudo": chunk, "recipient_phone": sender_id, "is_group_msg": is_group_msg}, on_sent=_on_sent)
+        return True
+
+    METRICS.inc("mensagens_total")
+    try:
+        # Conversas diretas e mensagens curtas passam na frente na fila do LLM
+        with METRICS.in_flight(), span("agente"), request_context(is_group=is_group_msg, message_size=len(message_body)):
+            response_action = agent.process_message(actual_sender, message_body, claim=job.get('claim'), on_chunk=_send_chunk)
+    except Exception as inner_e:
+        print(f"[{ts}] ⚠️ Erro no agente: {inner_e}", file=sys.stderr)
+        response_action = {"tipo": "texto", "conteudo": "Tive um erro ao entender sua mensagem. Pode repetir?"}
+
+    if response_action is None and job.get('claim'):
+        print(f"[{ts}] 🔁 Resposta substituída por mensagem mais recente de {actual_sender}", file=sys.stderr)
+        trace.finish(desfecho="substituida")
+    elif response_action and response_action.get('transmitido'):
+        print(f"[{ts}] 📤 Resposta transmitida em partes para {sender_id}", file=sys.stderr)
+        outbox.record("resposta_completa", time.monotonic() - t0)
+        trace.finish(desfecho="transmitida")
+    elif response_action and not may_reply():
+        print(f"[{ts}] ⏱️ Resposta para {actual_sender} descartada: o aviso de timeout já foi enviado", file=sys.stderr)
+        trace.finish(desfecho="expirada")
+    elif response_action:
+        response_action['recipient_phone'] = sender_id
+        response_action['is_group_msg'] = is_group_msg
+
+        def _on_reply_sent():
+            _on_sent()
+            outbox.record("resposta_completa", time.monotonic() - t0)
+            # O trace termina quando a resposta chega ao Node
+            trace.finish(desfecho="respondida")
+
+        outbox.put(response_action, on_sent=_on_reply_sent)
+    else:
+        trace.finish(desfecho="sem_resposta")
+
+
+def _on_job_timeout(job: dict) -> None:
+    outbox.put({
+        "tipo": "texto",
+        "conteudo": "Estou demorando mais que o normal para consultar essa informação. Pode repetir a pergunta em instantes?",
+        "recipient_phone": job['sender_id'],
+        "is_group_msg": job['is_group_msg']
+    })
+
+
+ocr_pipeline = OCRPipeline()
+
+# Modo assíncrono: o webhook só enfileira e responde 202; workers fazem o resto
+webhook_async = os.getenv("WEBHOOK_ASYNC", "0").lower() in ("1", "true", "yes")
+worker_pool = None
+if webhook_async:
+    worker_pool = WebhookWorkerPool(
+        process_webhook_job,
+        workers=int(os.getenv("WEBHOOK_WORKERS", "4")),
+        max_queue=int(os.getenv("WEBHOOK_QUEUE_SIZE", "100")),
+        job_timeout=float(os.getenv("WEBHOOK_JOB_TIMEOUT", "60")),
+        on_timeout=_on_job_timeout,
+    )
+    worker_pool.start()
+    print(f"ℹ️  Webhook assíncrono: {worker_pool.workers} workers, fila {worker_pool.jobs.maxsize}, timeout {worker_pool.job_timeout:g}s", file=sys.stderr)
+
+
+def _dispatch_batch(job: dict) -> bool:
+    """Destino dos lotes agrupados: fila de workers ou execução direta na thread do temporizador.
+
+    Retorna False se o lote foi descartado, para o agrupador liberar o remetente.
+    """
+    if worker_pool:
+        if not worker_pool.submit(job):
+            print(f"[{job['ts']}] 🚦 Fila do webhook cheia, descartando lote de {job['actual_sender']}.", file=sys.stderr)
+            job['trace'].finish(desfecho="rejeitada", motivo="fila_webhook")
+            return False
+        return True
+    process_webhook_job(job)
+    return True
+
+
+# Janela de agrupamento por remetente (COALESCE_WINDOW_MS=0 desativa)
+coalescer = MessageCoalescer(_dispatch_batch)
+if coalescer.enabled:
+    print(f"ℹ️  Agrupamento de mensagens: janela {coalescer.window * 1000:g} ms, espera máxima {coalescer.max_wait * 1000:g} ms", file=sys.stderr)
+
+
+def _build_job(data: dict, ts: str, media=None, trace: Trace | None = None) -> dict | None:
+    """Monta o job a partir dos campos enviados pelo Node; None se faltar remetente ou corpo."""
+    message_body = data.get('body', '')
+    sender_id = data.get('from')
+    is_group_msg = str(data.get('isGroupMsg', False)).lower() in ('1', 'true', 'yes')
+    author = data.get('author', sender_id)
+    is_bot_mentioned = str(data.get('isBotMentioned', False)).lower() in ('1', 'true', 'yes')
+
+    if is_group_msg:
+        print(f"[{ts}] 📋 GRUPO: {sender_id}", file=sys.stderr)
+        print(f"[{ts}] 👤 AUTOR: {author}", file=sys.stderr)
+        print(f"[{ts}] 🔔 BOT MENCIONADO: {is_bot_mentioned}", file=sys.stderr)
+
+    actual_sender = author if is_group_msg else sender_id
+
+    if not sender_id or not message_body:
+        print("ID do remetente ou corpo da mensagem ausente.", file=sys.stderr)
+        return None
+
+    print(f"[{ts}] De: {actual_sender}", file=sys.stderr)
+    print(f"[{ts}] Mensagem: {message_body}", file=sys.stderr)
+
+    trace = trace or Trace()
+    trace.set(remetente=actual_sender, grupo=is_group_msg, tamanho=len(message_body))
+    return {
+        "ts": ts,
+        "t0": time.monotonic(),
+        "trace": trace,
+        "sender_id": sender_id,
+        "actual_sender": actual_sender,
+        "is_group_msg": is_group_msg,
+        "message_body": message_body,
+        "media_base64": data.get('media_base64'),
+        "media": media,
+        "mimetype": data.get('mimetype', ''),
+    }
+
+
+def _close_media(job: dict) -> None:
+    """Fecha o temporário da mídia de um job que não vai ser processado."""
+    media = job.pop('media', None)
+    if hasattr(media, 'close'):
+        media.close()
+
+
+def _dispatch(job: dict):
+    """Agrupa, enfileira (modo assíncrono) ou processa o job e devolve a resposta HTTP."""
+    if SCHEDULER.saturated():
+        # Fila do LLM cheia: o Node recebe 429 em vez de mais uma thread esperando
+        print(f"[{job['ts']}] 🚦 Fila do LLM cheia, rejeitando mensagem.", file=sys.stderr)
+        _close_media(job)
+        job['trace'].finish(desfecho="rejeitada", motivo="fila_llm")
+        return jsonify({"status": "rate_limited", "message": "Fila do LLM cheia"}), 429, {"Retry-After": "5"}
+    if coalescer.enabled:
+        # O OCR não espera a janela; só o texto vai para o lote
+        start_ocr(job)
+        coalescer.add(job)
+        return jsonify({"status": "coalescing"}), 202
+
+    if worker_pool:
+        if not worker_pool.submit(job):
+            print(f"[{job['ts']}] 🚦 Fila do webhook cheia, rejeitando mensagem.", file=sys.stderr)
+            _close_media(job)
+            job['trace'].finish(desfecho="rejeitada", motivo="fila_webhook")
+            return jsonify({"status": "busy", "message": "Fila cheia"}), 503
+        return jsonify({"status": "queued"}), 202
+
+    process_webhook_job(job)
+    return jsonify({"status": "success"})
+
+
 @app.route('/webhook', methods=['POST'])
 def webhook():
     """Recebe mensagens do WhatsApp via webhook do WPPConnect (Node.js)."""
@@ -49,88 +310,117 @@ def webhook():
             print("🚨 Agente não inicializado. Abortando requisição.", file=sys.stderr)
             return jsonify({"status": "error", "message": "Agente de IA não está pronto."}), 503
 
+        trace = Trace(request.headers.get('X-Trace-Id'))
+        t_parse = time.perf_counter()
         data = request.json or {}
         from datetime import datetime
         ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        print(f"\n[{ts}] --- Nova Mensagem Recebida ---", file=sys.stderr)
+        print(f"\n[{ts}] --- Nova Mensagem Recebida (trace {trace.trace_id}) ---", file=sys.stderr)
+        capture.inbound(trace.trace_id, '/webhook', data)
 
-        # Processar informações do grupo
-        message_body = data.get('body', '')
-        sender_id = data.get('from')
-        is_group_msg = bool(data.get('isGroupMsg', False))
-        author = data.get('author', sender_id)
-        is_bot_mentioned = bool(data.get('isBotMentioned', False))
+        job = _build_job(data, ts, trace=trace)
+        record("webhook_parse", t_parse, time.perf_counter() - t_parse, trace=trace)
+        if not job:
+            return jsonify({"status": "error", "message": "Dados ausentes"}), 400
+        return _dispatch(job)
+    except Exception as e:
+        print(f"🚨 Erro inesperado geral no webhook: {e}", file=sys.stderr)
+        return jsonify({"status": "ok"})
 
-        if is_group_msg:
-            print(f"[{ts}] 📋 GRUPO: {sender_id}", file=sys.stderr)
-            print(f"[{ts}] 👤 AUTOR: {author}", file=sys.stderr)
-            print(f"[{ts}] 🔔 BOT MENCIONADO: {is_bot_mentioned}", file=sys.stderr)
 
-        actual_sender = author if is_group_msg else sender_id
+def _spool_body(stream, limit: int):
+    """Copia o corpo da requisição em blocos para um temporário (em memória até 1 MB).
 
-        if not sender_id or not message_body:
-            print("ID do remetente ou corpo da mensagem ausente.", file=sys.stderr)
-            return jsonify({"status": "error", "message": "Dados ausentes"}), 400
+    Retorna None se passar de `limit` bytes.
+    """
+    import tempfile
+    spool = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    total = 0
+    while True:
+        chunk = stream.read(64 * 1024)
+        if not chunk:
+            break
+        total += len(chunk)
+        if total > limit:
+            spool.close()
+            return None
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
 
-        print(f"[{ts}] De: {actual_sender}", file=sys.stderr)
-        print(f"[{ts}] Mensagem: {message_body}", file=sys.stderr)
 
-        if data.get('media_base64') and str(data.get('mimetype','')).startswith('image'):
-            try:
-                texto_ocr = perform_ocr(data['media_base64'])
-                print(f"[{ts}] 🧾 OCR: {texto_ocr[:200]}", file=sys.stderr)
-                ocr_payload = {
-                    "tipo": "texto",
-                    "conteudo": f"OCR: {texto_ocr}",
-                    "recipient_phone": sender_id,
-                    "is_group_msg": is_group_msg
-                }
-                send_response_to_node(ocr_payload)
-            except Exception as e:
-                print(f"[{ts}] ⚠️ Falha no OCR: {e}", file=sys.stderr)
+@app.route('/webhook/media', methods=['POST'])
+def webhook_media():
+    """Recebe mensagens com mídia binária, sem base64.
 
-        if is_group_msg:
-            print(f"[{ts}] Tipo: Mensagem de Grupo", file=sys.stderr)
+    Aceita multipart/form-data (arquivo no campo `media` e os demais campos do
+    webhook como campos do formulário) ou o corpo cru da imagem, com os campos
+    em JSON URL-encoded no cabeçalho `X-Message-Meta`.
+    """
+    media = None
+    try:
+        if not agent:
+            print("🚨 Agente não inicializado. Abortando requisição.", file=sys.stderr)
+            return jsonify({"status": "error", "message": "Agente de IA não está pronto."}), 503
 
-        # Processar com agente
-        try:
-            response_action = agent.process_message(actual_sender, message_body)
-        except Exception as inner_e:
-            print(f"[{ts}] ⚠️ Erro no agente: {inner_e}", file=sys.stderr)
-            response_action = {"tipo": "texto", "conteudo": "Tive um erro ao entender sua mensagem. Pode repetir?"}
-
-        if response_action:
-            response_action['recipient_phone'] = sender_id
-            response_action['is_group_msg'] = is_group_msg
-            try:
-                send_response_to_node(response_action)
-            except Exception as e:
-                print(f"⚠️ Falha ao encaminhar ao Node.js: {e}", file=sys.stderr)
-
-        return jsonify({"status": "success"})
+        trace = Trace(request.headers.get('X-Trace-Id'))
+        t_parse = time.perf_counter()
+        from datetime import datetime
+        from urllib.parse import unquote
+        ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        print(f"\n[{ts}] --- Nova Mensagem Recebida (mídia binária, trace {trace.trace_id}) ---", file=sys.stderr)
+
+        limit = ocr_pipeline.max_bytes
+        if request.content_length and request.content_length > limit + 64 * 1024:
+            return jsonify({"status": "error", "message": "Mídia acima do limite"}), 413
+
+        if request.mimetype == 'multipart/form-data':
+            data = request.form.to_dict()
+            upload = request.files.get('media')
+            if upload:
+                # O Werkzeug fecha o upload ao fim da requisição; o job leva um temporário próprio
+                media = _spool_body(upload.stream, limit)
+                if media is None:
+                    return jsonify({"status": "error", "message": "Mídia acima do limite"}), 413
+                data.setdefault('mimetype', upload.mimetype)
+        else:
+            data = json.loads(unquote(request.headers.get('X-Message-Meta', '%7B%7D')))
+            media = _spool_body(request.stream, limit)
+            if media is None:
+                return jsonify({"status": "error", "message": "Mídia acima do limite"}), 413
+            data.setdefault('mimetype', request.mimetype)
+
+        capture.inbound(trace.trace_id, '/webhook/media', data, media)
+        job = _build_job(data, ts, media=media, trace=trace)
+        record("webhook_parse", t_parse, time.perf_counter() - t_parse, trace=trace)
+        if not job:
+            if media:
+                media.close()
+            return jsonify({"status": "error", "message": "Dados ausentes"}), 400
+        return _dispatch(job)
     except Exception as e:
-        print(f"🚨 Erro inesperado geral no webhook: {e}", file=sys.stderr)
+        print(f"🚨 Erro inesperado no webhook de mídia: {e}", file=sys.stderr)
+        if media is not None and not media.closed:
+            media.close()
         return jsonify({"status": "ok"})
 
-def perform_ocr(data_uri: str) -> str:
-    import base64
-    import re
-    import io
-    from PIL import Image
-    try:
-        header, b64 = data_uri.split(',', 1)
-        img_bytes = base64.b64decode(b64)
-        img = Image.open(io.BytesIO(img_bytes))
-        # Tesseract
-        try:
-            import pytesseract
-            text = pytesseract.image_to_string(img, lang='por')
-            return text.strip()
-        except Exception:
-            # Fallback simples
-            return "[OCR indisponível no servidor]"
-    except Exception as e:
-        return f"Falha ao decodificar imagem: {e}"
+def perform_ocr(media, callback) -> None:
+    """Agenda o OCR de uma imagem; `callback(resultado)` recebe o texto e os tempos.
+
+    `media` pode ser a data URI do JSON antigo, um buffer (bytes/memoryview)
+    ou um arquivo aberto em modo binário (ex.: o temporário da rota binária).
+    """
+    if isinstance(media, str):
+        import base64
+        header, b64 = media.split(',', 1)
+        # Estimativa do tamanho decodificado antes de alocar o buffer
+        if len(b64) * 3 // 4 > ocr_pipeline.max_bytes:
+            raise OCRRejected(f"imagem acima do limite de {ocr_pipeline.max_bytes / 1048576:.1f} MB")
+        media = base64.b64decode(b64)
+    elif hasattr(media, 'read'):
+        media.seek(0)
+        media = media.read(ocr_pipeline.max_bytes + 1)
+    ocr_pipeline.submit(media, callback)
 
 @app.route('/ping', methods=['GET'])
 def ping():
@@ -144,20 +434,120 @@ def health_check():
         "timestamp": datetime.now().isoformat(),
         "services": {
             "flask": "ok",
-            "ai_agent": "ok" if agent else "error"
+            "ai_agent": "ok" if agent else "error",
+            "rag": agent.rag_status if agent else "failed"
         }
     }
     return jsonify(status), (200 if agent else 503)
 
+def _collect_gauges():
+    """Valores lidos na hora do scrape a partir dos componentes que já contam por conta própria."""
+    samples = []
+    cache = getattr(agent.file_search, "cache", None) if agent else None
+    if cache:
+        stats = cache.stats()
+        for resultado, key in (("acerto", "hits"), ("falha", "misses")):
+            samples.append(("rag_cache_consultas_total", "counter", "Consultas ao cache de respostas do RAG", {"resultado": resultado}, stats[key]))
+        samples.append(("rag_cache_entradas", "gauge", "Entradas no cache de respostas do RAG", {}, stats["entradas"]))
+    sched = SCHEDULER.snapshot()
+    samples.append(("llm_em_execucao", "gauge", "Chamadas ao LLM em execução", {}, sched["em_execucao"]))
+    samples.append(("llm_em_fila", "gauge", "Chamadas ao LLM esperando na fila", {}, sched["em_fila"]))
+    if worker_pool:
+        samples.append(("webhook_fila", "gauge", "Jobs na fila do webhook", {}, worker_pool.jobs.qsize()))
+    hedge = getattr(agent, "hedge", None) if agent else None
+    if hedge:
+        data = hedge.snapshot()
+        samples.append(("hedge_chamadas_total", "counter", "Consultas ao RAG pelo hedge", {}, data["chamadas"]))
+        samples.append(("hedge_disparos_total", "counter", "Vezes em que o reserva (Groq) foi chamado", {}, data["hedges"]))
+        for origem in ("principal", "reserva"):
+            samples.append(("hedge_vitorias_total", "counter", "Respostas do hedge por provedor vencedor", {"origem": origem}, data[f"vitorias_{origem}"]))
+        samples.append(("hedge_sem_resposta_total", "counter", "Consultas do hedge sem resposta aceitável", {}, data["sem_resposta"]))
+        samples.append(("hedge_orcamento_segundos", "gauge", "Orçamento de latência antes de chamar o reserva", {}, data["orcamento_ms"] / 1000))
+        for provedor, b in data["disjuntores"].items():
+            for estado in ("fechado", "aberto", "meio_aberto"):
+                samples.append(("disjuntor_estado", "gauge", "Estado do disjuntor (1 no estado atual)", {"provedor": provedor, "estado": estado}, int(b["estado"] == estado)))
+            samples.append(("disjuntor_falhas_seguidas", "gauge", "Falhas seguidas registradas no disjuntor", {"provedor": provedor}, b["falhas_seguidas"]))
+            samples.append(("disjuntor_aberturas_total", "counter", "Vezes em que o disjuntor abriu", {"provedor": provedor}, b["aberturas"]))
+    return samples
+
+
+METRICS.register_collector(_collect_gauges)
+
+
+def _wants_prometheus() -> bool:
+    fmt = request.args.get('format')
+    if fmt:
+        return fmt == 'prometheus'
+    accept = request.headers.get('Accept', '')
+    return 'text/plain' in accept or 'openmetrics' in accept
+
+
 @app.route('/metrics', methods=['GET'])
 def metrics():
+    """JSON por padrão; formato de texto do Prometheus com `?format=prometheus` ou `Accept: text/plain`."""
+    if _wants_prometheus():
+        return Response(METRICS.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
     from datetime import datetime
     return jsonify({
         "timestamp": datetime.now().isoformat(),
         "ai_agent_status": "active" if agent else "inactive",
-        "whatsapp_integration": "configured" if os.getenv("WPP_SERVER_URL") else "not_configured"
+        "rag_status": agent.rag_status if agent else "failed",
+        "whatsapp_integration": "configured" if os.getenv("WPP_SERVER_URL") else "not_configured",
+        "webhook_queue": worker_pool.snapshot() if worker_pool else None,
+        "ocr": ocr_pipeline.snapshot(),
+        "llm_scheduler": SCHEDULER.snapshot(),
+        "respostas": outbox.snapshot(),
+        "hedge": agent.hedge.snapshot() if agent else None,
+        "agrupamento": coalescer.snapshot() if coalescer.enabled else None,
+        "rag_cache": agent.file_search.cache.stats() if agent and getattr(agent.file_search, "cache", None) else None,
+        "rag_single_flight": agent.file_search.flight.stats() if agent and getattr(agent.file_search, "flight", None) else None,
+        "historico": agent.conversation_histories.stats() if agent else None,
+        "instrumentacao": METRICS.snapshot(),
+        "captura": capture.snapshot()
     })
 
+def _admin_allowed() -> bool:
+    """Rotas /admin só existem com ADMIN_TOKEN definido e exigem o token no cabeçalho X-Admin-Token."""
+    import hmac
+    token = os.getenv("ADMIN_TOKEN")
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+
+@app.route('/admin/traces', methods=['GET'])
+def admin_traces():
+    if not _admin_allowed():
+        return jsonify({"error": "not found"}), 404
+    return jsonify({"lentas_gravadas": TRACER.slow_count, "limite_ms": TRACER.slow_threshold * 1000,
+                    "traces": TRACER.recent(int(request.args.get('limit', 50)))})
+
+
+@app.route('/admin/traces/<trace_id>', methods=['GET'])
+def admin_trace(trace_id):
+    if not _admin_allowed():
+        return jsonify({"error": "not found"}), 404
+    trace = TRACER.get(trace_id)
+    if not trace:
+        return jsonify({"error": "trace não encontrado (só os recentes ficam em memória)"}), 404
+    return jsonify(trace.to_dict())
+
+
+@app.route('/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """Amostra as pilhas do servidor por `seconds` (máx. 60) e devolve o formato "collapsed" para flame graph."""
+    if not _admin_allowed():
+        return jsonify({"error": "not found"}), 404
+    seconds = min(60.0, max(0.1, float(request.args.get('seconds', 10))))
+    hz = min(1000.0, max(1.0, float(request.args.get('hz', 100))))
+    include_idle = request.args.get('idle', '0').lower() in ('1', 'true', 'yes')
+    try:
+        result = sample_stacks(seconds, hz=hz, include_idle=include_idle)
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    print(f"🔬 Perfil de {result['duracao_s']}s: {result['amostras']} amostras, {len(result['pilhas'])} pilhas distintas", file=sys.stderr)
+    return Response(collapsed(result['pilhas']), content_type='text/plain; charset=utf-8',
+                    headers={"X-Profile-Samples": str(result['amostras'])})
+
+
 @app.route('/test_rag', methods=['GET'])
 def test_rag():
     try:
@@ -171,7 +561,7 @@ def test_rag():
 
 if __name__ == '__main__':
     try:
-        app.run(host='127.0.0.1', port=5001, debug=False)
+        app.run(host='127.0.0.1', port=int(os.getenv("FLASK_PORT", "5001")), debug=False)
     except KeyboardInterrupt:
         print("\n🛑 Encerrando servidor Flask...")
     finally:
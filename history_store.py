@@ -0,0 +1,347 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+
+# Custo fixo estimado por mensagem (objeto + deque), somado ao tamanho do texto
+MESSAGE_OVERHEAD = 120
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+class HistoryMessage:
+    __slots__ = ("role", "content", "tokens")
+
+    def __init__(self, role: str, content: str):
+        self.role = role
+        self.content = content
+        self.tokens = estimate_tokens(content)
+
+    def as_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+class Session:
+    __slots__ = ("messages", "tokens", "nbytes", "last_seen")
+
+    def __init__(self):
+        self.messages = deque()
+        self.tokens = 0
+        self.nbytes = 0
+        self.last_seen = time.monotonic()
+
+
+class HistorySession:
+    """Visão do histórico de um usuário durante uma requisição.
+
+    Lê o histórico uma vez ao abrir e grava todas as mensagens novas de uma
+    vez ao fechar, para que o backend seja acessado só duas vezes por mensagem.
+    """
+    __slots__ = ("user_id", "system_prompt", "history", "pending")
+
+    def __init__(self, user_id: str, system_prompt: str, history: list[dict]):
+        self.user_id = user_id
+        self.system_prompt = system_prompt
+        self.history = history
+        self.pending = []
+
+    def append(self, role: str, content: str) -> None:
+        msg = {"role": role, "content": content or ""}
+        self.history.append(msg)
+        self.pending.append(msg)
+
+    def messages(self) -> list[dict]:
+        return [{"role": "system", "content": self.system_prompt}] + self.history
+
+    def discard(self) -> None:
+        """Descarta as mensagens novas (resposta substituída por uma mais recente)."""
+        self.pending.clear()
+
+
+class ConversationHistoryStore:
+    """Histórico de conversas limitado por usuário e por memória total.
+
+    - Cada sessão guarda no máximo `max_messages` mensagens e `max_tokens`
+      tokens estimados; as mais antigas saem primeiro.
+    - Sessões paradas há mais de `idle_ttl` segundos são removidas.
+    - Acima de `memory_budget` bytes, as sessões menos usadas são removidas.
+    - O prompt de sistema é guardado uma vez e prefixado só na leitura.
+    - Com `spill_path`, sessões removidas por falta de memória vão para um
+      SQLite local e voltam automaticamente na próxima mensagem do usuário;
+      as que lá ficam paradas além de `idle_ttl` são apagadas na varredura.
+    """
+
+    def __init__(self, system_prompt: str, max_messages: int | None = None, max_tokens: int | None = None,
+                 idle_ttl: float | None = None, memory_budget: int | None = None, spill_path: str | None = None):
+        self.system_prompt = system_prompt
+        self.max_messages = int(max_messages if max_messages is not None else os.getenv("HISTORY_MAX_MESSAGES", "20"))
+        self.max_tokens = int(max_tokens if max_tokens is not None else os.getenv("HISTORY_MAX_TOKENS", "2000"))
+        self.idle_ttl = float(idle_ttl if idle_ttl is not None else os.getenv("HISTORY_IDLE_TTL", "3600"))
+        self.memory_budget = int(memory_budget if memory_budget is not None else float(os.getenv("HISTORY_MEMORY_BUDGET_MB", "64")) * 1024 * 1024)
+        self.spill_path = spill_path if spill_path is not None else os.getenv("HISTORY_SPILL_PATH") or None
+        self._sessions = OrderedDict()
+        self._nbytes = 0
+        self._lock = threading.RLock()
+        self._last_sweep = time.monotonic()
+        self.evictions = {"ociosas": 0, "memoria": 0}
+        self._db = None
+        if self.spill_path:
+            self._db = sqlite3.connect(self.spill_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, messages TEXT NOT NULL, last_seen REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions (last_seen)")
+            self._db.commit()
+
+    def __contains__(self, user_id: str) -> bool:
+        with self._lock:
+            return user_id in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def append(self, user_id: str, role: str, content: str) -> None:
+        msg = HistoryMessage(role, content or "")
+        with self._lock:
+            session = self._session(user_id)
+            session.messages.append(msg)
+            session.tokens += msg.tokens
+            size = len(msg.content) + MESSAGE_OVERHEAD
+            session.nbytes += size
+            self._nbytes += size
+            self._trim(session)
+            self._sweep()
+
+    def get_messages(self, user_id: str) -> list[dict]:
+        """Mensagens no formato da API de chat, com o prompt de sistema no início."""
+        with self._lock:
+            session = self._session(user_id, create=False)
+            messages = [m.as_dict() for m in session.messages] if session else []
+        return [{"role": "system", "content": self.system_prompt}] + messages
+
+    @contextmanager
+    def session(self, user_id: str):
+        with self._lock:
+            current = self._session(user_id, create=False)
+            history = [m.as_dict() for m in current.messages] if current else []
+        view = HistorySession(user_id, self.system_prompt, history)
+        try:
+            yield view
+        finally:
+            for msg in view.pending:
+                self.append(user_id, msg["role"], msg["content"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessoes": len(self._sessions),
+                "bytes": self._nbytes,
+                "orcamento_bytes": self.memory_budget,
+                "evictions": dict(self.evictions),
+            }
+
+    def _session(self, user_id: str, create: bool = True) -> Session | None:
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._load_spilled(user_id) or (Session() if create else None)
+            if session is None:
+                return None
+            self._sessions[user_id] = session
+            self._nbytes += session.nbytes
+        else:
+            self._sessions.move_to_end(user_id)
+        session.last_seen = time.monotonic()
+        return session
+
+    def _trim(self, session: Session) -> None:
+        # A mensagem mais recente sempre fica, mesmo que sozinha passe do limite de tokens
+        while len(session.messages) > 1 and (len(session.messages) > self.max_messages or session.tokens > self.max_tokens):
+            old = session.messages.popleft()
+            session.tokens -= old.tokens
+            size = len(old.content) + MESSAGE_OVERHEAD
+            session.nbytes -= size
+            self._nbytes -= size
+
+    def _sweep(self) -> None:
+        now = time.monotonic()
+        # OrderedDict em ordem de uso: as ociosas estão no começo
+        if now - self._last_sweep >= min(60.0, self.idle_ttl):
+            self._last_sweep = now
+            while self._sessions:
+                user_id, session = next(iter(self._sessions.items()))
+                if now - session.last_seen < self.idle_ttl:
+                    break
+                self._evict(user_id, "ociosas")
+            self._purge_spilled()
+        while self._nbytes > self.memory_budget and len(self._sessions) > 1:
+            self._evict(next(iter(self._sessions)), "memoria")
+
+    def _evict(self, user_id: str, reason: str) -> None:
+        session = self._sessions.pop(user_id)
+        self._nbytes -= session.nbytes
+        self.evictions[reason] += 1
+        # Sessão ociosa expirou de vez; só as removidas por memória vão para o disco
+        if self._db is not None and session.messages and reason == "memoria":
+            try:
+                payload = json.dumps([[m.role, m.content] for m in session.messages], ensure_ascii=False)
+                # Horário (de parede) da última mensagem, não o da remoção, para a expiração valer no disco
+                last_seen = time.time() - (time.monotonic() - session.last_seen)
+                self._db.execute("INSERT OR REPLACE INTO sessions (user_id, messages, last_seen) VALUES (?, ?, ?)", (user_id, payload, last_seen))
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️  Falha ao gravar sessão {user_id} no SQLite: {e}", file=sys.stderr)
+
+    def _purge_spilled(self) -> None:
+        if self._db is None:
+            return
+        try:
+            cur = self._db.execute("DELETE FROM sessions WHERE last_seen < ?", (time.time() - self.idle_ttl,))
+            self._db.commit()
+            self.evictions["ociosas"] += cur.rowcount
+        except sqlite3.Error as e:
+            print(f"⚠️  Falha ao limpar sessões expiradas do SQLite: {e}", file=sys.stderr)
+
+    def _load_spilled(self, user_id: str) -> Session | None:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute("SELECT messages, last_seen FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+            if not row:
+                return None
+            self._db.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            self._db.commit()
+            if row[1] < time.time() - self.idle_ttl:
+                return None
+        except sqlite3.Error as e:
+            print(f"⚠️  Falha ao ler sessão {user_id} do SQLite: {e}", file=sys.stderr)
+            return None
+        session = Session()
+        for role, content in json.loads(row[0]):
+            msg = HistoryMessage(role, content)
+            session.messages.append(msg)
+            session.tokens += msg.tokens
+            session.nbytes += len(content) + MESSAGE_OVERHEAD
+        return session
+
+
+class SQLiteHistoryStore:
+    """Histórico compartilhado entre processos num SQLite em modo WAL.
+
+    Permite rodar vários workers do `app.py` na mesma máquina sem perder o
+    contexto quando a próxima mensagem do usuário cai em outro processo.
+    Cada requisição faz uma leitura ao abrir a sessão e uma transação ao fechar.
+    """
+
+    def __init__(self, system_prompt: str, path: str | None = None, max_messages: int | None = None,
+                 max_tokens: int | None = None, idle_ttl: float | None = None):
+        self.system_prompt = system_prompt
+        self.path = path or os.getenv("SESSION_DB_PATH", "sessions.db")
+        self.max_messages = int(max_messages if max_messages is not None else os.getenv("HISTORY_MAX_MESSAGES", "20"))
+        self.max_tokens = int(max_tokens if max_tokens is not None else os.getenv("HISTORY_MAX_TOKENS", "2000"))
+        self.idle_ttl = float(idle_ttl if idle_ttl is not None else os.getenv("HISTORY_IDLE_TTL", "3600"))
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        db = self._conn()
+        db.execute("CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, created REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_messages_user ON messages (user_id, id)")
+        # Última atividade por sessão: a expiração é da conversa ociosa inteira, não de cada mensagem
+        db.execute("CREATE TABLE IF NOT EXISTS sessions (user_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)")
+        db.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions (last_seen)")
+        db.execute("INSERT OR IGNORE INTO sessions (user_id, last_seen) SELECT user_id, MAX(created) FROM messages GROUP BY user_id")
+        db.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # Uma conexão por thread; o WAL permite leitores concorrentes entre processos
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def __contains__(self, user_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM messages WHERE user_id = ? LIMIT 1", (user_id,)).fetchone() is not None
+
+    def _load(self, user_id: str) -> list[dict]:
+        db = self._conn()
+        seen = db.execute("SELECT last_seen FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        if not seen or seen[0] < time.time() - self.idle_ttl:
+            # Sessão ociosa além do TTL: recomeça do zero (a varredura apaga o que sobrou)
+            return []
+        rows = db.execute(
+            "SELECT role, content FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, self.max_messages),
+        ).fetchall()
+        history, tokens = [], 0
+        for role, content in rows:
+            tokens += estimate_tokens(content)
+            if history and tokens > self.max_tokens:
+                break
+            history.append({"role": role, "content": content})
+        history.reverse()
+        return history
+
+    def _commit(self, user_id: str, pending: list[dict]) -> None:
+        if not pending:
+            return
+        now = time.time()
+        db = self._conn()
+        with db:
+            if now - self._last_sweep >= min(60.0, self.idle_ttl):
+                self._last_sweep = now
+                self._sweep(db, now)
+            # Sessão que expirou antes da varredura: a conversa nova não herda as mensagens dela
+            db.execute("DELETE FROM messages WHERE user_id = ? AND EXISTS "
+                       "(SELECT 1 FROM sessions WHERE user_id = ? AND last_seen < ?)", (user_id, user_id, now - self.idle_ttl))
+            db.execute("INSERT OR REPLACE INTO sessions (user_id, last_seen) VALUES (?, ?)", (user_id, now))
+            db.executemany(
+                "INSERT INTO messages (user_id, role, content, created) VALUES (?, ?, ?, ?)",
+                [(user_id, m["role"], m["content"], now) for m in pending],
+            )
+            db.execute(
+                "DELETE FROM messages WHERE user_id = ? AND id NOT IN (SELECT id FROM messages WHERE user_id = ? ORDER BY id DESC LIMIT ?)",
+                (user_id, user_id, self.max_messages),
+            )
+
+    def _sweep(self, db: sqlite3.Connection, now: float) -> None:
+        """Apaga as sessões sem atividade há mais de `idle_ttl`, com todas as mensagens."""
+        cutoff = now - self.idle_ttl
+        db.execute("DELETE FROM messages WHERE user_id IN (SELECT user_id FROM sessions WHERE last_seen < ?)", (cutoff,))
+        db.execute("DELETE FROM sessions WHERE last_seen < ?", (cutoff,))
+
+    @contextmanager
+    def session(self, user_id: str):
+        view = HistorySession(user_id, self.system_prompt, self._load(user_id))
+        try:
+            yield view
+        finally:
+            try:
+                self._commit(user_id, view.pending)
+            except sqlite3.Error as e:
+                print(f"⚠️  Falha ao gravar histórico de {user_id}: {e}", file=sys.stderr)
+
+    def append(self, user_id: str, role: str, content: str) -> None:
+        self._commit(user_id, [{"role": role, "content": content or ""}])
+
+    def get_messages(self, user_id: str) -> list[dict]:
+        return [{"role": "system", "content": self.system_prompt}] + self._load(user_id)
+
+    def stats(self) -> dict:
+        row = self._conn().execute("SELECT COUNT(DISTINCT user_id), COUNT(*) FROM messages").fetchone()
+        return {"backend": "sqlite", "arquivo": self.path, "sessoes": row[0], "mensagens": row[1]}
+
+
+def create_history_store(system_prompt: str, backend: str | None = None):
+    """Backend de sessões escolhido por `SESSION_BACKEND` (`memory` ou `sqlite`)."""
+    backend = (backend or os.getenv("SESSION_BACKEND", "memory")).lower()
+    if backend == "sqlite":
+        return SQLiteHistoryStore(system_prompt)
+    if backend != "memory":
+        print(f"⚠️  SESSION_BACKEND desconhecido '{backend}', usando memória.", file=sys.stderr)
+    return ConversationHistoryStore(system_prompt)
@@ -0,0 +1,87 @@
+import re
+
+from rag.answer_cache import normalize_question
+
+_END = "\0"
+
+# Tabelas de palavras-chave por intenção, em ordem de prioridade (a primeira vence).
+# Frases são comparadas por palavra inteira, sem acentos e sem diferenciar caixa.
+KEYWORD_TABLES = {
+    "nome": [
+        "qual seu nome", "como você se chama", "seu nome é", "como se chama",
+        "quem é você", "qual é seu nome", "me diga seu nome", "posso saber seu nome",
+    ],
+    "cumprimento": ["oi", "olá", "ola", "opa", "e aí", "bom dia", "boa tarde", "boa noite"],
+    "bem_estar": ["como você está", "como vai", "tudo bem com você", "tudo certo", "tudo bem"],
+    "pedido_foto": ["foto", "fotos", "imagem", "imagens", "mostre", "ver o", "quero ver"],
+    # Plurais e formas verbais entram por extenso: o casamento é por palavra inteira
+    "pergunta_tecnica": [
+        "processador", "processadores", "ram", "memória", "memórias", "armazenamento",
+        "câmera", "câmeras", "bateria", "baterias", "tela", "telas", "display", "displays",
+        "preço", "preços", "valor", "valores", "ficha técnica", "fichas técnicas",
+        "comparar", "compare", "compara", "comparando", "comparação", "comparativo",
+        "diferença", "diferenças", "melhor", "melhores",
+    ],
+    "pergunta_nfc": ["nfc", "pagamento por aproximação", "aproximação", "google pay", "apple pay", "samsung pay"],
+    "pergunta_dual_sim": ["dois chips", "2 chips", "dual sim", "esim"],
+    "pergunta_vendas": [
+        "vendido", "vendidos", "vendida", "vendidas", "vendas", "mais vendeu", "vendeu mais", "campeão", "líder", "líderes",
+        "top", "receita", "faturamento",
+    ],
+}
+
+
+def tokenize(text: str) -> list[str]:
+    # Palavras hifenizadas viram uma só ("e-sim" -> "esim") para não casar com "é sim"
+    return normalize_question(re.sub(r"(?<=\w)-(?=\w)", "", text or "")).split()
+
+
+class KeywordMatcher:
+    """Trie de palavras compilado uma vez a partir de todas as tabelas.
+
+    `match` tokeniza a mensagem uma única vez e percorre o trie a partir de
+    cada palavra, devolvendo todas as intenções encontradas com a prioridade.
+    Casar por palavra inteira evita falsos positivos como "oi" em "noite".
+    """
+
+    def __init__(self, tables: dict[str, list[str]]):
+        self._root = {}
+        self.size = 0
+        for priority, (label, phrases) in enumerate(tables.items()):
+            for phrase in phrases:
+                tokens = tokenize(phrase)
+                if not tokens:
+                    continue
+                node = self._root
+                for tok in tokens:
+                    node = node.setdefault(tok, {})
+                node.setdefault(_END, set()).add((priority, label))
+                self.size += 1
+
+    def match(self, text: str) -> list[tuple[int, str]]:
+        """Lista ordenada de (prioridade, intenção) presentes no texto."""
+        tokens = tokenize(text)
+        found = set()
+        root = self._root
+        n = len(tokens)
+        for i in range(n):
+            node = root.get(tokens[i])
+            j = i + 1
+            while node is not None:
+                hits = node.get(_END)
+                if hits:
+                    found |= hits
+                if j >= n:
+                    break
+                node = node.get(tokens[j])
+                j += 1
+        return sorted(found)
+
+    def labels(self, text: str) -> set[str]:
+        return {label for _, label in self.match(text)}
+
+
+INTENT_MATCHER = KeywordMatcher(KEYWORD_TABLES)
+
+# Rótulos que pedem uma resposta de fato; cumprimentos junto deles não viram saudação
+TASK_INTENTS = frozenset({"pedido_foto", "pergunta_tecnica", "pergunta_nfc", "pergunta_dual_sim", "pergunta_vendas"})
@@ -0,0 +1,148 @@
+import os
+import sys
+import time
+import threading
+
+
+class _SenderState:
+    __slots__ = ("pending", "inflight", "gen", "timer", "first_at")
+
+    def __init__(self):
+        self.pending = []
+        self.inflight = []
+        self.gen = 0
+        self.timer = None
+        self.first_at = 0.0
+
+
+class MessageCoalescer:
+    """Agrupa mensagens do mesmo remetente enviadas em rajada numa única chamada ao agente.
+
+    Cada mensagem reinicia a janela de `window_ms`; quando ela fecha sem
+    mensagens novas (ou após `max_wait_ms` desde a primeira), os textos são
+    unidos e `dispatch(job)` é chamado com um job só. Se chegar mensagem
+    enquanto a resposta anterior ainda está sendo gerada, essa resposta é
+    substituída: o job traz `claim()`, que retorna False nesse caso, e as
+    mensagens dele entram no próximo lote. Quem vai começar a enviar uma
+    resposta em partes chama `claim(started=True)` antes do primeiro pedaço:
+    a partir daí o lote está respondido e só as mensagens novas seguem.
+    Se `dispatch` retornar False (lote descartado), o remetente é liberado.
+    Quem processa o job chama `release()` ao terminar, mesmo com erro: se
+    ninguém reservou o lote, o remetente é liberado e as mensagens já
+    tratadas não voltam no próximo lote. O lote leva o `trace` da última
+    mensagem; os das anteriores terminam com `desfecho="agrupada"`.
+    """
+
+    def __init__(self, dispatch, window_ms: float | None = None, max_wait_ms: float | None = None):
+        self.dispatch = dispatch
+        self.window = float(window_ms if window_ms is not None else os.getenv("COALESCE_WINDOW_MS", "0")) / 1000
+        self.max_wait = float(max_wait_ms if max_wait_ms is not None else os.getenv("COALESCE_MAX_WAIT_MS", "5000")) / 1000
+        self._states = {}
+        self._lock = threading.Lock()
+        self.stats = {"mensagens": 0, "lotes": 0, "substituidas": 0, "descartados": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    @staticmethod
+    def key(job: dict) -> tuple:
+        return (job["sender_id"], job["actual_sender"])
+
+    def add(self, job: dict) -> None:
+        key = self.key(job)
+        now = time.monotonic()
+        with self._lock:
+            self.stats["mensagens"] += 1
+            st = self._states.setdefault(key, _SenderState())
+            if not st.pending:
+                st.first_at = now
+            st.pending.append(job)
+            st.gen += 1
+            if st.timer:
+                st.timer.cancel()
+            delay = max(0.0, min(self.window, st.first_at + self.max_wait - now))
+            st.timer = threading.Timer(delay, self._flush, args=(key,))
+            st.timer.daemon = True
+            st.timer.start()
+
+    def _flush(self, key: tuple) -> None:
+        with self._lock:
+            st = self._states.get(key)
+            if not st or not st.pending:
+                return
+            if st.inflight:
+                self.stats["substituidas"] += 1
+            batch = st.inflight + st.pending
+            st.inflight = batch
+            st.pending = []
+            st.timer = None
+            gen = st.gen
+            self.stats["lotes"] += 1
+        merged = dict(batch[-1])
+        merged["message_body"] = "\n".join(j["message_body"] for j in batch)
+        merged["coalesced"] = len(batch)
+        merged["claim"] = lambda started=False: self._claim(key, gen, batch, started)
+        merged["release"] = lambda: self._release(key, batch)
+        self._close_traces(batch, merged.get("trace"))
+        if len(batch) > 1:
+            print(f"[{merged['ts']}] 🧩 {len(batch)} mensagens de {merged['actual_sender']} agrupadas", file=sys.stderr)
+        try:
+            accepted = self.dispatch(merged) is not False
+        except Exception as e:
+            print(f"⚠️ Falha ao despachar lote agrupado: {e}", file=sys.stderr)
+            accepted = False
+        if not accepted:
+            self._drop(key, batch)
+
+    @staticmethod
+    def _close_traces(batch: list, survivor) -> None:
+        """O lote segue com o trace da última mensagem; os das demais terminam apontando para ele."""
+        if survivor is None:
+            return
+        merged_ids = []
+        for job in batch[:-1]:
+            trace = job.get("trace")
+            if trace is not None and trace is not survivor:
+                trace.finish(desfecho="agrupada", agrupada_em=survivor.trace_id)
+                merged_ids.append(trace.trace_id)
+        if merged_ids:
+            survivor.set(traces_agrupados=merged_ids)
+
+    def _claim(self, key: tuple, gen: int, batch: list, started: bool = False) -> bool:
+        """Confirma que o lote `gen` ainda é o mais recente e libera o remetente.
+
+        Com `started=True` basta que nenhum lote mais novo tenha saído com
+        essas mensagens; as que chegaram depois seguem sozinhas.
+        """
+        with self._lock:
+            st = self._states.get(key)
+            if not st or st.inflight is not batch or (st.gen != gen and not started):
+                return False
+            st.inflight = []
+            if not st.pending:
+                del self._states[key]
+            return True
+
+    def _drop(self, key: tuple, batch: list) -> None:
+        """Lote não despachado (fila cheia): as mensagens dele não entram no próximo."""
+        with self._lock:
+            self.stats["descartados"] += 1
+        self._release(key, batch)
+
+    def _release(self, key: tuple, batch: list) -> None:
+        """Fim do processamento do lote; sem efeito se ele já foi reservado ou substituído."""
+        with self._lock:
+            st = self._states.get(key)
+            if not st or st.inflight is not batch:
+                return
+            st.inflight = []
+            if not st.pending:
+                del self._states[key]
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = dict(self.stats)
+            data["remetentes_ativos"] = len(self._states)
+        data["janela_ms"] = self.window * 1000
+        return data
@@ -0,0 +1,212 @@
+import sys
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Limites dos histogramas de latência, em segundos
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+PREFIX = "whatsapp_bot_"
+
+HELP = {
+    "etapa_duracao_segundos": ("histogram", "Duração de cada etapa do atendimento"),
+    "intencoes_total": ("counter", "Mensagens por intenção detectada"),
+    "rag_respostas_total": ("counter", "Consultas ao RAG por origem da resposta"),
+    "fallback_groq_total": ("counter", "Chamadas de fallback à Groq por resultado"),
+    "envios_node_total": ("counter", "Envios ao Node.js por resultado"),
+    "mensagens_total": ("counter", "Mensagens processadas"),
+    "requisicoes_em_andamento": ("gauge", "Mensagens sendo processadas agora"),
+}
+
+
+class _Shard:
+    """Contadores de uma única thread; só ela escreve, a leitura soma todas."""
+
+    __slots__ = ("thread", "values", "histograms")
+
+    def __init__(self, thread: threading.Thread):
+        self.thread = thread
+        self.values = {}
+        self.histograms = {}
+
+
+class Metrics:
+    """Contadores, gauges e histogramas com um shard por thread.
+
+    No caminho quente não há lock: cada thread atualiza os próprios
+    dicionários e o lock só é usado quando uma thread nova registra o seu
+    shard e na leitura (`/metrics`), que soma os shards. Shards de threads
+    encerradas (ex.: uma thread por requisição do servidor do Flask) são
+    incorporados a um acumulado para a lista não crescer.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._local = threading.local()
+        self._shards = []
+        self._retired = _Shard(None)
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> _Shard:
+        try:
+            return self._local.shard
+        except AttributeError:
+            pass
+        shard = self._local.shard = _Shard(threading.current_thread())
+        with self._lock:
+            if len(self._shards) >= 64:
+                self._retire_dead()
+            self._shards.append(shard)
+        return shard
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return (name, tuple(sorted(labels.items())) if len(labels) > 1 else tuple(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Soma `value` ao contador (ou gauge, com valor negativo) `name`."""
+        values = self._shard().values
+        key = self._key(name, labels)
+        values[key] = values.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        histograms = self._shard().histograms
+        key = self._key(name, labels)
+        h = histograms.get(key)
+        if h is None:
+            # Contagem por faixa (+Inf no fim), soma e total
+            h = histograms[key] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+        h[bisect.bisect_left(self.buckets, seconds)] += 1
+        h[-2] += seconds
+        h[-1] += 1
+
+    def stage(self, name: str, seconds: float) -> None:
+        self.observe("etapa_duracao_segundos", seconds, etapa=name)
+
+    @contextmanager
+    def in_flight(self, name: str = "requisicoes_em_andamento"):
+        self.inc(name)
+        try:
+            yield
+        finally:
+            self.inc(name, -1)
+
+    def register_collector(self, fn) -> None:
+        """`fn()` devolve amostras lidas na hora da coleta: [(nome, tipo, ajuda, labels, valor)]."""
+        self._collectors.append(fn)
+
+    def _retire_dead(self) -> None:
+        # Chamado com o lock; a thread morta não escreve mais no shard
+        alive = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                alive.append(shard)
+            else:
+                self._merge(self._retired, shard)
+        self._shards = alive
+
+    @staticmethod
+    def _merge(into: _Shard, shard: _Shard) -> None:
+        for key, value in list(shard.values.items()):
+            into.values[key] = into.values.get(key, 0) + value
+        for key, h in list(shard.histograms.items()):
+            acc = into.histograms.get(key)
+            if acc is None:
+                into.histograms[key] = list(h)
+            else:
+                for i, v in enumerate(list(h)):
+                    acc[i] += v
+
+    def _collect(self) -> _Shard:
+        total = _Shard(None)
+        with self._lock:
+            self._retire_dead()
+            self._merge(total, self._retired)
+            for shard in self._shards:
+                self._merge(total, shard)
+        return total
+
+    def snapshot(self) -> dict:
+        """Resumo para o JSON de /metrics: contadores e p50/p95 aproximados por etapa."""
+        total = self._collect()
+        data = {"contadores": {}, "etapas": {}}
+        for (name, labels), value in sorted(total.values.items()):
+            label = ",".join(f"{k}={v}" for k, v in labels)
+            data["contadores"][f"{name}{{{label}}}" if label else name] = value
+        for (name, labels), h in sorted(total.histograms.items()):
+            label = ",".join(str(v) for _, v in labels) or name
+            data["etapas"][label] = {
+                "contagem": h[-1],
+                "media_ms": round(h[-2] / h[-1] * 1000, 1) if h[-1] else 0.0,
+                "p50_ms": self._quantile(h, 0.5),
+                "p95_ms": self._quantile(h, 0.95),
+            }
+        return data
+
+    def _quantile(self, h: list, q: float) -> float | None:
+        # Limite superior da faixa que contém o quantil (sem interpolar); None se passar da última faixa
+        target = q * h[-1]
+        seen = 0
+        for i, count in enumerate(h[:len(self.buckets)]):
+            seen += count
+            if seen >= target and count:
+                return round(self.buckets[i] * 1000, 1)
+        return None if h[-1] else 0.0
+
+    def render_prometheus(self) -> str:
+        """Formato de exposição de texto do Prometheus (versão 0.0.4)."""
+        total = self._collect()
+        lines = []
+        families = {}
+        for (name, labels), value in total.values.items():
+            families.setdefault(name, []).append((labels, value))
+        for (name, labels), h in total.histograms.items():
+            families.setdefault(name, []).append((labels, h))
+        hist_names = {name for name, _ in total.histograms}
+        for name in sorted(families):
+            kind, doc = HELP.get(name, ("histogram" if name in hist_names else "counter", name))
+            lines.append(f"# HELP {PREFIX}{name} {doc}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+            for labels, value in sorted(families[name], key=lambda item: item[0]):
+                if kind != "histogram":
+                    lines.append(f"{PREFIX}{name}{_labels(labels)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), value):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(f"{PREFIX}{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {_number(value[-2])}")
+                lines.append(f"{PREFIX}{name}_count{_labels(labels)} {value[-1]}")
+        for collector in self._collectors:
+            try:
+                samples = collector() or []
+            except Exception as e:
+                print(f"⚠️ Falha num coletor de métricas: {e}", file=sys.stderr)
+                continue
+            declared = set()
+            for name, kind, doc, labels, value in samples:
+                if name not in declared:
+                    declared.add(name)
+                    lines.append(f"# HELP {PREFIX}{name} {doc}")
+                    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                lines.append(f"{PREFIX}{name}{_labels(tuple(sorted(labels.items())))} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in labels)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(labels, escaped)) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# Instância usada pelo app e pelo agente
+METRICS = Metrics()
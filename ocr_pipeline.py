@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class OCRRejected(Exception):
+    """Imagem recusada antes do OCR (grande demais ou fila cheia)."""
+
+
+def _preprocess(img_bytes: bytes, max_side: int):
+    """Reduz o lado maior para `max_side`, converte para cinza e aplica limiar adaptativo."""
+    import numpy as np
+    import cv2
+    img = cv2.imdecode(np.frombuffer(img_bytes, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    if img is None:
+        raise ValueError("formato de imagem não suportado")
+    h, w = img.shape[:2]
+    scale = max_side / float(max(h, w))
+    if scale < 1.0:
+        img = cv2.resize(img, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    return cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+
+
+def _ocr_worker(img_bytes: bytes, max_side: int, lang: str) -> dict:
+    """Executado no processo filho: pré-processamento + tesseract, com tempos por etapa."""
+    tempos = {}
+    t0 = time.perf_counter()
+    try:
+        img = _preprocess(img_bytes, max_side)
+    except ImportError:
+        # Sem OpenCV: segue com a imagem original via PIL
+        import io
+        from PIL import Image
+        img = Image.open(io.BytesIO(img_bytes))
+    tempos["preprocessamento_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    t1 = time.perf_counter()
+    try:
+        import pytesseract
+        texto = pytesseract.image_to_string(img, lang=lang).strip()
+    except Exception:
+        texto = "[OCR indisponível no servidor]"
+    tempos["tesseract_ms"] = round((time.perf_counter() - t1) * 1000, 1)
+    return {"texto": texto, "tempos": tempos}
+
+
+class OCRPipeline:
+    """OCR fora da requisição: pool de processos, fila limitada e cache por hash do conteúdo."""
+
+    def __init__(self, workers: int | None = None, max_queue: int | None = None, max_bytes: int | None = None,
+                 max_side: int | None = None, cache_size: int | None = None, lang: str = "por"):
+        self.workers = int(workers if workers is not None else os.getenv("OCR_WORKERS", "2"))
+        self.max_queue = int(max_queue if max_queue is not None else os.getenv("OCR_QUEUE_SIZE", "16"))
+        self.max_bytes = int(max_bytes if max_bytes is not None else float(os.getenv("OCR_MAX_MB", "8")) * 1024 * 1024)
+        self.max_side = int(max_side if max_side is not None else os.getenv("OCR_MAX_SIDE", "1600"))
+        self.cache_size = int(cache_size if cache_size is not None else os.getenv("OCR_CACHE_SIZE", "256"))
+        self.lang = lang
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.max_queue)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"processadas": 0, "cache_hits": 0, "rejeitadas": 0, "falhas": 0, "pools_recriados": 0}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _discard_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Descarta um pool quebrado (processo filho morreu); o próximo OCR cria outro."""
+        with self._lock:
+            if self._executor is not pool:
+                return
+            self._executor = None
+            self.stats["pools_recriados"] += 1
+        print("⚠️ Pool de OCR quebrado (processo filho encerrado); será recriado", file=sys.stderr)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def submit(self, img_bytes: bytes, callback) -> None:
+        """Agenda o OCR e chama `callback(resultado)` quando terminar.
+
+        `resultado` tem `texto`, `tempos` (ms por etapa), `cache` e `sha256`.
+        Levanta OCRRejected se a imagem passar do limite ou a fila estiver cheia.
+        """
+        if len(img_bytes) > self.max_bytes:
+            self._count("rejeitadas")
+            raise OCRRejected(f"imagem de {len(img_bytes) / 1048576:.1f} MB acima do limite de {self.max_bytes / 1048576:.1f} MB")
+        t0 = time.perf_counter()
+        digest = hashlib.sha256(img_bytes).hexdigest()
+        with self._lock:
+            cached = self._cache.get(digest)
+            if cached is not None:
+                self._cache.move_to_end(digest)
+                self.stats["cache_hits"] += 1
+        if cached is not None:
+            callback({"texto": cached, "tempos": {"total_ms": round((time.perf_counter() - t0) * 1000, 1)}, "cache": True, "sha256": digest})
+            return
+        if not self._slots.acquire(blocking=False):
+            self._count("rejeitadas")
+            raise OCRRejected("fila de OCR cheia")
+
+        def _done(future):
+            self._slots.release()
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                self._discard_pool(pool)
+                self._count("falhas")
+                result = {"texto": f"Falha ao processar imagem: {e}", "tempos": {}}
+            except Exception as e:
+                self._count("falhas")
+                result = {"texto": f"Falha ao processar imagem: {e}", "tempos": {}}
+            else:
+                self._count("processadas")
+                self._remember(digest, result["texto"])
+            result["tempos"]["total_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            result.update(cache=False, sha256=digest)
+            try:
+                callback(result)
+            except Exception as e:
+                print(f"⚠️ Falha no callback do OCR: {e}", file=sys.stderr)
+
+        try:
+            pool = self._pool()
+            try:
+                future = pool.submit(_ocr_worker, img_bytes, self.max_side, self.lang)
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                pool = self._pool()
+                future = pool.submit(_ocr_worker, img_bytes, self.max_side, self.lang)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(_done)
+
+    def _remember(self, digest: str, texto: str) -> None:
+        if self.cache_size <= 0 or texto.startswith("[OCR indisponível"):
+            return
+        with self._lock:
+            self._cache[digest] = texto
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = dict(self.stats)
+            data["cache_entradas"] = len(self._cache)
+        data.update({"workers": self.workers, "fila_max": self.max_queue, "max_bytes": self.max_bytes})
+        return data
+
+    def shutdown(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,95 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_question(text: str) -> str:
+    """Normaliza a pergunta: minúsculas, sem acentos, sem pontuação e espaços únicos."""
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class AnswerCache:
+    """Cache LRU com TTL para respostas do File Search, chaveado por (store, pergunta normalizada)."""
+
+    def __init__(self, max_entries: int | None = None, ttl: float | None = None):
+        self.max_entries = int(max_entries if max_entries is not None else os.getenv("RAG_CACHE_SIZE", "512"))
+        self.ttl = float(ttl if ttl is not None else os.getenv("RAG_CACHE_TTL", "3600"))
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    def key(self, store_name: str | None, question: str) -> tuple:
+        return (store_name or "", normalize_question(question))
+
+    def get(self, store_name: str | None, question: str) -> str | None:
+        if not self.enabled:
+            return None
+        k = self.key(store_name, question)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(k)
+            if item is None or item[0] < now:
+                if item is not None:
+                    del self._data[k]
+                self.misses += 1
+                return None
+            self._data.move_to_end(k)
+            self.hits += 1
+            return item[1]
+
+    def contains(self, store_name: str | None, question: str) -> bool:
+        """Há resposta válida para a pergunta? Não conta como hit/miss nem muda a ordem do LRU."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            item = self._data.get(self.key(store_name, question))
+        return item is not None and item[0] >= time.monotonic()
+
+    def put(self, store_name: str | None, question: str, answer: str) -> None:
+        if not self.enabled or not answer:
+            return
+        k = self.key(store_name, question)
+        with self._lock:
+            self._data[k] = (time.monotonic() + self.ttl, answer)
+            self._data.move_to_end(k)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_store(self, store_name: str | None) -> int:
+        """Remove todas as respostas de uma store (ex.: após upload de documento novo)."""
+        prefix = store_name or ""
+        with self._lock:
+            stale = [k for k in self._data if k[0] == prefix]
+            for k in stale:
+                del self._data[k]
+        return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entradas": len(self._data),
+                "max_entradas": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
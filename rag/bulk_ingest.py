@@ -0,0 +1,190 @@
+import os
+import sys
+import time
+import asyncio
+
+from rag.ingest_manifest import IngestManifest, file_sha256
+
+DEFAULT_EXTENSIONS = (".pdf", ".txt", ".md", ".docx", ".csv", ".json", ".html")
+
+
+def scan_directory(directory: str, prefix: str, extensions=DEFAULT_EXTENSIONS) -> dict[str, str]:
+    """display_name ("prefixo/caminho/relativo") -> caminho absoluto dos arquivos suportados."""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.startswith(".") or not name.lower().endswith(extensions):
+                continue
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, directory).replace(os.sep, "/")
+            files[f"{prefix}/{rel}"] = os.path.abspath(path)
+    return files
+
+
+async def sync_directory(client, directory: str, manifest: IngestManifest | None = None, prefix: str | None = None,
+                         concurrency: int | None = None, poll_initial: float | None = None,
+                         poll_max: float | None = None) -> dict:
+    """Sincroniza um diretório inteiro com a store usando o manifesto de hashes.
+
+    Só envia arquivos novos ou alterados (até `concurrency` uploads ao mesmo
+    tempo), acompanha todas as operações pendentes num único laço com espera
+    exponencial e remove da store os documentos cujos arquivos sumiram. Só
+    entradas com o mesmo `prefix` são consideradas, então documentos
+    ingeridos por outros caminhos (ex.: o celularrag.pdf) não são tocados.
+    """
+    manifest = manifest or IngestManifest()
+    prefix = prefix or os.path.basename(os.path.abspath(directory))
+    concurrency = int(concurrency if concurrency is not None else os.getenv("RAG_INGEST_CONCURRENCY", "4"))
+    delay = float(poll_initial if poll_initial is not None else os.getenv("RAG_POLL_INITIAL", "0.5"))
+    poll_max = float(poll_max if poll_max is not None else os.getenv("RAG_POLL_MAX", "8"))
+    poll_timeout = float(os.getenv("RAG_POLL_TIMEOUT", "300"))
+    store = client.store_name
+    t_start = time.monotonic()
+
+    files = scan_directory(directory, prefix)
+    digests = dict(zip(files, await asyncio.gather(*(asyncio.to_thread(file_sha256, p) for p in files.values()))))
+    known = _known(manifest, store, prefix)
+    stale = []
+    indexing = set()
+    if any((entry.get("pendente") or {}).get("operacao") for entry in known.values()):
+        indexing = await _resolve_pending(client, manifest, known, digests, stale)
+        known = _known(manifest, store, prefix)
+    changed = [name for name in files if name not in indexing and (known.get(name) or {}).get("sha256") != digests[name]]
+    removed = [name for name in known if name not in files and name not in indexing]
+    print(f"📂 {directory}: {len(files)} arquivos, {len(changed)} novos/alterados, {len(removed)} removidos", file=sys.stderr)
+
+    report = {"arquivos": {}, "enviados": 0, "sem_alteracao": len(files) - len(changed) - len(indexing & files.keys()),
+              "removidos": 0, "falhas": 0, "bytes": 0, "indexando": len(indexing)}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    pending = {}
+
+    async def _upload(name: str) -> None:
+        path = files[name]
+        size = os.path.getsize(path)
+        async with semaphore:
+            t0 = time.monotonic()
+            try:
+                op = await client.start_upload(path, name)
+            except Exception as e:
+                report["falhas"] += 1
+                report["arquivos"][name] = {"erro": str(e)}
+                print(f"❌ {name}: falha no upload: {e}", file=sys.stderr)
+                return
+            upload_s = time.monotonic() - t0
+        report["bytes"] += size
+        report["arquivos"][name] = {"bytes": size, "upload_s": round(upload_s, 3), "t0": t0, "t_upload": time.monotonic()}
+        pending[op["name"]] = (name, op)
+
+    await asyncio.gather(*(_upload(name) for name in changed))
+
+    # Uma única rodada de consultas para todas as operações pendentes, com espera exponencial
+    while pending:
+        for op_name, (name, op) in list(pending.items()):
+            if op.get("done"):
+                del pending[op_name]
+                old = _finish(client, manifest, report, known, name, digests[name], op)
+                if old:
+                    stale.append((name, old))
+        if not pending:
+            break
+        if time.monotonic() - t_start > poll_timeout:
+            # O documento já está (ou vai estar) na store: a operação fica no manifesto e a
+            # próxima execução adota ou apaga o documento em vez de enviar uma cópia
+            for op_name, (name, _) in pending.items():
+                manifest.set_pending(store, name, digests[name], op_name)
+                report["falhas"] += 1
+                report["arquivos"][name]["erro"] = f"indexação não terminou em {poll_timeout:g}s"
+                print(f"❌ {name}: indexação não terminou em {poll_timeout:g}s (operação {op_name} guardada)", file=sys.stderr)
+            break
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, poll_max)
+        names = list(pending)
+        results = await asyncio.gather(*(client.get_operation(n) for n in names), return_exceptions=True)
+        for op_name, result in zip(names, results):
+            if isinstance(result, Exception):
+                print(f"⚠️  Falha ao consultar {op_name}: {result}", file=sys.stderr)
+                continue
+            pending[op_name] = (pending[op_name][0], result)
+
+    # Versões antigas de arquivos alterados e documentos de arquivos removidos
+    async def _delete(name: str, doc: str | None, forget: bool) -> None:
+        try:
+            if doc:
+                await client.delete_document(doc)
+            if forget:
+                manifest.remove(store, name)
+                report["removidos"] += 1
+            print(f"🗑️  {name}: {'removido da store' if forget else 'versão antiga removida'} ({doc})", file=sys.stderr)
+        except Exception as e:
+            report["falhas"] += 1
+            print(f"⚠️  {name}: falha ao remover {doc}: {e}", file=sys.stderr)
+
+    await asyncio.gather(
+        *(_delete(name, doc, False) for name, doc in stale),
+        *(_delete(name, known[name].get("document"), True) for name in removed),
+    )
+
+    manifest.save()
+    elapsed = time.monotonic() - t_start
+    report["duracao_s"] = round(elapsed, 3)
+    report["mb_por_s"] = round(report["bytes"] / 1048576 / elapsed, 3) if elapsed else 0.0
+    report["arquivos_por_s"] = round(report["enviados"] / elapsed, 3) if elapsed else 0.0
+    for info in report["arquivos"].values():
+        info.pop("t0", None)
+        info.pop("t_upload", None)
+    return report
+
+
+def _known(manifest: IngestManifest, store: str, prefix: str) -> dict:
+    return {name: entry for name, entry in manifest.data["stores"].get(store, {}).items() if name.startswith(f"{prefix}/")}
+
+
+async def _resolve_pending(client, manifest: IngestManifest, known: dict, digests: dict, stale: list) -> set:
+    """Operações que estouraram o prazo na execução anterior.
+
+    Terminadas com o arquivo igual: o documento é adotado no manifesto (e a
+    versão anterior vai para `stale`). Arquivo alterado ou removido desde
+    então: o documento órfão vai para `stale` e o arquivo é enviado de novo.
+    Retorna os nomes ainda em indexação, que não são reenviados nesta rodada.
+    """
+    store = client.store_name
+    waiting = {name: entry["pendente"] for name, entry in known.items() if (entry.get("pendente") or {}).get("operacao")}
+    results = await asyncio.gather(*(client.get_operation(p["operacao"]) for p in waiting.values()), return_exceptions=True)
+    indexing = set()
+    for (name, info), op in zip(waiting.items(), results):
+        if isinstance(op, Exception) or not op.get("done"):
+            indexing.add(name)
+            print(f"⏳ {name}: indexação anterior ({info['operacao']}) ainda sem resultado", file=sys.stderr)
+            continue
+        document = (op.get("response") or {}).get("documentName")
+        if op.get("error") or not document:
+            manifest.clear_pending(store, name)
+        elif digests.get(name) == info["sha256"]:
+            old = known[name].get("document")
+            manifest.set(store, name, info["sha256"], document)
+            if old and old != document:
+                stale.append((name, old))
+            print(f"✓ {name}: indexação anterior concluída ({document})", file=sys.stderr)
+        else:
+            manifest.clear_pending(store, name)
+            stale.append((name, document))
+    return indexing
+
+
+def _finish(client, manifest: IngestManifest, report: dict, known: dict, name: str, digest: str, op: dict) -> str | None:
+    """Registra o arquivo indexado; devolve o documento da versão anterior, se houver."""
+    info = report["arquivos"][name]
+    now = time.monotonic()
+    info["indexacao_s"] = round(now - info["t_upload"], 3)
+    info["total_s"] = round(now - info["t0"], 3)
+    if op.get("error"):
+        report["falhas"] += 1
+        info["erro"] = str(op["error"])
+        print(f"❌ {name}: indexação falhou: {op['error']}", file=sys.stderr)
+        return None
+    document = (op.get("response") or {}).get("documentName")
+    manifest.set(client.store_name, name, digest, document)
+    report["enviados"] += 1
+    print(f"✓ {name}: upload {info['upload_s']:.2f}s, indexação {info['indexacao_s']:.2f}s", file=sys.stderr)
+    old = (known.get(name) or {}).get("document")
+    return old if old and old != document else None
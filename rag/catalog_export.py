@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import sqlite3
+import hashlib
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STATE_PATH = os.path.join(BASE_DIR, ".catalog_export.db")
+
+EXPORT_COLUMNS = ("modelo", "fabricante", "especificacoes_tecnicas", "info_geral")
+
+
+def _literal(value) -> str:
+    """Valor vindo do próprio banco (chave/marca d'água) como literal SQL."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _key(value) -> str:
+    """Chave da linha no estado: JSON do valor nativo, para que o marcador de removido volte com o mesmo tipo."""
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def delta_path(out_path: str) -> str:
+    """Arquivo do modo incremental ao lado da exportação completa (`catalogo.jsonl` -> `catalogo.delta.jsonl`)."""
+    root, ext = os.path.splitext(out_path)
+    return f"{root}.delta{ext}"
+
+
+def _as_json(value):
+    # No Postgres jsonb já chega como dict; no SQLite, como texto
+    if not value:
+        return {}
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return value
+    return value
+
+
+def iter_batches(db_tools, table: str = "smartphones", key_column: str = "id", batch_size: int | None = None,
+                 where: str | None = None, extra_columns: tuple = ()):
+    """Lê a tabela em lotes de `batch_size` por paginação de chave (keyset).
+
+    Cada lote é uma consulta `... WHERE id > último ORDER BY id LIMIT n` via
+    `executar_query`, então só um lote fica em memória, e o custo por lote não
+    cresce com a posição na tabela (diferente de OFFSET).
+    """
+    batch_size = int(batch_size or os.getenv("CATALOG_EXPORT_BATCH", "500"))
+    columns = ", ".join(dict.fromkeys((key_column,) + EXPORT_COLUMNS + tuple(extra_columns)))
+    last = None
+    while True:
+        conds = [f"({where})"] if where else []
+        if last is not None:
+            conds.append(f"{key_column} > {_literal(last)}")
+        sql = f"SELECT {columns} FROM {table}"
+        if conds:
+            sql += " WHERE " + " AND ".join(conds)
+        sql += f" ORDER BY {key_column} LIMIT {batch_size};"
+        rows = db_tools.executar_query(sql) or []
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1][key_column]
+
+
+def _row_doc(r: dict, key_column: str = "id") -> dict:
+    return {
+        "id": r[key_column],
+        "modelo": r.get("modelo") or "",
+        "fabricante": r.get("fabricante") or "",
+        "especificacoes_tecnicas": _as_json(r.get("especificacoes_tecnicas")),
+        "info_geral": _as_json(r.get("info_geral")),
+    }
+
+
+class ExportState:
+    """Estado do modo incremental num SQLite local: hash por linha e marca d'água da coluna de alteração.
+
+    Fica em disco para que a memória não cresça com o tamanho da tabela.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.getenv("CATALOG_EXPORT_STATE", DEFAULT_STATE_PATH)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS row_hashes (key TEXT PRIMARY KEY, sha TEXT NOT NULL, gen INTEGER NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def get_meta(self, name: str):
+        """Valor com o tipo original (número continua número); datas voltam como texto ISO."""
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        if not row:
+            return None
+        try:
+            return json.loads(row[0])
+        except ValueError:
+            return row[0]
+
+    def set_meta(self, name: str, value) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)",
+                          (name, json.dumps(value, ensure_ascii=False, default=str)))
+
+    def changed(self, keys_shas: list[tuple[str, str]], gen: int) -> set[str]:
+        """Marca as chaves do lote como vistas nesta geração e devolve as novas/alteradas."""
+        keys = [k for k, _ in keys_shas]
+        old = {}
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            old.update(self.conn.execute(
+                f"SELECT key, sha FROM row_hashes WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall())
+        self.conn.executemany("INSERT OR REPLACE INTO row_hashes (key, sha, gen) VALUES (?, ?, ?)",
+                              [(k, sha, gen) for k, sha in keys_shas])
+        return {k for k, sha in keys_shas if old.get(k) != sha}
+
+    def removed(self, gen: int) -> list:
+        """Chaves não vistas nesta geração, com o tipo original."""
+        keys = [r[0] for r in self.conn.execute("SELECT key FROM row_hashes WHERE gen < ?", (gen,))]
+        self.conn.execute("DELETE FROM row_hashes WHERE gen < ?", (gen,))
+        out = []
+        for key in keys:
+            try:
+                out.append(json.loads(key))
+            except ValueError:
+                out.append(key)
+        return out
+
+    def commit(self) -> None:
+        self.conn.commit()
+
+    def rollback(self) -> None:
+        self.conn.rollback()
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+def export_catalog(db_tools, out_path: str, incremental: bool = False, change_column: str | None = None,
+                   key_column: str = "id", table: str = "smartphones", batch_size: int | None = None,
+                   state: ExportState | None = None) -> dict:
+    """Exporta a tabela de produtos para JSONL em streaming; cada linha traz o `id` (valor de `key_column`).
+
+    - completo (padrão): todas as linhas, gravadas lote a lote em `out_path`;
+    - `incremental=True`: só linhas novas ou alteradas, detectadas pelo hash
+      da linha ou, com `change_column`, pela marca d'água dessa coluna,
+      gravadas em `delta_path(out_path)`; a exportação completa não é tocada.
+      No modo por hash, produtos removidos saem como `{"id": ..., "removido": true}`.
+
+    O arquivo é escrito num temporário e só substitui o destino ao final;
+    `arquivo` nas estatísticas diz qual foi. Sem alterações no modo
+    incremental, nada é gravado e `mudou` vem False, para que o chamador pule
+    o re-upload.
+    """
+    target = delta_path(out_path) if incremental else out_path
+    os.makedirs(os.path.dirname(os.path.abspath(target)), exist_ok=True)
+    own_state = incremental and state is None
+    state = (state or ExportState()) if incremental else None
+    gen = int(state.get_meta("gen") or 0) + 1 if state else 0
+    watermark = state.get_meta(f"watermark:{table}:{change_column}") if state and change_column else None
+    where = f"{change_column} > {_literal(watermark)}" if watermark is not None else None
+    extra = (change_column,) if change_column else ()
+
+    stats = {"linhas": 0, "emitidas": 0, "removidas": 0, "lotes": 0, "arquivo": target, "mudou": False}
+    tmp = f"{target}.{os.getpid()}.tmp"
+    # Só linhas acima da marca anterior chegam aqui: o maior valor lido (tipo nativo) é a nova marca
+    top = None
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            for rows in iter_batches(db_tools, table, key_column, batch_size, where, extra):
+                stats["lotes"] += 1
+                stats["linhas"] += len(rows)
+                docs = [(_key(r[key_column]), _row_doc(r, key_column)) for r in rows]
+                lines = {k: json.dumps(doc, ensure_ascii=False, sort_keys=True) for k, doc in docs}
+                if state and not change_column:
+                    emit = state.changed([(k, hashlib.sha256(line.encode("utf-8")).hexdigest()) for k, line in lines.items()], gen)
+                else:
+                    emit = lines.keys()
+                if change_column:
+                    values = [r[change_column] for r in rows if r.get(change_column) is not None]
+                    if values and (top is None or max(values) > top):
+                        top = max(values)
+                for k, line in lines.items():
+                    if k in emit:
+                        f.write(line + "\n")
+                        stats["emitidas"] += 1
+            if state and not change_column:
+                for key in state.removed(gen):
+                    f.write(json.dumps({"id": key, "removido": True}, ensure_ascii=False) + "\n")
+                    stats["removidas"] += 1
+        stats["mudou"] = not incremental or bool(stats["emitidas"] or stats["removidas"])
+        if stats["mudou"]:
+            os.replace(tmp, target)
+        else:
+            os.remove(tmp)
+        if state:
+            state.set_meta("gen", gen)
+            if change_column and top is not None:
+                state.set_meta(f"watermark:{table}:{change_column}", top)
+            state.commit()
+    except BaseException:
+        if state:
+            state.rollback()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        if own_state:
+            state.close()
+
+    modo = "incremental" if incremental else "completo"
+    print(f"📤 Exportação {modo}: {stats['linhas']} linhas lidas em {stats['lotes']} lotes, "
+          f"{stats['emitidas']} emitidas, {stats['removidas']} removidas", file=sys.stderr)
+    return stats
@@ -0,0 +1,172 @@
+import re
+
+import numpy as np
+
+from rag.answer_cache import normalize_question
+from rag.spec_catalog import SpecCatalog, format_number, format_price, format_storage
+
+# Superlativos: (padrão na pergunta normalizada, coluna, descendente, título)
+SUPERLATIVES = (
+    (r"\bmais barat[oa]s?\b|\bmenor preco\b|\bmais em conta\b", "price", False, "💰 *MAIS BARATO:*"),
+    (r"\bmais car[oa]s?\b|\bmaior preco\b", "price", True, "💎 *MAIS CARO:*"),
+    (r"\b(maior|melhor|mais) bateria\b|\bbateria (maior|melhor)\b|\bdura mais\b", "battery_mah", True, "🔋 *MAIOR BATERIA:*"),
+    (r"\bmais fin[oa]s?\b|\bmenor espessura\b", "thickness_mm", False, "📏 *MAIS FINO:*"),
+    (r"\b(melhor|maior) camera\b|\bcamera (melhor|maior)\b|\bmais megapixels?\b", "camera_mp", True, "📸 *MELHOR CÂMERA (MP):*"),
+    (r"\b(mais|maior) (armazenamento|memoria)\b", "storage_gb", True, "💾 *MAIS ARMAZENAMENTO:*"),
+    (r"\b(mais|maior) ram\b", "ram_gb", True, "🧠 *MAIS RAM:*"),
+    (r"\bmaior tela\b|\btela maior\b", "screen_in", True, "📱 *MAIOR TELA:*"),
+    (r"\bmenor tela\b|\btela menor\b|\bmais compacto\b", "screen_in", False, "📱 *MENOR TELA:*"),
+    (r"\bmelhor processador\b|\bprocessador mais rapido\b|\bmais rapido\b|\bjogos pesados\b", "cpu_ghz", True, "⚡ *PROCESSADOR MAIS RÁPIDO (GHz):*"),
+)
+
+FLAGS = (
+    (r"\b5g\b", "has_5g", "5G"),
+    (r"\bnfc\b", "nfc", "NFC"),
+    (r"\bdual sim\b|\b(dois|2) chips\b", "dual_sim", "Dual SIM"),
+    (r"\be ?sim\b", "esim", "eSIM"),
+)
+
+LISTING = r"\b(quais|qual celular|qual aparelho|qual modelo|qual tem|quem tem|tem algum|algum celular|algum aparelho|celulares?|aparelhos?)\b"
+
+NOT_UNIT = r"(?!\d|\s*(?:gb|tb|mah|mp|mm|ghz)\b)"
+PRICE_AROUND = r"\b(?:faixa de|por volta de|em torno de|cerca de|uns|perto de)\s*r?\s*(\d+)" + NOT_UNIT
+PRICE_MAX = r"\b(?:ate|abaixo de|menos de|no maximo|maximo)\s*r?\s*(\d+)" + NOT_UNIT
+PRICE_MIN = r"\b(?:acima de|mais de|a partir de|pelo menos)\s*r?\s*(\d+)" + NOT_UNIT
+STORAGE = r"\b(\d+)\s*(tb|gb)\b(?!\s*de ram)"
+
+AROUND_TOLERANCE = 0.15
+
+
+def _price(raw: str) -> float | None:
+    value = float(raw)
+    # Valores pequenos são quase sempre GB/mAh/MP e não preço
+    return value if value >= 300 else None
+
+
+def parse_catalog_query(message: str) -> dict | None:
+    """Reconhece superlativos e filtros (preço, armazenamento, 5G...) que o catálogo responde sozinho."""
+    # "R$ 3.000" -> "3000" antes de a normalização remover a pontuação
+    text = normalize_question(re.sub(r"(?<=\d)\.(?=\d{3}\b)", "", message))
+    text = re.sub(r"\b(\d+) mil\b", lambda m: str(int(m.group(1)) * 1000), text)
+    query = {"sort": None, "desc": False, "limit": None, "ranges": [], "flags": [], "near": None, "titulo": None}
+
+    for pattern, field, desc, titulo in SUPERLATIVES:
+        if re.search(pattern, text):
+            query.update(sort=field, desc=desc, limit=1, titulo=titulo)
+            break
+
+    m = re.search(PRICE_AROUND, text)
+    if m and _price(m.group(1)):
+        alvo = _price(m.group(1))
+        query["near"] = ("price", alvo)
+        query["titulo"] = query["titulo"] or f"💰 *NA FAIXA DE R$ {format_price(alvo)}:*"
+    else:
+        m = re.search(PRICE_MAX, text)
+        if m and _price(m.group(1)):
+            query["ranges"].append(("price", -np.inf, _price(m.group(1))))
+            query["titulo"] = query["titulo"] or f"💰 *ATÉ R$ {format_price(_price(m.group(1)))}:*"
+        m = re.search(PRICE_MIN, text)
+        if m and _price(m.group(1)):
+            query["ranges"].append(("price", _price(m.group(1)), np.inf))
+            query["titulo"] = query["titulo"] or f"💰 *ACIMA DE R$ {format_price(_price(m.group(1)))}:*"
+
+    m = re.search(STORAGE, text)
+    if m:
+        gb = float(m.group(1)) * (1024 if m.group(2) == "tb" else 1)
+        query["ranges"].append(("storage_gb", gb, np.inf))
+        query["titulo"] = query["titulo"] or f"💾 *COM {format_storage(gb)} OU MAIS:*"
+
+    nomes = []
+    for pattern, field, nome in FLAGS:
+        if re.search(pattern, text):
+            query["flags"].append(field)
+            nomes.append(nome)
+
+    if query["sort"] is None and not query["ranges"] and not query["near"]:
+        # Só flags: exige uma pergunta de listagem ("quais têm 5G?"), não "o S24 tem NFC?"
+        if not query["flags"] or not re.search(LISTING, text):
+            return None
+    if query["flags"] and not query["titulo"]:
+        query["titulo"] = f"📶 *COM {' E '.join(nomes)}:*"
+    if query["sort"] is None:
+        query["sort"] = "price"
+    return query
+
+
+def run_catalog_query(catalog: SpecCatalog, query: dict) -> list[dict] | None:
+    """Executa a consulta com máscaras vetorizadas e a ordem pré-calculada da coluna.
+
+    Retorna None quando o catálogo não tem dados para a coluna pedida ou
+    algum aparelho do filtro está sem dado num atributo sim/não (a pergunta
+    segue para o File Search) e o formato de `consulta_catalogo` de
+    `AIAgent._format_response` nos demais casos.
+    """
+    sort = query["sort"]
+    if catalog.size == 0 or catalog.known.get(sort, 0) == 0:
+        return None
+    mask = np.ones(catalog.size, dtype=bool)
+    for field, low, high in query["ranges"]:
+        col = catalog.columns[field]
+        mask &= (col >= low) & (col <= high)
+    for field in query["flags"]:
+        # Aparelho sem dado não pode sair da lista como "não tem": a pergunta vai para o File Search
+        if np.any(catalog.columns[field][mask] == -1):
+            return None
+        mask &= catalog.columns[field] == 1
+
+    # Ordem crescente com NaN ao final: corta os desconhecidos e inverte se for "maior"
+    order = catalog.order[sort][:catalog.known[sort]]
+    hits = order[mask[order]]
+    if query["near"] and len(hits):
+        hits = _nearest(catalog, hits, *query["near"])
+    if query["desc"]:
+        hits = hits[::-1]
+    if not len(hits):
+        return [{"erro": "Não encontrei nenhum aparelho com esse critério no nosso catálogo. Quer que eu sugira o mais próximo?"}]
+    if query["limit"]:
+        # Mantém empates com o primeiro colocado
+        top = catalog.columns[sort][hits[0]]
+        hits = hits[catalog.columns[sort][hits] == top][:max(query["limit"], 3)]
+
+    itens = []
+    for i in hits:
+        r = catalog.row(int(i))
+        itens.append({
+            "modelo": r["model"],
+            "fabricante": r["manufacturer"],
+            "destaque": _destaque(r, sort),
+        })
+    return [{"titulo": query["titulo"], "itens": itens}]
+
+
+def _nearest(catalog: SpecCatalog, hits: np.ndarray, field: str, alvo: float) -> np.ndarray:
+    """Aparelhos dentro da tolerância do valor alvo; se nenhum, os dois mais próximos."""
+    values = catalog.columns[field][hits]
+    dentro = hits[np.abs(values - alvo) <= alvo * AROUND_TOLERANCE]
+    if len(dentro):
+        return dentro
+    # hits já está em ordem crescente de `field`: os vizinhos do ponto de inserção são os mais próximos
+    pos = int(np.searchsorted(values, alvo))
+    vizinhos = hits[max(pos - 1, 0):pos + 1]
+    return vizinhos[np.argsort(np.abs(catalog.columns[field][vizinhos] - alvo), kind="stable")]
+
+
+def _destaque(r: dict, field: str) -> str:
+    partes = []
+    if field == "battery_mah" and r["battery_mah"]:
+        partes.append(f"🔋 {r['battery_mah']:g} mAh")
+    elif field == "thickness_mm" and r["thickness_mm"]:
+        partes.append(f"📏 {format_number(r['thickness_mm'])} mm")
+    elif field == "camera_mp" and r["camera_mp"]:
+        partes.append(f"📸 {r['camera_mp']:g} MP")
+    elif field == "ram_gb" and r["ram_gb"]:
+        partes.append(f"🧠 {r['ram_gb']:g} GB RAM")
+    elif field == "screen_in" and r["screen_in"]:
+        partes.append(f"📱 {format_number(r['screen_in'])}\"")
+    elif field == "cpu_ghz" and r["processor"]:
+        partes.append(f"⚡ {r['processor']}")
+    if r["storage_gb"]:
+        partes.append(f"💾 {format_storage(r['storage_gb'])}")
+    if r["price"]:
+        partes.append(f"💰 R$ {format_price(r['price'])}")
+    return " | ".join(partes)
@@ -0,0 +1,238 @@
+import os
+import json
+import asyncio
+import mimetypes
+import threading
+import contextvars
+
+import httpx
+
+from rag.answer_cache import AnswerCache
+from rag.single_flight import SingleFlight
+from rag.llm_scheduler import SCHEDULER
+
+# GEMINI_API_BASE aponta para outro servidor (ex.: o falso de scripts/fake_services.py)
+BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+
+
+def _extract_text(data) -> str:
+    if isinstance(data, dict):
+        cand = data.get("candidates", [])
+        if cand:
+            parts = cand[0].get("content", {}).get("parts", [])
+            return "".join(p.get("text", "") for p in parts if isinstance(p, dict))
+    return ""
+
+
+class AsyncGeminiFileSearch:
+    """Cliente asyncio do File Search (REST) com pool de conexões keep-alive.
+
+    Mesma interface dos gerenciadores síncronos (`ensure_store`, `upload_file`,
+    `query`, `list_documents`, `delete_document`), mas com corrotinas. As
+    operações de upload são acompanhadas com espera exponencial.
+    """
+
+    def __init__(self, api_key: str | None = None, store_name: str | None = None, cache: AnswerCache | None = None,
+                 flight: SingleFlight | None = None, transport: httpx.AsyncBaseTransport | None = None):
+        self.api_key = api_key or os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
+        self.store_name = store_name
+        self.cache = cache or AnswerCache()
+        self.flight = flight or SingleFlight()
+        self.last_document_name = None
+        self.poll_initial = float(os.getenv("RAG_POLL_INITIAL", "0.5"))
+        self.poll_max = float(os.getenv("RAG_POLL_MAX", "8"))
+        self.poll_timeout = float(os.getenv("RAG_POLL_TIMEOUT", "300"))
+        self.http = httpx.AsyncClient(
+            base_url=BASE,
+            params={"key": self.api_key or ""},
+            timeout=httpx.Timeout(
+                float(os.getenv("RAG_HTTP_TIMEOUT", "30")),
+                connect=float(os.getenv("RAG_HTTP_CONNECT_TIMEOUT", "5")),
+            ),
+            limits=httpx.Limits(
+                max_connections=int(os.getenv("RAG_HTTP_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.getenv("RAG_HTTP_KEEPALIVE", "10")),
+                keepalive_expiry=60,
+            ),
+            transport=transport,
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+    async def ensure_store(self, display_name: str = "phones-whatsapp") -> str:
+        if self.store_name:
+            return self.store_name
+        r = await self.http.get("/v1beta/fileSearchStores")
+        if r.is_success:
+            for s in r.json().get("fileSearchStores", []):
+                if s.get("displayName") == display_name:
+                    self.store_name = s.get("name")
+                    return self.store_name
+        rc = await self.http.post("/v1beta/fileSearchStores", json={"displayName": display_name})
+        rc.raise_for_status()
+        self.store_name = rc.json().get("name")
+        return self.store_name
+
+    async def upload_file(self, file_path: str, display_name: str | None = None) -> None:
+        self.last_document_name = None
+        op = await self._wait_operation(await self.start_upload(file_path, display_name))
+        self.last_document_name = (op.get("response") or {}).get("documentName")
+        self.cache.invalidate_store(self.store_name)
+
+    async def start_upload(self, file_path: str, display_name: str | None = None) -> dict:
+        """Envia o arquivo e devolve a operação de indexação sem esperar que termine."""
+        config = {"displayName": display_name or os.path.basename(file_path)}
+        mime = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+        with open(file_path, "rb") as fh:
+            ru = await self.http.post(
+                f"/upload/v1beta/{self.store_name}:uploadToFileSearchStore",
+                files={"file": (os.path.basename(file_path), fh, mime)},
+                data={"config": json.dumps(config)},
+            )
+        ru.raise_for_status()
+        # Documento novo na store: respostas antigas podem estar desatualizadas
+        self.cache.invalidate_store(self.store_name)
+        return ru.json()
+
+    async def get_operation(self, name: str) -> dict:
+        ro = await self.http.get(f"/v1beta/{name}")
+        ro.raise_for_status()
+        return ro.json()
+
+    async def _wait_operation(self, op: dict) -> dict:
+        """Consulta a operação com espera exponencial até `done` ou `RAG_POLL_TIMEOUT`."""
+        delay = self.poll_initial
+        deadline = asyncio.get_running_loop().time() + self.poll_timeout
+        while not op.get("done"):
+            if asyncio.get_running_loop().time() >= deadline:
+                raise TimeoutError(f"Operação {op.get('name')} não terminou em {self.poll_timeout:g}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.poll_max)
+            op = await self.get_operation(op["name"])
+        if op.get("error"):
+            raise RuntimeError(f"Falha na operação {op.get('name')}: {op['error']}")
+        return op
+
+    async def list_documents(self) -> list[dict]:
+        docs = []
+        page_token = None
+        while True:
+            params = {"pageSize": 20}
+            if page_token:
+                params["pageToken"] = page_token
+            r = await self.http.get(f"/v1beta/{self.store_name}/documents", params=params)
+            r.raise_for_status()
+            data = r.json()
+            for d in data.get("documents", []):
+                docs.append({"name": d.get("name"), "display_name": d.get("displayName")})
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                return docs
+
+    async def delete_document(self, document_name: str) -> None:
+        r = await self.http.delete(f"/v1beta/{document_name}", params={"force": "true"})
+        r.raise_for_status()
+        self.cache.invalidate_store(self.store_name)
+
+    async def query(self, text: str) -> str:
+        cached = self.cache.get(self.store_name, text)
+        if cached is not None:
+            return cached
+        return await self.flight.do_async(self.cache.key(self.store_name, text), lambda: self._fetch(text))
+
+    async def _fetch(self, text: str) -> str:
+        answer = await self._query_uncached(text)
+        self.cache.put(self.store_name, text, answer)
+        return answer
+
+    async def _generate(self, body: dict) -> httpx.Response:
+        rg = await self.http.post("/v1beta/models/gemini-2.5-flash:generateContent", json=body)
+        if rg.status_code == 429:
+            # Levanta para o agendador pausar o provedor
+            rg.raise_for_status()
+        return rg
+
+    async def _query_uncached(self, text: str) -> str:
+        body = {
+            "contents": [{"role": "user", "parts": [{"text": text}]}],
+            "tools": [{"file_search": {"file_search_store_names": [self.store_name]}}],
+        }
+        rg = await SCHEDULER.call_async("gemini", lambda: self._generate(body))
+        if not rg.is_success:
+            return ""
+        return _extract_text(rg.json())
+
+
+class SyncFileSearchAdapter:
+    """Expõe o cliente assíncrono com a interface síncrona usada pelo AIAgent.
+
+    As corrotinas rodam num event loop próprio, numa thread de fundo, de modo
+    que o pool de conexões é compartilhado por todas as threads do Flask.
+    """
+
+    def __init__(self, client: AsyncGeminiFileSearch | None = None):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="file-search-async", daemon=True)
+        self._thread.start()
+        # O AsyncClient precisa ser criado dentro do loop que vai usá-lo
+        self.client = client or self._run(self._create())
+
+    @staticmethod
+    async def _create() -> AsyncGeminiFileSearch:
+        return AsyncGeminiFileSearch()
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(self._with_context(contextvars.copy_context(), coro), self._loop).result()
+
+    @staticmethod
+    async def _with_context(ctx: contextvars.Context, coro):
+        # Leva para a task as variáveis de contexto da thread chamadora (ex.: prioridade no agendador)
+        for var, value in ctx.items():
+            var.set(value)
+        return await coro
+
+    @property
+    def store_name(self):
+        return self.client.store_name
+
+    @store_name.setter
+    def store_name(self, value):
+        self.client.store_name = value
+
+    @property
+    def cache(self) -> AnswerCache:
+        return self.client.cache
+
+    @property
+    def flight(self) -> SingleFlight:
+        return self.client.flight
+
+    @property
+    def last_document_name(self):
+        return self.client.last_document_name
+
+    def ensure_store(self, display_name: str = "phones-whatsapp") -> str:
+        return self._run(self.client.ensure_store(display_name))
+
+    def upload_file(self, file_path: str, display_name: str | None = None) -> None:
+        self._run(self.client.upload_file(file_path, display_name))
+
+    def list_documents(self) -> list[dict]:
+        return self._run(self.client.list_documents())
+
+    def delete_document(self, document_name: str) -> None:
+        self._run(self.client.delete_document(document_name))
+
+    def query(self, text: str) -> str:
+        return self._run(self.client.query(text))
+
+    def close(self) -> None:
+        self._run(self.client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -3,12 +3,24 @@ import time
 import json
 import requests
 
-BASE = "https://generativelanguage.googleapis.com"
+from rag.answer_cache import AnswerCache
+from rag.single_flight import SingleFlight
+from rag.llm_scheduler import SCHEDULER
+
+# GEMINI_API_BASE aponta para outro servidor (ex.: o falso de scripts/fake_services.py)
+BASE = os.getenv("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
 
 class GeminiFileSearchREST:
-    def __init__(self, api_key: str | None = None, store_name: str | None = None):
+    def __init__(self, api_key: str | None = None, store_name: str | None = None, cache: AnswerCache | None = None, flight: SingleFlight | None = None):
         self.api_key = api_key or os.environ.get("GOOGLE_API_KEY") or os.environ.get("GEMINI_API_KEY")
         self.store_name = store_name
+        self.cache = cache or AnswerCache()
+        self.flight = flight or SingleFlight()
+        self.last_document_name = None
+        # Sessão com keep-alive: evita um handshake TLS por requisição
+        self.http = requests.Session()
+        # Sem timeout, uma geração travada prende a thread (e a vaga do hedge) para sempre
+        self.timeout = (float(os.getenv("RAG_HTTP_CONNECT_TIMEOUT", "5")), float(os.getenv("RAG_HTTP_TIMEOUT", "30")))
 
     def _url(self, path: str) -> str:
         return f"{BASE}{path}?key={self.api_key}"
@@ -17,7 +29,7 @@ class GeminiFileSearchREST:
         if self.store_name:
             return self.store_name
         # List
-        r = requests.get(self._url("/v1beta/fileSearchStores"))
+        r = self.http.get(self._url("/v1beta/fileSearchStores"))
         if r.ok:
             data = r.json()
             for s in data.get("fileSearchStores", []):
@@ -26,30 +38,83 @@ class GeminiFileSearchREST:
                     return self.store_name
         # Create
         payload = {"displayName": display_name}
-        rc = requests.post(self._url("/v1beta/fileSearchStores"), json=payload)
+        rc = self.http.post(self._url("/v1beta/fileSearchStores"), json=payload)
         rc.raise_for_status()
         self.store_name = rc.json().get("name")
         return self.store_name
 
     def upload_file(self, file_path: str, display_name: str | None = None) -> None:
-        files = {"file": open(file_path, "rb")}
+        """Envia e espera a indexação; TimeoutError se passar de RAG_POLL_TIMEOUT."""
+        self.last_document_name = None
         config = {"displayName": display_name or os.path.basename(file_path)}
         # Upload to store (media endpoint)
         url = self._url(f"/upload/v1beta/{self.store_name}:uploadToFileSearchStore")
-        ru = requests.post(url, files=files, data={"config": json.dumps(config)})
+        with open(file_path, "rb") as fh:
+            ru = self.http.post(url, files={"file": fh}, data={"config": json.dumps(config)})
         ru.raise_for_status()
         op = ru.json()
+        # Documento novo na store: respostas antigas podem estar desatualizadas
+        self.cache.invalidate_store(self.store_name)
         name = op.get("name")
-        # Poll operation
+        # Poll operation com espera exponencial
+        delay = float(os.getenv("RAG_POLL_INITIAL", "0.5"))
+        poll_timeout = float(os.getenv("RAG_POLL_TIMEOUT", "300"))
+        deadline = time.monotonic() + poll_timeout
         while True:
-            ro = requests.get(self._url(f"/v1beta/{name}"))
+            ro = self.http.get(self._url(f"/v1beta/{name}"))
             ro.raise_for_status()
             j = ro.json()
             if j.get("done"):
+                if j.get("error"):
+                    raise RuntimeError(f"Falha na operação {name}: {j['error']}")
+                self.last_document_name = (j.get("response") or {}).get("documentName")
                 break
-            time.sleep(2)
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"Operação {name} não terminou em {poll_timeout:g}s")
+            time.sleep(delay)
+            delay = min(delay * 2, float(os.getenv("RAG_POLL_MAX", "8")))
+        self.cache.invalidate_store(self.store_name)
+
+    def list_documents(self) -> list[dict]:
+        docs = []
+        page_token = None
+        while True:
+            params = {"pageSize": 20}
+            if page_token:
+                params["pageToken"] = page_token
+            r = self.http.get(self._url(f"/v1beta/{self.store_name}/documents"), params=params)
+            r.raise_for_status()
+            data = r.json()
+            for d in data.get("documents", []):
+                docs.append({"name": d.get("name"), "display_name": d.get("displayName")})
+            page_token = data.get("nextPageToken")
+            if not page_token:
+                return docs
+
+    def delete_document(self, document_name: str) -> None:
+        r = self.http.delete(self._url(f"/v1beta/{document_name}"), params={"force": "true"})
+        r.raise_for_status()
+        self.cache.invalidate_store(self.store_name)
 
     def query(self, text: str) -> str:
+        cached = self.cache.get(self.store_name, text)
+        if cached is not None:
+            return cached
+        return self.flight.do(self.cache.key(self.store_name, text), lambda: self._fetch(text))
+
+    def _fetch(self, text: str) -> str:
+        answer = self._query_uncached(text)
+        self.cache.put(self.store_name, text, answer)
+        return answer
+
+    def _generate(self, body: dict) -> requests.Response:
+        rg = self.http.post(self._url("/v1beta/models/gemini-2.5-flash:generateContent"), json=body, timeout=self.timeout)
+        if rg.status_code == 429:
+            # Levanta para o agendador pausar o provedor
+            rg.raise_for_status()
+        return rg
+
+    def _query_uncached(self, text: str) -> str:
         tools = [{
             "file_search": {
                 "file_search_store_names": [self.store_name]
@@ -60,7 +125,7 @@ class GeminiFileSearchREST:
             "contents": text,
             "tools": tools
         }
-        rg = requests.post(self._url("/v1beta/models/gemini-2.5-flash:generateContent"), json=body)
+        rg = SCHEDULER.call("gemini", self._generate, body)
         if not rg.ok:
             return ""
         data = rg.json()
@@ -3,6 +3,9 @@ import time
 from google import genai
 from google.genai import types
 
+from rag.llm_scheduler import SCHEDULER
+from rag.catalog_export import export_catalog
+
 class GeminiFileSearchManager:
     def __init__(self, store_name: str | None = None):
         self.client = genai.Client()
@@ -28,33 +31,23 @@ class GeminiFileSearchManager:
         cfg = types.GenerateContentConfig(
             tools=[{"file_search": {"file_search_store_names": [self.store_name]}}]
         )
-        resp = self.client.models.generate_content(
+        resp = SCHEDULER.call(
+            "gemini",
+            self.client.models.generate_content,
             model="gemini-2.5-flash",
             contents=text,
             config=cfg
         )
         return getattr(resp, "text", "") or ""
 
-    def export_postgres_to_file(self, db_tools, out_path: str) -> str:
-        rows = db_tools.executar_query(
-            "SELECT modelo, fabricante, especificacoes_tecnicas, info_geral FROM smartphones;"
-        )
-        os.makedirs(os.path.dirname(out_path), exist_ok=True)
-        with open(out_path, "w", encoding="utf-8") as f:
-            for r in rows or []:
-                modelo = r.get("modelo") or ""
-                fabricante = r.get("fabricante") or ""
-                specs = r.get("especificacoes_tecnicas") or {}
-                info = r.get("info_geral") or {}
-                linha = {
-                    "modelo": modelo,
-                    "fabricante": fabricante,
-                    "especificacoes_tecnicas": specs,
-                    "info_geral": info,
-                }
-                f.write(json_dumps(linha) + "\n")
-        return out_path
+    def export_postgres_to_file(self, db_tools, out_path: str, incremental: bool = False,
+                                change_column: str | None = None) -> str | None:
+        """Exporta a tabela smartphones em lotes (ver rag.catalog_export).
 
-def json_dumps(obj):
-    import json
-    return json.dumps(obj, ensure_ascii=False)
+        Devolve o arquivo gravado: `out_path` na exportação completa e o delta
+        (`catalog_export.delta_path(out_path)`) no modo incremental, que não
+        sobrescreve a exportação completa. Devolve None quando nada mudou, e o
+        upload pode ser pulado.
+        """
+        stats = export_catalog(db_tools, out_path, incremental=incremental, change_column=change_column)
+        return stats["arquivo"] if stats["mudou"] else None
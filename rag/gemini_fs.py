@@ -3,22 +3,33 @@ import time
 from google import genai
 from google.genai import types
 
+from rag.answer_cache import AnswerCache
+from rag.single_flight import SingleFlight
+from rag.llm_scheduler import SCHEDULER, SchedulerBusy
+from tracing import record
+
 
 class GeminiFileSearchManager:
-    def __init__(self):
+    def __init__(self, cache: AnswerCache | None = None, flight: SingleFlight | None = None):
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
             raise ValueError("GOOGLE_API_KEY nao definida")
         self.client = genai.Client(api_key=api_key)
         self.store_name = None
+        self.cache = cache or AnswerCache()
+        self.flight = flight or SingleFlight()
+        self.last_document_name = None
+        # Timeout por geração (ms no SDK); sem ele uma chamada travada prende a thread do hedge
+        self.request_timeout_ms = int(float(os.getenv("RAG_HTTP_TIMEOUT", "30")) * 1000)
     
     def ensure_store(self, display_name="default-store"):
         try:
-            stores = self.client.file_search_stores.list()
-            if stores and hasattr(stores, 'file_search_stores') and len(stores.file_search_stores) > 0:
-                self.store_name = stores.file_search_stores[0].name
-                print(f"OK Store encontrada: {self.store_name}")
-                return self.store_name
+            # Procura pelo display_name em vez de pegar a primeira store da conta
+            for store in self.client.file_search_stores.list():
+                if getattr(store, "display_name", None) == display_name:
+                    self.store_name = store.name
+                    print(f"OK Store encontrada: {self.store_name}")
+                    return self.store_name
         except Exception as e:
             print(f"Aviso ao listar: {e}")
         
@@ -39,6 +50,8 @@ class GeminiFileSearchManager:
             raise FileNotFoundError(f"Arquivo nao encontrado: {file_path}")
         
         display_name = display_name or os.path.basename(file_path)
+        # Sem indexação confirmada, não há documento novo (nada da chamada anterior)
+        self.last_document_name = None
         
         try:
             print(f"Upload: {file_path}")
@@ -48,43 +61,147 @@ class GeminiFileSearchManager:
                 config={"display_name": display_name}
             )
             print(f"Operacao: {operation_name}")
+            # Documento novo na store: respostas antigas podem estar desatualizadas
+            self.cache.invalidate_store(self.store_name)
             print("Aguardando indexacao...")
             
             for i in range(60):
                 operation = self.client.operations.get(operation_name)
                 if operation.done:
+                    if getattr(operation, "error", None):
+                        raise RuntimeError(f"Falha na indexacao: {operation.error}")
                     print("OK Arquivo indexado")
+                    self.last_document_name = getattr(getattr(operation, "response", None), "document_name", None)
+                    self.cache.invalidate_store(self.store_name)
                     return self.store_name
                 print(f"  Processando ({i+1}/60)")
                 time.sleep(2)
             
-            return self.store_name
+            raise TimeoutError(f"Indexacao de {display_name} nao terminou em 120s")
         except Exception as e:
             print(f"Erro no upload: {e}")
             raise
     
+    def list_documents(self):
+        if not self.store_name:
+            raise ValueError("Store nao inicializada")
+        return [
+            {"name": d.name, "display_name": getattr(d, "display_name", None)}
+            for d in self.client.file_search_stores.documents.list(parent=self.store_name)
+        ]
+    
+    def delete_document(self, document_name):
+        self.client.file_search_stores.documents.delete(name=document_name, config={"force": True})
+        self.cache.invalidate_store(self.store_name)
+    
     def query(self, pergunta):
         if not self.store_name:
             raise ValueError("Store nao inicializada")
         
+        cached = self.cache.get(self.store_name, pergunta)
+        if cached is not None:
+            return cached
+        
+        # Perguntas iguais em paralelo (ex.: grupo após uma promoção) viram uma só chamada
+        return self.flight.do(self.cache.key(self.store_name, pergunta), lambda: self._fetch(pergunta))
+    
+    def query_stream(self, pergunta):
+        """Gera a resposta em trechos (generate_content_stream); o texto completo vai para o cache."""
+        if not self.store_name:
+            raise ValueError("Store nao inicializada")
+        
+        cached = self.cache.get(self.store_name, pergunta)
+        if cached is not None:
+            yield cached
+            return
+        
+        partes = []
+        t0 = time.perf_counter()
+        record("fila_llm", t0, SCHEDULER.acquire("gemini"), provedor="gemini")
+        t_llm = time.perf_counter()
+        erro = None
+        try:
+            for chunk in self.client.models.generate_content_stream(
+                model="gemini-2.5-flash",
+                contents=pergunta,
+                config=self._search_config()
+            ):
+                if chunk.text:
+                    partes.append(chunk.text)
+                    yield chunk.text
+        except Exception as e:
+            erro = e
+            raise
+        finally:
+            SCHEDULER.release("gemini", erro)
+            record("llm_gemini", t_llm, time.perf_counter() - t_llm, streaming=True)
+        self._remember(pergunta, "".join(partes))
+    
+    async def query_async(self, pergunta):
+        if not self.store_name:
+            raise ValueError("Store nao inicializada")
+        
+        cached = self.cache.get(self.store_name, pergunta)
+        if cached is not None:
+            return cached
+        
+        async def _fetch_async():
+            texto = await self._query_uncached_async(pergunta)
+            self._remember(pergunta, texto)
+            return texto
+        
+        return await self.flight.do_async(self.cache.key(self.store_name, pergunta), _fetch_async)
+    
+    def _fetch(self, pergunta):
+        texto = self._query_uncached(pergunta)
+        self._remember(pergunta, texto)
+        return texto
+    
+    def _remember(self, pergunta, texto):
+        if texto and texto != "Erro ao processar":
+            self.cache.put(self.store_name, pergunta, texto)
+    
+    def _search_config(self):
+        return types.GenerateContentConfig(
+            http_options=types.HttpOptions(timeout=self.request_timeout_ms),
+            tools=[
+                types.Tool(
+                    file_search=types.FileSearch(
+                        file_search_store_names=[self.store_name]
+                    )
+                )
+            ]
+        )
+    
+    async def _query_uncached_async(self, pergunta):
+        try:
+            response = await SCHEDULER.call_async("gemini", lambda: self.client.aio.models.generate_content(
+                model="gemini-2.5-flash",
+                contents=pergunta,
+                config=self._search_config()
+            ))
+            return response.text
+        except SchedulerBusy:
+            raise
+        except Exception as e:
+            print(f"Erro na consulta: {e}")
+            return "Erro ao processar"
+    
+    def _query_uncached(self, pergunta):
         try:
             print(f"Consultando: {pergunta[:50]}")
             
-            response = self.client.models.generate_content(
+            response = SCHEDULER.call(
+                "gemini",
+                self.client.models.generate_content,
                 model="gemini-2.5-flash",
                 contents=pergunta,
-                config=types.GenerateContentConfig(
-                    tools=[
-                        types.Tool(
-                            file_search=types.FileSearch(
-                                file_search_store_names=[self.store_name]
-                            )
-                        )
-                    ]
-                )
+                config=self._search_config()
             )
             
             return response.text
+        except SchedulerBusy:
+            raise
         except Exception as e:
             print(f"Erro na consulta: {e}")
             import traceback
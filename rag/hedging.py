@@ -0,0 +1,195 @@
+import os
+import sys
+import time
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from rag.llm_scheduler import SchedulerBusy
+
+
+class CircuitBreaker:
+    """Para de chamar um provedor por `cooldown` segundos após `threshold` falhas seguidas.
+
+    Estados: "fechado" (normal), "aberto" (chamadas recusadas) e "meio_aberto"
+    (passado o cooldown, uma chamada de teste decide se volta a fechar).
+    """
+
+    def __init__(self, name: str, threshold: int | None = None, cooldown: float | None = None):
+        self.name = name
+        self.threshold = int(threshold if threshold is not None else os.getenv("BREAKER_FAILURES", "5"))
+        self.cooldown = float(cooldown if cooldown is not None else os.getenv("BREAKER_COOLDOWN", "30"))
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "fechado"
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return "aberto"
+        return "meio_aberto"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "fechado":
+                return True
+            if state == "meio_aberto" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                print(f"✅ Circuito {self.name} fechado novamente", file=sys.stderr)
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            reopen = self.opened_at is not None and self.trial_running
+            if reopen or (self.opened_at is None and self.failures >= self.threshold):
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f"🔌 Circuito {self.name} aberto por {self.cooldown:g}s após {self.failures} falhas", file=sys.stderr)
+            self.trial_running = False
+
+    def record_neutral(self) -> None:
+        """Chamada que não chegou ao provedor (ex.: fila local cheia): não conta como falha."""
+        with self._lock:
+            self.trial_running = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "estado": self.state,
+                "falhas_seguidas": self.failures,
+                "aberturas": self.times_opened,
+                "cooldown": self.cooldown,
+            }
+
+
+class HedgedCall:
+    """Chama o provedor principal e, se ele passar do orçamento de latência, dispara o reserva em paralelo.
+
+    Vale o primeiro resultado aceitável. O orçamento é `HEDGE_AFTER_MS` se
+    definido; senão, o p95 das latências recentes do principal (mínimo de
+    `HEDGE_MIN_MS`), começando em 4 s até haver amostras suficientes. Só
+    devem passar por aqui chamadas que vão ao provedor: respostas de cache
+    puxariam o p95 para baixo e o reserva seria disparado cedo demais.
+    O reserva roda num pool próprio: principais travados não o impedem de sair.
+    """
+
+    def __init__(self, primary: CircuitBreaker, backup: CircuitBreaker, workers: int | None = None,
+                 budget_ms: float | None = None, total_timeout: float | None = None, backup_workers: int | None = None):
+        self.primary = primary
+        self.backup = backup
+        fixed = budget_ms if budget_ms is not None else os.getenv("HEDGE_AFTER_MS")
+        self.fixed_budget = float(fixed) / 1000 if fixed else None
+        self.min_budget = float(os.getenv("HEDGE_MIN_MS", "1500")) / 1000
+        self.total_timeout = float(total_timeout if total_timeout is not None else os.getenv("HEDGE_TOTAL_TIMEOUT", "30"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(workers if workers is not None else os.getenv("HEDGE_WORKERS", "16")),
+            thread_name_prefix="hedge",
+        )
+        self._backup_executor = ThreadPoolExecutor(
+            max_workers=int(backup_workers if backup_workers is not None else os.getenv("HEDGE_BACKUP_WORKERS", "8")),
+            thread_name_prefix="hedge-reserva",
+        )
+        self._latencies = deque(maxlen=200)
+        self._lock = threading.Lock()
+        self.stats = {"chamadas": 0, "hedges": 0, "vitorias_principal": 0, "vitorias_reserva": 0, "sem_resposta": 0}
+
+    def budget(self) -> float:
+        if self.fixed_budget is not None:
+            return self.fixed_budget
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < 20:
+            return 4.0
+        return max(self.min_budget, samples[int(0.95 * (len(samples) - 1))])
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _submit(self, executor: ThreadPoolExecutor, breaker: CircuitBreaker, fn, acceptable, track: bool):
+        """Executa `fn` em `executor` (com o contexto atual) e registra o desfecho no disjuntor."""
+        ctx = contextvars.copy_context()
+        t0 = time.monotonic()
+        settled = threading.Event()
+
+        def _run():
+            result = ctx.run(fn)
+            if track:
+                with self._lock:
+                    self._latencies.append(time.monotonic() - t0)
+            return result
+
+        def _done(fut):
+            if settled.is_set():
+                return
+            settled.set()
+            if isinstance(fut.exception(), SchedulerBusy):
+                breaker.record_neutral()
+            elif fut.exception() is None and acceptable(fut.result()):
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+        fut = executor.submit(_run)
+        fut.add_done_callback(_done)
+        fut.settled = settled
+        return fut
+
+    def call(self, primary_fn, backup_fn, acceptable):
+        """Retorna (resultado, "principal" | "reserva"), ou (None, None) se nenhum serviu."""
+        self._count("chamadas")
+        pending = {}
+        if self.primary.allow():
+            pending[self._submit(self._executor, self.primary, primary_fn, acceptable, track=True)] = "principal"
+            done, _ = wait(pending, timeout=self.budget())
+            for fut in done:
+                if fut.exception() is None and acceptable(fut.result()):
+                    self._count("vitorias_principal")
+                    return fut.result(), "principal"
+                del pending[fut]
+        if self.backup.allow():
+            self._count("hedges")
+            pending[self._submit(self._backup_executor, self.backup, backup_fn, acceptable, track=False)] = "reserva"
+        deadline = time.monotonic() + self.total_timeout
+        while pending:
+            done, _ = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for fut in done:
+                origem = pending.pop(fut)
+                if fut.exception() is None and acceptable(fut.result()):
+                    self._count("vitorias_principal" if origem == "principal" else "vitorias_reserva")
+                    self._expire(pending)
+                    return fut.result(), origem
+        self._expire(pending)
+        self._count("sem_resposta")
+        return None, None
+
+    def _expire(self, pending: dict) -> None:
+        # Quem ainda não respondeu (perdeu para o outro ou estourou o tempo) conta como timeout
+        for fut, origem in pending.items():
+            if not fut.settled.is_set():
+                fut.settled.set()
+                (self.primary if origem == "principal" else self.backup).record_failure()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = dict(self.stats)
+        data["orcamento_ms"] = round(self.budget() * 1000, 1)
+        data["disjuntores"] = {b.name: b.snapshot() for b in (self.primary, self.backup)}
+        return data
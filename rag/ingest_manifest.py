@@ -0,0 +1,131 @@
+import os
+import sys
+import json
+import hashlib
+import threading
+from datetime import datetime
+
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".rag_manifest.json")
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class IngestManifest:
+    """Manifesto local: store -> display_name -> {sha256, document}.
+
+    Permite pular o upload quando o arquivo não mudou e substituir o
+    documento antigo quando mudou, em vez de acumular duplicatas na store.
+    """
+
+    def __init__(self, path: str | None = None):
+        self.path = path or os.getenv("RAG_MANIFEST_PATH", DEFAULT_MANIFEST_PATH)
+        self._lock = threading.Lock()
+        self.data = self._load()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict) and isinstance(data.get("stores"), dict):
+                return data
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️  Manifesto de ingestão inválido ({self.path}): {e}", file=sys.stderr)
+        return {"stores": {}}
+
+    def save(self) -> None:
+        with self._lock:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+    def get(self, store_name: str, display_name: str) -> dict | None:
+        return self.data["stores"].get(store_name, {}).get(display_name)
+
+    def set(self, store_name: str, display_name: str, sha256: str, document: str | None) -> None:
+        with self._lock:
+            self.data["stores"].setdefault(store_name, {})[display_name] = {
+                "sha256": sha256,
+                "document": document,
+                "updated_at": datetime.now().isoformat(timespec="seconds"),
+            }
+
+    def set_pending(self, store_name: str, display_name: str, sha256: str, operation: str | None) -> None:
+        """Upload feito mas indexação sem resposta no prazo: guarda a operação para a próxima execução."""
+        with self._lock:
+            entry = self.data["stores"].setdefault(store_name, {}).setdefault(display_name, {"sha256": None, "document": None})
+            entry["pendente"] = {"sha256": sha256, "operacao": operation}
+
+    def clear_pending(self, store_name: str, display_name: str) -> None:
+        with self._lock:
+            entries = self.data["stores"].get(store_name, {})
+            entry = entries.get(display_name)
+            if not entry:
+                return
+            entry.pop("pendente", None)
+            if not entry.get("sha256"):
+                del entries[display_name]
+
+    def remove(self, store_name: str, display_name: str) -> None:
+        with self._lock:
+            self.data["stores"].get(store_name, {}).pop(display_name, None)
+
+
+def sync_document(manager, file_path: str, display_name: str | None = None, manifest: IngestManifest | None = None) -> bool:
+    """Garante que a store contém exatamente uma versão atual do arquivo.
+
+    Retorna True se houve upload e False se o arquivo não mudou.
+    """
+    display_name = display_name or os.path.basename(file_path)
+    manifest = manifest or IngestManifest()
+    store_name = manager.store_name
+    digest = file_sha256(file_path)
+
+    entry = manifest.get(store_name, display_name)
+    if entry and entry.get("sha256") == digest:
+        print(f"✓ {display_name} sem alterações (sha256 {digest[:12]}), upload ignorado.", file=sys.stderr)
+        return False
+
+    # Documentos antigos com o mesmo nome: o do manifesto e, na primeira execução
+    # ou depois de uma indexação que estourou o prazo, os que ficaram sem manifesto
+    stale = []
+    if entry and entry.get("document"):
+        stale.append(entry["document"])
+    if not entry or not entry.get("document") or entry.get("pendente"):
+        try:
+            stale.extend(d["name"] for d in manager.list_documents() if d.get("display_name") == display_name)
+        except Exception as e:
+            print(f"⚠️  Não foi possível listar documentos da store: {e}", file=sys.stderr)
+
+    try:
+        manager.upload_file(file_path, display_name)
+    except TimeoutError:
+        # O documento pode terminar de indexar depois: fica marcado e a próxima execução
+        # o encontra pelo nome e apaga, em vez de pular o arquivo como "sem alterações"
+        manifest.set_pending(store_name, display_name, digest, None)
+        manifest.save()
+        raise
+    document = getattr(manager, "last_document_name", None)
+    manifest.set(store_name, display_name, digest, document)
+    manifest.save()
+
+    if document is None:
+        # Sem o nome do documento novo, os listados pelo nome podem incluí-lo: só sai o do manifesto
+        stale = [entry["document"]] if entry and entry.get("document") else []
+    for doc in dict.fromkeys(stale):
+        if doc == document:
+            continue
+        try:
+            manager.delete_document(doc)
+            print(f"🗑️  Documento antigo removido: {doc}", file=sys.stderr)
+        except Exception as e:
+            print(f"⚠️  Falha ao remover documento antigo {doc}: {e}", file=sys.stderr)
+    return True
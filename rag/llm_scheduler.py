@@ -0,0 +1,228 @@
+import os
+import re
+import sys
+import time
+import heapq
+import asyncio
+import itertools
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+
+from tracing import record, span
+
+PRIORITY_DIRECT = 0
+PRIORITY_GROUP = 1
+# Mensagens até este tamanho passam na frente das longas com a mesma prioridade
+SHORT_MESSAGE_CHARS = 200
+
+_request = contextvars.ContextVar("llm_request", default=(PRIORITY_DIRECT, 0))
+
+
+class SchedulerBusy(Exception):
+    """Fila de chamadas ao LLM cheia ou espera acima do limite."""
+
+
+@contextmanager
+def request_context(is_group: bool = False, message_size: int = 0):
+    """Define a prioridade das chamadas ao LLM feitas dentro do bloco (thread ou corrotina)."""
+    token = _request.set((PRIORITY_GROUP if is_group else PRIORITY_DIRECT, message_size))
+    try:
+        yield
+    finally:
+        _request.reset(token)
+
+
+def _is_quota_error(exc: Exception) -> bool:
+    text = f"{exc.__class__.__name__} {exc}".lower()
+    return any(k in text for k in ("429", "resource_exhausted", "rate limit", "ratelimit", "quota"))
+
+
+def _retry_after(exc: Exception, default: float) -> float:
+    match = re.search(r"retry(?:[ -]after| in|Delay)?[\"':\s]*([\d.]+)\s*s", str(exc), re.IGNORECASE)
+    return float(match.group(1)) if match else default
+
+
+class TokenBucket:
+    """Balde de fichas por provedor: `rate` chamadas por segundo, rajada de até `capacity`."""
+
+    def __init__(self, per_minute: float, burst: float | None = None):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1.0, per_minute / 10))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Segundos até haver uma ficha (0 se já há)."""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def penalize(self, seconds: float) -> None:
+        """Cota estourada no provedor: zera o balde e pausa novas chamadas."""
+        self.tokens = 0.0
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class LLMScheduler:
+    """Ponto único por onde passam as chamadas ao Gemini e à Groq.
+
+    Cada chamada espera numa fila de prioridade (conversas diretas antes de
+    grupos, mensagens curtas antes das longas) até haver ficha no balde do
+    provedor e vaga no limite de concorrência. Com a fila cheia ou espera
+    acima de `queue_timeout`, levanta SchedulerBusy em vez de acumular threads.
+    """
+
+    # Reavaliação de segurança quando a espera não é previsível (release sempre notifica)
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, limits: dict[str, float] | None = None, max_concurrency: int | None = None,
+                 max_queue: int | None = None, queue_timeout: float | None = None):
+        limits = limits or {
+            "gemini": float(os.getenv("LLM_GEMINI_RPM", "60")),
+            "groq": float(os.getenv("LLM_GROQ_RPM", "30")),
+        }
+        self.buckets = {name: TokenBucket(rpm) for name, rpm in limits.items()}
+        self.max_concurrency = int(max_concurrency if max_concurrency is not None else os.getenv("LLM_MAX_CONCURRENCY", "8"))
+        self.max_queue = int(max_queue if max_queue is not None else os.getenv("LLM_QUEUE_SIZE", "64"))
+        self.queue_timeout = float(queue_timeout if queue_timeout is not None else os.getenv("LLM_QUEUE_TIMEOUT", "30"))
+        self.quota_backoff = float(os.getenv("LLM_QUOTA_BACKOFF", "10"))
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = itertools.count()
+        self.running = 0
+        self._waits = deque(maxlen=1000)
+        self.stats = {"executadas": 0, "rejeitadas": 0, "expiradas": 0, "cotas_excedidas": 0}
+
+    def saturated(self) -> bool:
+        """True quando novas mensagens não devem ser aceitas (fila do LLM cheia)."""
+        with self._cond:
+            return len(self._heap) >= self.max_queue
+
+    def _eligible(self, now: float):
+        """Primeiro da fila cujo provedor tem ficha; também devolve a menor espera por ficha.
+
+        A espera é None quando não há como prever (concorrência no limite): só um `release` libera.
+        """
+        if self.running >= self.max_concurrency:
+            return None, None
+        shortest = None
+        for entry in sorted(self._heap):
+            wait = self.buckets[entry[3]].delay(now)
+            if wait == 0:
+                return entry, 0.0
+            shortest = wait if shortest is None else min(shortest, wait)
+        return None, shortest
+
+    def acquire(self, provider: str) -> float:
+        """Bloqueia até a chamada poder seguir; retorna o tempo de espera em segundos."""
+        priority, size = _request.get()
+        t0 = time.monotonic()
+        deadline = t0 + self.queue_timeout
+        with self._cond:
+            if len(self._heap) >= self.max_queue:
+                self.stats["rejeitadas"] += 1
+                raise SchedulerBusy(f"fila do LLM cheia ({self.max_queue})")
+            entry = (priority, 0 if size <= SHORT_MESSAGE_CHARS else 1, next(self._seq), provider)
+            heapq.heappush(self._heap, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    first, wait = self._eligible(now)
+                    if first is entry:
+                        self._heap.remove(entry)
+                        heapq.heapify(self._heap)
+                        self.buckets[provider].take()
+                        self.running += 1
+                        # O próximo da fila pode já ter ficha e vaga: reavalia agora, sem esperar o timeout
+                        self._cond.notify_all()
+                        break
+                    if now >= deadline:
+                        self.stats["expiradas"] += 1
+                        raise SchedulerBusy(f"espera pelo LLM acima de {self.queue_timeout:g}s")
+                    if first is not None:
+                        # Outro na frente pode seguir já; ele avisa ao sair da fila
+                        timeout = deadline - now
+                    elif wait is None:
+                        timeout = min(deadline - now, self.POLL_INTERVAL)
+                    else:
+                        timeout = min(deadline - now, wait)
+                    self._cond.wait(timeout)
+            except BaseException:
+                if entry in self._heap:
+                    self._heap.remove(entry)
+                    heapq.heapify(self._heap)
+                    self._cond.notify_all()
+                raise
+        waited = time.monotonic() - t0
+        with self._cond:
+            self._waits.append(waited)
+        return waited
+
+    def release(self, provider: str, exc: Exception | None = None) -> None:
+        with self._cond:
+            self.running -= 1
+            self.stats["executadas"] += 1
+            if exc is not None and _is_quota_error(exc):
+                self.stats["cotas_excedidas"] += 1
+                pause = _retry_after(exc, self.quota_backoff)
+                self.buckets[provider].penalize(pause)
+                print(f"🚦 Cota do provedor {provider} excedida; pausando chamadas por {pause:g}s", file=sys.stderr)
+            self._cond.notify_all()
+
+    def call(self, provider: str, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        waited = self.acquire(provider)
+        record("fila_llm", t0, waited, provedor=provider)
+        try:
+            with span(f"llm_{provider}"):
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            self.release(provider, e)
+            raise
+        self.release(provider)
+        return result
+
+    async def call_async(self, provider: str, coro_fn):
+        # A espera bloqueante roda fora do loop; to_thread leva o contexto (prioridade) junto
+        t0 = time.perf_counter()
+        waited = await asyncio.to_thread(self.acquire, provider)
+        record("fila_llm", t0, waited, provedor=provider)
+        try:
+            with span(f"llm_{provider}"):
+                result = await coro_fn()
+        except Exception as e:
+            self.release(provider, e)
+            raise
+        self.release(provider)
+        return result
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            waits = sorted(self._waits)
+            data = dict(self.stats)
+            data.update({
+                "em_fila": len(self._heap),
+                "em_execucao": self.running,
+                "max_concorrencia": self.max_concurrency,
+                "fila_max": self.max_queue,
+                "fichas": {name: round(b.tokens, 2) for name, b in self.buckets.items()},
+            })
+        pct = lambda p: round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+        data["espera_fila_ms"] = {"p50": pct(0.5), "p95": pct(0.95), "max": pct(1.0), "amostras": len(waits)}
+        return data
+
+
+SCHEDULER = LLMScheduler()
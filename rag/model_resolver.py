@@ -0,0 +1,158 @@
+import re
+
+from rag.answer_cache import normalize_question
+
+_END = "\0"
+
+# Apelidos de modelos fora do PDF que o atendimento já reconhecia (fotos, histórico)
+EXTRA_ALIASES = {
+    "iphone 15 pro max": "iPhone 15 Pro Max",
+    "iphone 15 pro": "iPhone 15 Pro",
+    "iphone 15": "iPhone 15 Pro",
+    "moto g54": "Motorola Moto G54",
+    "motorola g54": "Motorola Moto G54",
+    "a54": "Samsung Galaxy A54",
+    "galaxy a54": "Samsung Galaxy A54",
+    "s24 ultra": "Samsung Galaxy S24 Ultra",
+    "galaxy s24 ultra": "Samsung Galaxy S24 Ultra",
+    "xiaomi 13t": "Xiaomi 13T",
+    "13t": "Xiaomi 13T",
+    "redmi note 13": "Xiaomi Redmi Note 13",
+    "note 13": "Xiaomi Redmi Note 13",
+}
+
+# Palavras que sozinhas não identificam um aparelho
+GENERIC_TOKENS = {"pro", "max", "plus", "ultra", "mini", "lite", "galaxy", "iphone", "apple", "samsung", "motorola", "moto", "xiaomi", "redmi", "note", "edge"}
+
+
+def _osa_distance(a: str, b: str, limit: int) -> int:
+    """Distância de edição com transposição (OSA), interrompida ao passar de `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        best = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev2 is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+            best = min(best, cur[j])
+        if best > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+def _is_code(token: str) -> bool:
+    """Código de modelo com letras e números ("s25", "a56", "15t"), não um número solto."""
+    return bool(re.search(r"\d", token) and re.search(r"[a-z]", token))
+
+
+def _deletes(token: str) -> set[str]:
+    return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+
+class ModelResolver:
+    """Resolve nomes de modelos na mensagem com um trie de palavras.
+
+    Casa primeiro o apelido mais longo ("iphone 15 pro max" antes de
+    "iphone 15"), aceita prefixos que levam a um único modelo ("edge 60" ->
+    Edge 60 Pro) e corrige erros de digitação de até uma edição por palavra
+    ("ultar", "edje") com um índice de deleções montado uma vez.
+    """
+
+    def __init__(self, aliases: dict[str, str]):
+        self._root = {}
+        self._vocab = set()
+        self._delete_index = {}
+        for alias, name in aliases.items():
+            tokens = normalize_question(alias).split()
+            if not tokens:
+                continue
+            node = self._root
+            for tok in tokens:
+                node = node.setdefault(tok, {})
+                self._vocab.add(tok)
+            node[_END] = name
+        for tok in self._vocab:
+            if len(tok) >= 4:
+                for d in _deletes(tok):
+                    self._delete_index.setdefault(d, set()).add(tok)
+        # Modelo único alcançável a partir de cada nó (None se ambíguo)
+        self._unique = {}
+        self._collect(self._root)
+
+    @classmethod
+    def from_catalog(cls, catalog, extra: dict[str, str] | None = None) -> "ModelResolver":
+        aliases = dict(EXTRA_ALIASES if extra is None else extra)
+        for i in range(catalog.size):
+            model = catalog.columns["model"][i]
+            brand = catalog.columns["manufacturer"][i] or ""
+            short = catalog.columns["short_model"][i] or ""
+            nomes = {model, short, re.sub(rf"^{re.escape(brand)}\s+", "", model, flags=re.IGNORECASE)}
+            if brand:
+                nomes.add(f"{brand} {short}")
+            # "Galaxy S25 Ultra" -> também "S25 Ultra"
+            partes = short.split()
+            if len(partes) > 1 and partes[0].lower() in GENERIC_TOKENS and _is_code(partes[1].lower()):
+                nomes.add(" ".join(partes[1:]))
+            for nome in nomes:
+                if nome and normalize_question(nome) not in GENERIC_TOKENS:
+                    aliases[nome] = model
+        return cls(aliases)
+
+    def _collect(self, node: dict) -> set:
+        names = set()
+        for key, child in node.items():
+            if key == _END:
+                names.add(child)
+            else:
+                names |= self._collect(child)
+        self._unique[id(node)] = next(iter(names)) if len(names) == 1 else None
+        return names
+
+    def _correct(self, token: str) -> str:
+        if token in self._vocab or len(token) < 4:
+            return token
+        candidates = set()
+        for d in _deletes(token) | {token}:
+            candidates |= self._delete_index.get(d, set())
+        best = [c for c in candidates if _osa_distance(token, c, 1) <= 1]
+        return min(best) if best else token
+
+    def resolve_all(self, message: str) -> list[str]:
+        """Todos os modelos citados, na ordem em que aparecem e sem repetição."""
+        tokens = [self._correct(t) for t in normalize_question(message).split()]
+        found = []
+        i, n = 0, len(tokens)
+        while i < n:
+            node = self._root.get(tokens[i])
+            j = i + 1
+            match, match_end = None, i
+            has_digit = any(c.isdigit() for c in tokens[i])
+            while node is not None:
+                if _END in node:
+                    match, match_end = node[_END], j
+                elif has_digit and self._unique.get(id(node)) and (j - i >= 2 or _is_code(tokens[i])):
+                    # Prefixo sem ambiguidade contendo número ("edge 60", "galaxy s25")
+                    match, match_end = self._unique[id(node)], j
+                if j >= n:
+                    break
+                node = node.get(tokens[j])
+                if node is not None and any(c.isdigit() for c in tokens[j]):
+                    has_digit = True
+                j += 1
+            if match:
+                if match not in found:
+                    found.append(match)
+                i = match_end
+            else:
+                i += 1
+        return found
+
+    def resolve(self, message: str) -> str | None:
+        found = self.resolve_all(message)
+        return found[0] if found else None
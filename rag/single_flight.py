@@ -0,0 +1,74 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Junta chamadas concorrentes com a mesma chave numa única execução.
+
+    O primeiro chamador (líder) executa a função; os que chegam enquanto ela
+    está em andamento esperam o mesmo resultado (ou exceção). Serve tanto a
+    threads (`do`) quanto a corrotinas (`do_async`), que compartilham as
+    mesmas chamadas em voo.
+    """
+
+    def __init__(self):
+        self._calls: dict[object, Future] = {}
+        self._lock = threading.Lock()
+        self.executions = 0
+        self.collapsed = 0
+
+    def _join(self, key) -> tuple[Future, bool]:
+        with self._lock:
+            fut = self._calls.get(key)
+            if fut is not None:
+                self.collapsed += 1
+                return fut, False
+            fut = Future()
+            self._calls[key] = fut
+            self.executions += 1
+            return fut, True
+
+    def _finish(self, key, fut: Future, result=None, exc: BaseException | None = None) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+        if exc is not None:
+            fut.set_exception(exc)
+        else:
+            fut.set_result(result)
+
+    def do(self, key, fn):
+        fut, leader = self._join(key)
+        if not leader:
+            return fut.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, fut, exc=e)
+            raise
+        self._finish(key, fut, result)
+        return result
+
+    async def do_async(self, key, coro_fn):
+        """Versão assíncrona: `coro_fn()` deve retornar uma corrotina."""
+        fut, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(fut)
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            self._finish(key, fut, exc=e)
+            raise
+        self._finish(key, fut, result)
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight = len(self._calls)
+        total = self.executions + self.collapsed
+        return {
+            "execucoes": self.executions,
+            "coalescidas": self.collapsed,
+            "em_andamento": in_flight,
+            "taxa_coalescencia": round(self.collapsed / total, 4) if total else 0.0,
+        }
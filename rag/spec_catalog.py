@@ -0,0 +1,313 @@
+import os
+import re
+import sys
+import zlib
+import threading
+
+import numpy as np
+
+from rag.answer_cache import normalize_question
+from rag.ingest_manifest import file_sha256
+
+# Colunas numéricas (float64, NaN = sem dado) e booleanas (int8: 1 sim, 0 não, -1 sem dado)
+NUMERIC_FIELDS = ("price", "ram_gb", "storage_gb", "battery_mah", "camera_mp", "thickness_mm", "screen_in", "cpu_ghz")
+FLAG_FIELDS = ("has_5g", "nfc", "dual_sim", "esim")
+TEXT_FIELDS = ("model", "manufacturer", "short_model", "processor", "display", "os")
+
+UNKNOWN = -1
+
+
+def _number(text: str) -> float | None:
+    m = re.search(r"\d+(?:[.,]\d+)*", text or "")
+    if not m:
+        return None
+    raw = m.group(0)
+    # "2.496" (milhar) vs "8,2" (decimal)
+    if re.fullmatch(r"\d{1,3}(?:\.\d{3})+", raw):
+        raw = raw.replace(".", "")
+    return float(raw.replace(",", "."))
+
+
+def _flag(text: str, yes: str, no: str | None = None) -> int:
+    """1 se o texto cita `yes`, 0 só se cita `no` (evidência de que não tem), senão UNKNOWN."""
+    if re.search(yes, text or "", re.IGNORECASE):
+        return 1
+    if no and re.search(no, text or "", re.IGNORECASE):
+        return 0
+    return UNKNOWN
+
+
+def extract_pdf_text(path: str) -> str:
+    """Extrai o texto do PDF; usa pypdf quando instalado e um leitor mínimo de `Tj` como alternativa."""
+    try:
+        from pypdf import PdfReader
+        return "\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    except ImportError:
+        pass
+    with open(path, "rb") as f:
+        raw = f.read()
+    lines = []
+    for m in re.finditer(rb"stream\r?\n(.*?)endstream", raw, re.S):
+        body = m.group(1)
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            pass
+        for s in re.finditer(rb"\(((?:\\.|[^\\)])*)\)\s*Tj", body):
+            txt = re.sub(rb"\\(.)", rb"\1", s.group(1))
+            lines.append(txt.decode("latin-1"))
+    return "\n".join(lines)
+
+
+def parse_spec_text(text: str) -> list[dict]:
+    """Converte os blocos `=== Nome ===` com linhas `chave: valor` em registros tipados."""
+    records = []
+    for title, body in re.findall(r"===\s*(.+?)\s*===\s*\n(.*?)(?=\n\s*===|\Z)", text, re.S):
+        fields = {}
+        obs = []
+        for line in body.splitlines():
+            if ":" not in line:
+                continue
+            key, value = line.split(":", 1)
+            key = normalize_question(key)
+            value = value.strip()
+            if key == "obs":
+                obs.append(value)
+            else:
+                fields[key] = value
+        if "marca" not in fields:
+            continue
+        rede = fields.get("rede conectividade principal", "")
+        thickness = None
+        for o in obs + [fields.get("espessura", "")]:
+            m = re.search(r"(\d+(?:,\d+)?)\s*mm", o)
+            if m:
+                thickness = _number(m.group(1))
+                break
+        ram = next((v for k, v in fields.items() if k in ("ram", "memoria ram")), None)
+        bateria = next((v for k, v in fields.items() if k.startswith("bateria")), None)
+        nfc = fields.get("nfc")
+        tela = re.search(r"(\d+(?:,\d+)?)\s*\"", fields.get("display", ""))
+        ghz = re.search(r"(\d+(?:,\d+)?)\s*GHz", fields.get("processador cpu", ""), re.IGNORECASE)
+        records.append({
+            "model": fields.get("nome comercial") or title,
+            "manufacturer": fields.get("marca"),
+            "short_model": fields.get("modelo") or title,
+            "processor": fields.get("processador cpu"),
+            "display": fields.get("display"),
+            "os": fields.get("sistema operacional"),
+            "price": _number(fields.get("preco de referencia brasil", "")),
+            "ram_gb": _number(ram) if ram else None,
+            "storage_gb": _number(fields.get("armazenamento interno", "")),
+            "battery_mah": _number(bateria) if bateria else None,
+            "camera_mp": _number(fields.get("camera traseira principal", "")),
+            "thickness_mm": thickness,
+            "screen_in": _number(tela.group(1)) if tela else None,
+            "cpu_ghz": _number(ghz.group(1)) if ghz else None,
+            # Rede que cita só 2G/3G/4G conta como "sem 5G"; sem menção, fica sem dado
+            "has_5g": _flag(rede, r"\b5G\b", r"\b[234]G\b|\bLTE\b"),
+            "nfc": (1 if normalize_question(nfc).startswith("sim") else 0) if nfc else (1 if re.search(r"\bNFC\b", rede) else UNKNOWN),
+            "dual_sim": _flag(rede, r"dual\s*sim", r"single\s*sim|chip\s*[uú]nico"),
+            "esim": 1 if re.search(r"e-?sim", rede, re.IGNORECASE) else UNKNOWN,
+        })
+    return records
+
+
+class SpecCatalog:
+    """Catálogo de fichas técnicas em memória, armazenado em colunas.
+
+    Montado a partir do `celularrag.pdf` e recarregado quando o hash do
+    arquivo muda, para responder perguntas de especificação sem chamar a Gemini.
+    """
+
+    def __init__(self, records: list[dict] | None = None, source: str | None = None, sha256: str | None = None):
+        self.source = source
+        self.sha256 = sha256
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._build(records or [])
+
+    @classmethod
+    def from_pdf(cls, path: str) -> "SpecCatalog":
+        catalog = cls(source=path)
+        catalog.refresh()
+        return catalog
+
+    def _build(self, records: list[dict]) -> None:
+        self.size = len(records)
+        self.columns = {}
+        for f in TEXT_FIELDS:
+            self.columns[f] = [r.get(f) for r in records]
+        for f in NUMERIC_FIELDS:
+            self.columns[f] = np.array([np.nan if r.get(f) is None else r[f] for r in records], dtype=np.float64)
+        for f in FLAG_FIELDS:
+            self.columns[f] = np.array([r.get(f, UNKNOWN) for r in records], dtype=np.int8)
+        # Ordem crescente pré-calculada por coluna numérica (NaN ao final) e
+        # quantidade de valores conhecidos, para argmin/argmax sem reordenar
+        self.order = {f: np.argsort(self.columns[f], kind="stable") for f in NUMERIC_FIELDS}
+        self.known = {f: int(np.count_nonzero(~np.isnan(self.columns[f]))) for f in NUMERIC_FIELDS}
+        self._names = {}
+        for i, r in enumerate(records):
+            for name in (r.get("model"), r.get("short_model")):
+                if name:
+                    self._names.setdefault(normalize_question(name), i)
+
+    def refresh(self) -> bool:
+        """Recarrega o catálogo se o PDF mudou (mtime e depois SHA-256). Retorna True se recarregou."""
+        if not self.source or not os.path.exists(self.source):
+            return False
+        mtime = os.path.getmtime(self.source)
+        if mtime == self._mtime:
+            return False
+        with self._lock:
+            if mtime == self._mtime:
+                return False
+            digest = file_sha256(self.source)
+            self._mtime = mtime
+            if digest == self.sha256:
+                return False
+            try:
+                records = parse_spec_text(extract_pdf_text(self.source))
+            except Exception as e:
+                print(f"⚠️  Falha ao montar catálogo a partir de {self.source}: {e}", file=sys.stderr)
+                return False
+            self._build(records)
+            self.sha256 = digest
+            print(f"📚 Catálogo local: {self.size} modelos carregados de {os.path.basename(self.source)}", file=sys.stderr)
+            return True
+
+    def __len__(self) -> int:
+        return self.size
+
+    def row(self, i: int) -> dict:
+        data = {f: self.columns[f][i] for f in TEXT_FIELDS}
+        for f in NUMERIC_FIELDS:
+            v = self.columns[f][i]
+            data[f] = None if np.isnan(v) else float(v)
+        for f in FLAG_FIELDS:
+            v = int(self.columns[f][i])
+            data[f] = None if v == UNKNOWN else bool(v)
+        return data
+
+    def find(self, model_name: str | None) -> int | None:
+        """Índice do modelo pelo nome comercial ou curto (comparação normalizada)."""
+        if not model_name:
+            return None
+        key = normalize_question(model_name)
+        if key in self._names:
+            return self._names[key]
+        for name, i in self._names.items():
+            if key in name or name in key:
+                return i
+        return None
+
+    def as_details(self, i: int) -> dict:
+        """Registro no formato esperado por `AIAgent._format_response('get_smartphone_details_and_photos')`."""
+        r = self.row(i)
+        specs = {}
+        if r["processor"]: specs["processador"] = r["processor"]
+        if r["ram_gb"]: specs["ram"] = f"{r['ram_gb']:g} GB"
+        if r["storage_gb"]: specs["armazenamento"] = format_storage(r["storage_gb"])
+        if r["camera_mp"]: specs["camera_principal"] = f"{r['camera_mp']:g} MP"
+        if r["battery_mah"]: specs["bateria"] = f"{r['battery_mah']:g} mAh"
+        if r["display"]: specs["tela"] = r["display"]
+        info = {"preco": format_price(r["price"])} if r["price"] else {}
+        return {"modelo": r["model"], "fabricante": r["manufacturer"], "especificacoes_tecnicas": specs, "info_geral": info}
+
+
+def format_number(value: float) -> str:
+    return f"{value:g}".replace(".", ",")
+
+
+def format_price(value: float) -> str:
+    return f"{value:,.0f}".replace(",", ".")
+
+
+def format_storage(gb: float) -> str:
+    return f"{gb / 1024:g} TB" if gb >= 1024 else f"{gb:g} GB"
+
+
+# Palavras-chave da pergunta -> campo do catálogo
+SPEC_KEYWORDS = (
+    ("battery_mah", ("bateria", "mah", "autonomia")),
+    ("camera_mp", ("camera", "mp", "megapixel")),
+    ("ram_gb", ("ram",)),
+    ("storage_gb", ("armazenamento", "memoria interna", "gb", "tb")),
+    ("price", ("preco", "valor", "custa", "quanto")),
+    ("thickness_mm", ("espessura", "fino", "grossura")),
+    ("has_5g", ("5g",)),
+    ("nfc", ("nfc", "aproximacao")),
+    ("dual_sim", ("dual sim", "dois chips", "2 chips", "esim", "e sim")),
+    ("processor", ("processador", "cpu", "desempenho")),
+    ("display", ("tela", "display")),
+)
+
+
+def detect_spec_field(message: str) -> str | None:
+    text = f" {normalize_question(message)} "
+    for field, words in SPEC_KEYWORDS:
+        if any(f" {w} " in text for w in words):
+            return field
+    return None
+
+
+def answer_spec(catalog: SpecCatalog, i: int, field: str) -> str | None:
+    """Resposta curta para um campo do catálogo, ou None se o PDF não traz o dado."""
+    r = catalog.row(i)
+    nome = r["model"]
+    if field == "price" and r["price"]:
+        return f"{nome}: preço de referência R$ {format_price(r['price'])} (pode variar)."
+    if field == "battery_mah" and r["battery_mah"]:
+        return f"{nome}: bateria de {r['battery_mah']:g} mAh."
+    if field == "camera_mp" and r["camera_mp"]:
+        return f"{nome}: câmera traseira principal de {r['camera_mp']:g} MP."
+    if field == "ram_gb" and r["ram_gb"]:
+        return f"{nome}: {r['ram_gb']:g} GB de RAM."
+    if field == "storage_gb" and r["storage_gb"]:
+        return f"{nome}: {format_storage(r['storage_gb'])} de armazenamento interno."
+    if field == "thickness_mm" and r["thickness_mm"]:
+        return f"{nome}: cerca de {format_number(r['thickness_mm'])} mm de espessura."
+    if field == "processor" and r["processor"]:
+        return f"{nome}: processador {r['processor']}."
+    if field == "display" and r["display"]:
+        return f"{nome}: tela de {r['display']}."
+    if field == "has_5g" and r["has_5g"] is not None:
+        return f"{nome}: {'tem' if r['has_5g'] else 'não tem'} 5G."
+    if field == "nfc" and r["nfc"] is not None:
+        return f"{nome}: {'possui' if r['nfc'] else 'não possui'} NFC."
+    if field == "dual_sim" and r["dual_sim"] is not None:
+        texto = f"{nome}: {'é' if r['dual_sim'] else 'não é'} Dual SIM"
+        if r["esim"] is not None:
+            texto += f" e {'aceita' if r['esim'] else 'não aceita'} eSIM"
+        return texto + "."
+    return None
+
+
+def compare_specs(catalog: SpecCatalog, idxs: list[int], field: str | None = None) -> str | None:
+    """Comparativo lado a lado; com `field`, só aquele campo (None se faltar dado em algum modelo)."""
+    rows = [catalog.row(i) for i in idxs]
+    linhas_campos = (
+        ("price", "Preço", lambda r: f"R$ {format_price(r['price'])}" if r["price"] else None),
+        ("storage_gb", "Armazenamento", lambda r: format_storage(r["storage_gb"]) if r["storage_gb"] else None),
+        ("ram_gb", "RAM", lambda r: f"{r['ram_gb']:g} GB" if r["ram_gb"] else None),
+        ("camera_mp", "Câmera", lambda r: f"{r['camera_mp']:g} MP" if r["camera_mp"] else None),
+        ("battery_mah", "Bateria", lambda r: f"{r['battery_mah']:g} mAh" if r["battery_mah"] else None),
+        ("processor", "Processador", lambda r: r["processor"]),
+        ("display", "Tela", lambda r: f"{format_number(r['screen_in'])}\"" if r["screen_in"] else r["display"]),
+        ("thickness_mm", "Espessura", lambda r: f"{format_number(r['thickness_mm'])} mm" if r["thickness_mm"] else None),
+        ("has_5g", "5G", lambda r: None if r["has_5g"] is None else ("sim" if r["has_5g"] else "não")),
+        ("nfc", "NFC", lambda r: None if r["nfc"] is None else ("sim" if r["nfc"] else "não")),
+        ("dual_sim", "Dual SIM", lambda r: None if r["dual_sim"] is None else ("sim" if r["dual_sim"] else "não")),
+    )
+    linhas = ["⚖️ *COMPARATIVO:*", "", " x ".join(f"📱 *{r['model']}*" for r in rows)]
+    for campo, rotulo, fmt in linhas_campos:
+        if field and campo != field:
+            continue
+        valores = [fmt(r) for r in rows]
+        if all(v is None for v in valores) or (field and any(v is None for v in valores)):
+            continue
+        linhas.append(f"- {rotulo}: " + " | ".join(v or "sem dado" for v in valores))
+    if len(linhas) == 3:
+        return None
+    linhas.append("\nPreços de referência, podem variar.")
+    return "\n".join(linhas)
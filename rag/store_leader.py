@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_STATE_PATH = os.path.join(BASE_DIR, ".rag_store.json")
+
+
+def deployment_id() -> str:
+    """Identifica a implantação atual: workers irmãos (mesmo processo mestre) compartilham o valor."""
+    return os.getenv("RAG_DEPLOYMENT_ID") or str(os.getppid())
+
+
+class FileLock:
+    """Trava exclusiva não bloqueante num arquivo, válida entre processos."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = None
+
+    def try_acquire(self) -> bool:
+        fh = open(self.path, "a+")
+        try:
+            if fcntl:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            fh.close()
+            return False
+        self._fh = fh
+        return True
+
+    def release(self) -> None:
+        if not self._fh:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+            else:
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._fh.close()
+            self._fh = None
+
+
+def read_state(path: str = DEFAULT_STATE_PATH) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_state(state: dict, path: str = DEFAULT_STATE_PATH) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def init_store_once(manager, ingest, state_path: str | None = None, timeout: float | None = None) -> str:
+    """Inicializa a store em um único processo e publica o nome para os demais.
+
+    O processo que obtém a trava roda `ingest()` (ensure_store + upload) e
+    grava o nome da store num arquivo local; os outros workers só leem esse
+    arquivo e nunca tocam na ingestão. Retorna "leader" ou "follower".
+    """
+    state_path = state_path or os.getenv("RAG_STORE_STATE_PATH", DEFAULT_STATE_PATH)
+    timeout = float(timeout if timeout is not None else os.getenv("RAG_LEADER_WAIT", "300"))
+    me = deployment_id()
+    lock = FileLock(f"{state_path}.lock")
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        state = read_state(state_path)
+        if state and state.get("deployment") == me and state.get("status") in ("ready", "failed"):
+            if state["status"] == "failed":
+                raise RuntimeError(f"Inicialização da store falhou no processo líder: {state.get('error')}")
+            manager.store_name = state["store_name"]
+            print(f"📎 Worker {os.getpid()}: usando store {manager.store_name} publicada pelo líder {state.get('pid')}", file=sys.stderr)
+            return "follower"
+        if lock.try_acquire():
+            try:
+                # Outro líder pode ter terminado entre a leitura e a trava
+                state = read_state(state_path)
+                if state and state.get("deployment") == me and state.get("status") == "ready":
+                    continue
+                print(f"👑 Worker {os.getpid()}: líder da inicialização da store", file=sys.stderr)
+                write_state({"deployment": me, "pid": os.getpid(), "status": "warming"}, state_path)
+                try:
+                    ingest()
+                except Exception as e:
+                    write_state({"deployment": me, "pid": os.getpid(), "status": "failed", "error": str(e)}, state_path)
+                    raise
+                write_state({
+                    "deployment": me,
+                    "pid": os.getpid(),
+                    "status": "ready",
+                    "store_name": manager.store_name,
+                    "updated_at": datetime.now().isoformat(timespec="seconds"),
+                }, state_path)
+                return "leader"
+            finally:
+                lock.release()
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"Store não publicada pelo líder em {timeout:g}s ({state_path})")
+        time.sleep(delay)
+        delay = min(delay * 2, 2.0)
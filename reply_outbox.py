@@ -0,0 +1,71 @@
+import os
+import sys
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ReplyOutbox:
+    """Fila de envio ao Node por destinatário.
+
+    Mensagens para o mesmo destinatário saem uma de cada vez, na ordem em que
+    foram enfileiradas (pedaços de uma resposta transmitida, OCR, avisos);
+    destinatários diferentes são atendidos em paralelo.
+    """
+
+    def __init__(self, send, workers: int | None = None):
+        self.send = send
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(workers if workers is not None else os.getenv("OUTBOX_WORKERS", "8")),
+            thread_name_prefix="outbox",
+        )
+        self._timings = {"primeira_mensagem": deque(maxlen=1000), "resposta_completa": deque(maxlen=1000)}
+        self.sent = 0
+
+    def put(self, payload: dict, on_sent=None) -> None:
+        """Enfileira `payload`; `on_sent()` é chamado depois do envio, no contexto de quem enfileirou (ex.: o trace)."""
+        recipient = payload.get("recipient_phone")
+        item = (payload, on_sent, contextvars.copy_context())
+        with self._lock:
+            queue = self._queues.get(recipient)
+            if queue is not None:
+                queue.append(item)
+                return
+            self._queues[recipient] = deque([item])
+        self._executor.submit(self._drain, recipient)
+
+    def _drain(self, recipient) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[recipient]
+                if not queue:
+                    del self._queues[recipient]
+                    return
+                payload, on_sent, ctx = queue.popleft()
+            try:
+                ctx.run(self.send, payload)
+            except Exception as e:
+                print(f"⚠️ Falha ao enviar para {recipient}: {e}", file=sys.stderr)
+            with self._lock:
+                self.sent += 1
+            if on_sent:
+                try:
+                    ctx.run(on_sent)
+                except Exception as e:
+                    print(f"⚠️ Falha no callback de envio: {e}", file=sys.stderr)
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._timings[name].append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = {"enviadas": self.sent, "destinatarios_pendentes": len(self._queues)}
+            timings = {name: sorted(values) for name, values in self._timings.items()}
+        for name, values in timings.items():
+            pct = lambda p: round(values[min(len(values) - 1, int(p * len(values)))] * 1000, 1) if values else 0.0
+            data[f"{name}_ms"] = {"p50": pct(0.5), "p95": pct(0.95), "amostras": len(values)}
+        return data
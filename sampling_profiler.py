@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+# Funções onde uma thread fica parada esperando (fila vazia, socket, sleep); fora do perfil por padrão
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+    ("socket.py", "readinto"),
+    ("socketserver.py", "serve_forever"),
+    ("thread.py", "_worker"),
+    ("base_events.py", "_run_once"),
+}
+
+_busy = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    """Já há uma amostragem em andamento."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    # Linha de definição (não a atual) para que chamadas da mesma função se juntem no flame graph
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds: float, hz: float = 100, include_idle: bool = False) -> dict:
+    """Amostra as pilhas de todas as threads por `seconds` segundos, `hz` vezes por segundo.
+
+    Devolve `{"pilhas": Counter, "amostras": n, "duracao_s": s}`; as chaves do
+    Counter são pilhas no formato "collapsed" (thread;raiz;...;folha), o
+    mesmo que flamegraph.pl e speedscope leem.
+    """
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("já existe uma amostragem em andamento")
+    try:
+        me = threading.get_ident()
+        interval = 1.0 / max(1.0, hz)
+        stacks = Counter()
+        samples = 0
+        t0 = time.perf_counter()
+        deadline = t0 + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if not include_idle and (os.path.basename(code.co_filename), code.co_name) in _IDLE_LEAVES:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(labels))] += 1
+            samples += 1
+            time.sleep(interval)
+        return {"pilhas": stacks, "amostras": samples, "duracao_s": round(time.perf_counter() - t0, 3)}
+    finally:
+        _busy.release()
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
@@ -0,0 +1,106 @@
+"""Mede a exportação do catálogo (rag.catalog_export) contra um SQLite local no lugar do Postgres.
+
+Uso:
+    python scripts/bench_catalog_export.py [--linhas 1000 100000] [--lote 500]
+
+Para cada tamanho, gera uma tabela `smartphones`, roda a exportação completa
+e a incremental (sem alteração, depois com algumas linhas alteradas e
+removidas) e mostra o pico de memória do Python; com lotes fixos, o pico
+deve ficar praticamente igual entre 1k e 100k linhas.
+"""
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag.catalog_export import export_catalog, ExportState
+
+
+class SQLiteDBTools:
+    """Substituto do db_tools: `executar_query(sql)` devolve uma lista de dicts."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+
+    def executar_query(self, query: str, params=None):
+        return [dict(r) for r in self.conn.execute(query, params or ())]
+
+
+def _populate(db: SQLiteDBTools, n: int) -> None:
+    db.conn.execute("CREATE TABLE smartphones (id INTEGER PRIMARY KEY, modelo TEXT, fabricante TEXT, "
+                    "especificacoes_tecnicas TEXT, info_geral TEXT, atualizado_em TEXT)")
+    specs = json.dumps({"tela": "6.1 pol", "bateria": "4000 mAh", "armazenamento": "128 GB", "nfc": True})
+    db.conn.executemany(
+        "INSERT INTO smartphones VALUES (?, ?, ?, ?, ?, ?)",
+        ((i, f"Modelo {i}", "Fabricante", specs, json.dumps({"preco": 1000 + i}), "2025-01-01 00:00:00")
+         for i in range(1, n + 1)),
+    )
+    db.conn.commit()
+
+
+def _run(label: str, fn) -> dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    stats = fn()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {label:<28} {stats['linhas']:>8} lidas {stats['emitidas']:>8} emitidas {stats['removidas']:>4} removidas  "
+          f"mudou={str(stats['mudou']):<5} {elapsed:7.2f}s  pico={peak / 1048576:6.2f} MB")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--linhas", type=int, nargs="+", default=[1000, 100000])
+    parser.add_argument("--lote", type=int, default=500)
+    args = parser.parse_args()
+
+    for n in args.linhas:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = SQLiteDBTools(os.path.join(tmp, "catalogo.db"))
+            _populate(db, n)
+            out = os.path.join(tmp, "export", "smartphones.jsonl")
+            state = ExportState(os.path.join(tmp, "estado.db"))
+            print(f"{n} linhas:")
+
+            full = _run("completa", lambda: export_catalog(db, out, batch_size=args.lote))
+            assert full["emitidas"] == n
+
+            first = _run("incremental (1ª)", lambda: export_catalog(db, out, incremental=True, batch_size=args.lote, state=state))
+            assert first["emitidas"] == n
+            same = _run("incremental (sem alteração)", lambda: export_catalog(db, out, incremental=True, batch_size=args.lote, state=state))
+            assert not same["mudou"] and same["emitidas"] == 0
+
+            db.conn.execute("UPDATE smartphones SET info_geral = ?, atualizado_em = '2025-02-01 00:00:00' WHERE id <= 3",
+                            (json.dumps({"preco": 1}),))
+            db.conn.execute("DELETE FROM smartphones WHERE id = ?", (n,))
+            db.conn.commit()
+            delta = _run("incremental (3 alt., 1 rem.)", lambda: export_catalog(db, out, incremental=True, batch_size=args.lote, state=state))
+            assert delta["emitidas"] == 3 and delta["removidas"] == 1
+            with open(delta["arquivo"], encoding="utf-8") as f:
+                assert sum(1 for _ in f) == 4
+            with open(out, encoding="utf-8") as f:
+                assert sum(1 for _ in f) == n
+
+            wm_state = ExportState(os.path.join(tmp, "estado_coluna.db"))
+            _run("por coluna (1ª)", lambda: export_catalog(db, out, incremental=True, change_column="atualizado_em",
+                                                           batch_size=args.lote, state=wm_state))
+            db.conn.execute("UPDATE smartphones SET atualizado_em = '2025-03-01 00:00:00' WHERE id = 10")
+            db.conn.commit()
+            col = _run("por coluna (1 alt.)", lambda: export_catalog(db, out, incremental=True, change_column="atualizado_em",
+                                                                     batch_size=args.lote, state=wm_state))
+            assert col["emitidas"] == 1
+            state.close()
+            wm_state.close()
+
+
+if __name__ == "__main__":
+    main()
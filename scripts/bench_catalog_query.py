@@ -0,0 +1,71 @@
+"""Compara a latência do motor de consultas do catálogo com o File Search da Gemini.
+
+Uso:
+    python scripts/bench_catalog_query.py [--rodadas 2000] [--gemini]
+
+O caminho Gemini só roda com `--gemini` e GOOGLE_API_KEY definida.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from rag.spec_catalog import SpecCatalog
+from rag.catalog_query import parse_catalog_query, run_catalog_query
+
+PERGUNTAS = [
+    "Qual eh o celular mais barato?",
+    "Qual eh o celular mais caro?",
+    "Qual celular eh mais fino?",
+    "Qual celular tem a melhor camera?",
+    "Qual eh o celular com melhor processador?",
+    "Qual celular tem 1TB de armazenamento?",
+    "Quais celulares tem 5G?",
+    "Tem algum celular na faixa de 3000 reais?",
+]
+
+
+def _resumo(nome: str, amostras: list[float]) -> None:
+    amostras = sorted(amostras)
+    p95 = amostras[int(len(amostras) * 0.95) - 1] if len(amostras) > 1 else amostras[0]
+    print(f"{nome:<10} n={len(amostras):<6} p50={statistics.median(amostras) * 1e6:10.1f} µs  p95={p95 * 1e6:10.1f} µs  média={statistics.mean(amostras) * 1e6:10.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rodadas", type=int, default=2000)
+    parser.add_argument("--gemini", action="store_true", help="mede também GeminiFileSearchManager.query")
+    args = parser.parse_args()
+
+    pdf = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "celularrag.pdf")
+    catalog = SpecCatalog.from_pdf(pdf)
+
+    amostras = []
+    for _ in range(args.rodadas):
+        for pergunta in PERGUNTAS:
+            t0 = time.perf_counter()
+            run_catalog_query(catalog, parse_catalog_query(pergunta))
+            amostras.append(time.perf_counter() - t0)
+    _resumo("catálogo", amostras)
+
+    if args.gemini:
+        from rag.gemini_fs import GeminiFileSearchManager
+        fsm = GeminiFileSearchManager()
+        fsm.ensure_store("celulares-fichas-tecnicas")
+        fsm.cache.clear()
+        amostras = []
+        for pergunta in PERGUNTAS:
+            t0 = time.perf_counter()
+            fsm._query_uncached(pergunta)
+            amostras.append(time.perf_counter() - t0)
+        _resumo("gemini", amostras)
+
+
+if __name__ == "__main__":
+    main()
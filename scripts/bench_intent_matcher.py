@@ -0,0 +1,69 @@
+"""Micro-benchmark do matcher de intenções contra a varredura por substring antiga.
+
+Uso:
+    python scripts/bench_intent_matcher.py [--mensagens 20000] [--escalas 1,10,100]
+
+Cada escala multiplica o tamanho das tabelas de palavras-chave com frases
+sintéticas, para ver como o custo por mensagem cresce com o vocabulário.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_matcher import KEYWORD_TABLES, KeywordMatcher
+
+VOCABULARIO = (
+    "oi ola bom dia quero saber o preco do galaxy s25 ultra tem nfc dual sim qual "
+    "bateria camera melhor celular para jogos entrega parcelamento garantia iphone "
+    "xiaomi motorola edge depois noite valeu obrigado pode me mandar foto"
+).split()
+
+
+def corpus(n: int, seed: int = 42) -> list[str]:
+    rnd = random.Random(seed)
+    return [" ".join(rnd.choices(VOCABULARIO, k=rnd.randint(3, 25))) for _ in range(n)]
+
+
+def tabelas(escala: int) -> dict[str, list[str]]:
+    out = {}
+    for label, frases in KEYWORD_TABLES.items():
+        extras = [f"{label} sintetico {i}" for i in range(len(frases) * (escala - 1))]
+        out[label] = list(frases) + extras
+    return out
+
+
+def varredura_substring(tabs: dict[str, list[str]], msg: str) -> set[str]:
+    """Equivalente às várias chamadas `any(p in msg ...)` de antes do matcher."""
+    msg = msg.lower()
+    return {label for label, frases in tabs.items() if any(p in msg for p in frases)}
+
+
+def medir(fn, mensagens: list[str]) -> float:
+    t0 = time.perf_counter()
+    for m in mensagens:
+        fn(m)
+    return (time.perf_counter() - t0) / len(mensagens)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mensagens", type=int, default=20000)
+    parser.add_argument("--escalas", default="1,10,100")
+    args = parser.parse_args()
+
+    mensagens = corpus(args.mensagens)
+    print(f"{'escala':>6} {'frases':>7} {'substring':>14} {'matcher':>14}")
+    for escala in (int(e) for e in args.escalas.split(",")):
+        tabs = tabelas(escala)
+        matcher = KeywordMatcher(tabs)
+        t_sub = medir(lambda m: varredura_substring(tabs, m), mensagens)
+        t_trie = medir(matcher.labels, mensagens)
+        print(f"{escala:>6} {matcher.size:>7} {t_sub * 1e6:>11.2f} µs {t_trie * 1e6:>11.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
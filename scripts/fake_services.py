@@ -0,0 +1,273 @@
+"""Servidores falsos da Gemini (REST do File Search), da Groq e do receptor /process-response do Node.
+
+Usados por scripts/load_test.py, mas também rodam sozinhos para testes manuais:
+    python scripts/fake_services.py --gemini-latencia lognormal:800:0.4 --gemini-erro 0.02
+
+Latências são especificadas como:
+    fixa:MS                  sempre MS milissegundos
+    uniforme:MIN:MAX         uniforme entre MIN e MAX
+    lognormal:MEDIANA:SIGMA  log-normal com a mediana dada (cauda longa, como APIs reais)
+"""
+import re
+import sys
+import json
+import time
+import math
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class Latency:
+    def __init__(self, spec: str = "fixa:0"):
+        kind, *args = spec.split(":")
+        self.spec = spec
+        self.kind = kind
+        self.args = [float(a) for a in args]
+        if kind not in ("fixa", "uniforme", "lognormal") or len(self.args) != {"fixa": 1, "uniforme": 2, "lognormal": 2}[kind]:
+            raise ValueError(f"latência inválida: {spec!r}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Segundos."""
+        if self.kind == "fixa":
+            ms = self.args[0]
+        elif self.kind == "uniforme":
+            ms = rng.uniform(*self.args)
+        else:
+            ms = rng.lognormvariate(math.log(max(self.args[0], 0.001)), self.args[1])
+        return max(0.0, ms) / 1000
+
+
+class Behavior:
+    """Latência e erros de um serviço falso: `erro` responde 500 e `cota` responde 429, por sorteio."""
+
+    def __init__(self, latency: str = "fixa:0", error_rate: float = 0.0, quota_rate: float = 0.0, seed: int | None = None):
+        self.latency = Latency(latency)
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self) -> tuple[float, int]:
+        with self._lock:
+            delay = self.latency.sample(self._rng)
+            r = self._rng.random()
+        if r < self.quota_rate:
+            return delay, 429
+        if r < self.quota_rate + self.error_rate:
+            return delay, 500
+        return delay, 200
+
+    def describe(self) -> dict:
+        return {"latencia": self.latency.spec, "erro": self.error_rate, "cota": self.quota_rate}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    service = None
+
+    def log_message(self, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _reply(self, status: int, data: dict) -> None:
+        raw = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def do_GET(self):
+        self.service.handle(self, "GET", self._body())
+
+    def do_POST(self):
+        self.service.handle(self, "POST", self._body())
+
+    def do_DELETE(self):
+        self.service.handle(self, "DELETE", self._body())
+
+
+class _Service:
+    name = "servico"
+
+    def __init__(self, behavior: Behavior, port: int = 0):
+        self.behavior = behavior
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        handler = type(f"{type(self).__name__}Handler", (_Handler,), {"service": self})
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self._thread = threading.Thread(target=self.server.serve_forever, name=f"fake-{self.name}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, status: int) -> None:
+        with self._lock:
+            self.requests += 1
+            if status >= 400:
+                self.errors += 1
+
+    def handle(self, h: _Handler, method: str, body: bytes) -> None:
+        raise NotImplementedError
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"requisicoes": self.requests, "erros_injetados": self.errors, **self.behavior.describe()}
+
+
+class FakeGemini(_Service):
+    """Endpoints REST usados por GeminiFileSearchREST/AsyncGeminiFileSearch; só generateContent sofre latência e erros."""
+
+    name = "gemini"
+
+    def __init__(self, behavior: Behavior, port: int = 0):
+        super().__init__(behavior, port)
+        self.stores = {}
+        self.documents = {}
+        self._seq = 0
+
+    def _next(self) -> int:
+        with self._lock:
+            self._seq += 1
+            return self._seq
+
+    def handle(self, h, method, body):
+        path = h.path.split("?", 1)[0]
+        if method == "POST" and path.endswith(":generateContent"):
+            delay, status = self.behavior.draw()
+            time.sleep(delay)
+            self._count(status)
+            if status != 200:
+                return h._reply(status, {"error": {"code": status, "message": "erro injetado"}})
+            text = "Resposta simulada do File Search: o modelo tem NFC, 5G, 256 GB e bateria de 5000 mAh."
+            return h._reply(200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]})
+        if path == "/v1beta/fileSearchStores":
+            if method == "GET":
+                return h._reply(200, {"fileSearchStores": [{"name": n, "displayName": d} for n, d in self.stores.items()]})
+            name = f"fileSearchStores/falsa-{self._next()}"
+            self.stores[name] = json.loads(body or b"{}").get("displayName")
+            return h._reply(200, {"name": name, "displayName": self.stores[name]})
+        m = re.fullmatch(r"/upload/v1beta/(fileSearchStores/[^:]+):uploadToFileSearchStore", path)
+        if m and method == "POST":
+            doc = f"{m.group(1)}/documents/doc-{self._next()}"
+            self.documents[doc] = m.group(1)
+            return h._reply(200, {"name": f"operations/op-{self._next()}", "done": True, "response": {"documentName": doc}})
+        if path.startswith("/v1beta/operations/"):
+            return h._reply(200, {"name": path[len("/v1beta/"):], "done": True, "response": {}})
+        m = re.fullmatch(r"/v1beta/(fileSearchStores/[^/]+)/documents", path)
+        if m and method == "GET":
+            docs = [{"name": d, "displayName": d.rsplit("/", 1)[-1]} for d, s in self.documents.items() if s == m.group(1)]
+            return h._reply(200, {"documents": docs})
+        if method == "DELETE":
+            self.documents.pop(path[len("/v1beta/"):], None)
+            return h._reply(200, {})
+        return h._reply(404, {"error": {"message": f"rota falsa desconhecida: {method} {path}"}})
+
+
+class FakeGroq(_Service):
+    """POST /openai/v1/chat/completions no formato da API da Groq (compatível com OpenAI)."""
+
+    name = "groq"
+
+    def handle(self, h, method, body):
+        if method != "POST" or not h.path.startswith("/openai/v1/chat/completions"):
+            return h._reply(404, {"error": {"message": "rota falsa desconhecida"}})
+        delay, status = self.behavior.draw()
+        time.sleep(delay)
+        self._count(status)
+        if status != 200:
+            return h._reply(status, {"error": {"message": "erro injetado", "type": "api_error"}})
+        req = json.loads(body or b"{}")
+        return h._reply(200, {
+            "id": "chatcmpl-falso",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": req.get("model", "falso"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": "Resposta simulada da Groq."}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+
+class FakeNode(_Service):
+    """Receptor /process-response: guarda, por X-Trace-Id, quando cada resposta chegou."""
+
+    name = "node"
+
+    def __init__(self, behavior: Behavior, port: int = 0):
+        super().__init__(behavior, port)
+        self.replies = {}
+        self.untraced = 0
+
+    def handle(self, h, method, body):
+        if method != "POST" or h.path != "/process-response":
+            return h._reply(404, {"error": "rota desconhecida"})
+        arrived = time.monotonic()
+        delay, status = self.behavior.draw()
+        time.sleep(delay)
+        self._count(status)
+        if status != 200:
+            # Envio que falhou não conta como resposta entregue ao cliente
+            return h._reply(status, {"error": "erro injetado"})
+        payload = json.loads(body or b"{}")
+        trace_id = h.headers.get("X-Trace-Id")
+        with self._lock:
+            if trace_id:
+                self.replies.setdefault(trace_id, []).append((arrived, payload.get("tipo"), str(payload.get("conteudo", ""))))
+            else:
+                self.untraced += 1
+        return h._reply(200, {"status": "ok"})
+
+    def replies_for(self, trace_id: str) -> list:
+        with self._lock:
+            return list(self.replies.get(trace_id, ()))
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    for name, latency in (("gemini", "lognormal:800:0.4"), ("groq", "lognormal:400:0.3"), ("node", "fixa:20")):
+        parser.add_argument(f"--{name}-latencia", default=latency, help=f"latência do {name} falso (padrão {latency})")
+        parser.add_argument(f"--{name}-erro", type=float, default=0.0, help="fração de respostas 500")
+    parser.add_argument("--gemini-cota", type=float, default=0.0, help="fração de respostas 429 da Gemini")
+    parser.add_argument("--groq-cota", type=float, default=0.0, help="fração de respostas 429 da Groq")
+    parser.add_argument("--semente", type=int, default=42)
+
+
+def start_services(args) -> dict:
+    return {
+        "gemini": FakeGemini(Behavior(args.gemini_latencia, args.gemini_erro, args.gemini_cota, args.semente)).start(),
+        "groq": FakeGroq(Behavior(args.groq_latencia, args.groq_erro, args.groq_cota, args.semente + 1)).start(),
+        "node": FakeNode(Behavior(args.node_latencia, args.node_erro, 0.0, args.semente + 2)).start(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+    services = start_services(args)
+    print(f"GEMINI_API_BASE={services['gemini'].url}")
+    print(f"GROQ_BASE_URL={services['groq'].url}")
+    print(f"WPP_SERVER_URL={services['node'].url}")
+    print("Ctrl+C para encerrar.", file=sys.stderr)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for s in services.values():
+            s.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Ingestão em lote de um diretório na store do File Search.
+
+Uso:
+    python scripts/ingest_directory.py docs/ [--store celulares-fichas-tecnicas] [--concorrencia 4] [--prefixo docs]
+
+Compara o diretório com o manifesto local (.rag_manifest.json), envia só os
+arquivos novos ou alterados, remove da store os documentos cujos arquivos
+sumiram e imprime os tempos por arquivo e a vazão total.
+"""
+import os
+import sys
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+from rag.bulk_ingest import sync_directory
+from rag.file_search_async import AsyncGeminiFileSearch
+from rag.ingest_manifest import IngestManifest
+
+
+async def run(args) -> dict:
+    async with AsyncGeminiFileSearch() as client:
+        await client.ensure_store(display_name=args.store)
+        print(f"📎 Store: {client.store_name}", file=sys.stderr)
+        return await sync_directory(
+            client,
+            args.diretorio,
+            manifest=IngestManifest(),
+            prefix=args.prefixo,
+            concurrency=args.concorrencia,
+        )
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("diretorio")
+    parser.add_argument("--store", default="celulares-fichas-tecnicas")
+    parser.add_argument("--concorrencia", type=int, default=None)
+    parser.add_argument("--prefixo", default=None)
+    args = parser.parse_args()
+    if not os.path.isdir(args.diretorio):
+        parser.error(f"diretório não encontrado: {args.diretorio}")
+
+    report = asyncio.run(run(args))
+    print(f"\n{'arquivo':<50} {'MB':>8} {'upload':>9} {'indexação':>10} {'total':>8}")
+    for name, info in sorted(report["arquivos"].items()):
+        if "erro" in info:
+            print(f"{name:<50} erro: {info['erro']}")
+            continue
+        print(f"{name:<50} {info['bytes'] / 1048576:>8.2f} {info.get('upload_s', 0):>8.2f}s "
+              f"{info.get('indexacao_s', 0):>9.2f}s {info.get('total_s', 0):>7.2f}s")
+    print(f"\nEnviados: {report['enviados']}  sem alteração: {report['sem_alteracao']}  "
+          f"removidos: {report['removidos']}  falhas: {report['falhas']}")
+    print(f"Tempo total: {report['duracao_s']:.2f}s  vazão: {report['mb_por_s']:.2f} MB/s, {report['arquivos_por_s']:.2f} arquivos/s")
+    sys.exit(1 if report["falhas"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""Teste de carga offline: sobe o app.py contra Gemini, Groq e Node falsos e dispara /webhook numa taxa fixa.
+
+Uso:
+    python scripts/load_test.py --qps 5 --duracao 60 [--mix direta=0.7,grupo=0.2,imagem=0.1]
+                                [--env WEBHOOK_ASYNC=1 --env WEBHOOK_WORKERS=8]
+                                [--gemini-latencia lognormal:800:0.4 --gemini-erro 0.02 ...]
+                                [--saida bench_results/antes.json]
+    python scripts/load_test.py --comparar bench_results/antes.json bench_results/depois.json
+
+As chegadas seguem uma agenda fixa (laço aberto): a latência de cada
+mensagem conta a partir do horário em que ela deveria ter sido enviada, então
+um servidor lento não "freia" o gerador e a cauda não fica escondida. A
+latência ponta a ponta vai do envio ao /webhook até a resposta chegar ao Node
+falso, casadas pelo X-Trace-Id. Nenhuma chamada sai para a internet.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import add_arguments, start_services
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PERGUNTAS = [
+    "oi",
+    "Qual eh o nome do vendedor?",
+    "Vocês fazem envio para todo Brasil?",
+    "Qual eh o melhor celular pra jogar jogos pesados?",
+    "Tem algum celular na faixa de 3000 reais?",
+    "Qual eh o celular mais barato?",
+    "Qual celular tem a melhor camera?",
+    "Qual celular tem 1TB de armazenamento?",
+    "Quais celulares tem 5G?",
+    "Qual eh a diferenca entre Motorola Edge 60 Pro e Samsung Galaxy A56?",
+    "Vocês tem parcelamento?",
+    "Qual eh a garantia dos aparelhos?",
+    "O Galaxy S24 tem NFC?",
+    "Qual celular voces me recomenda pra fotografo profissional?",
+]
+
+
+def tiny_image() -> str:
+    """Data URI de uma imagem pequena com texto, para exercitar o caminho do OCR."""
+    try:
+        import cv2
+        import numpy as np
+        img = np.full((120, 480), 255, dtype=np.uint8)
+        cv2.putText(img, "GALAXY S24 256GB", (10, 75), cv2.FONT_HERSHEY_SIMPLEX, 1.2, 0, 2)
+        ok, buf = cv2.imencode(".png", img)
+        raw = buf.tobytes()
+    except Exception:
+        # PNG 1x1 branco
+        raw = bytes.fromhex("89504e470d0a1a0a0000000d49484452000000010000000108000000003a7e9b55"
+                            "0000000a4944415408d763f80f00000101000518d84e0000000049454e44ae426082")
+    import base64
+    return "data:image/png;base64," + base64.b64encode(raw).decode()
+
+
+def _pct(values: list[float], p: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    # Posto mais próximo: o menor valor com pelo menos p das amostras abaixo ou iguais
+    return round(values[max(0, math.ceil(p * len(values)) - 1)] * 1000, 1)
+
+
+def latency_summary(values: list[float]) -> dict:
+    return {"n": len(values), "p50_ms": _pct(values, 0.50), "p95_ms": _pct(values, 0.95),
+            "p99_ms": _pct(values, 0.99), "max_ms": _pct(values, 1.0)}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _parse_mix(spec: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in spec.split(","):
+        kind, weight = part.split("=")
+        if kind not in ("direta", "grupo", "imagem"):
+            raise SystemExit(f"tipo de mensagem desconhecido no --mix: {kind}")
+        mix.append((kind, float(weight)))
+    return mix
+
+
+def launch_app(services: dict, overrides: dict | None = None, timeout: float = 120) -> tuple[subprocess.Popen, str]:
+    """Sobe o app.py numa porta livre, apontado para os serviços falsos e com estado num diretório temporário.
+
+    Espera o /health indicar o RAG pronto (ou falho) e devolve (processo, URL base).
+    """
+    workdir = tempfile.mkdtemp(prefix="carga-")
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "GOOGLE_API_KEY": "falsa", "GROQ_API_KEY": "falsa", "RAG_CLIENT": "rest",
+        "GEMINI_API_BASE": services["gemini"].url, "GROQ_BASE_URL": services["groq"].url,
+        "WPP_SERVER_URL": services["node"].url, "FLASK_PORT": str(port),
+        "RAG_MANIFEST_PATH": os.path.join(workdir, "manifest.json"),
+        "RAG_STORE_STATE_PATH": os.path.join(workdir, "store.json"),
+        "SESSION_DB_PATH": os.path.join(workdir, "sessions.db"),
+        "SLOW_REQUEST_LOG": os.path.join(workdir, "slow_requests.jsonl"),
+        "CATALOG_EXPORT_STATE": os.path.join(workdir, "catalog_export.db"),
+        "CAPTURE_PATH": os.path.join(workdir, "captura.jsonl"),
+        "PYTHONUNBUFFERED": "1",
+    })
+    env.update(overrides or {})
+    log_path = os.path.join(workdir, "app.log")
+    print(f"ℹ️  Serviços falsos: gemini {services['gemini'].url}, groq {services['groq'].url}, node {services['node'].url}", file=sys.stderr)
+    print(f"ℹ️  Log do app.py: {log_path}", file=sys.stderr)
+
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen([sys.executable, "app.py"], cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise SystemExit(f"app.py terminou durante a inicialização (código {proc.returncode}); veja {log_path}")
+            try:
+                health = requests.get(f"{base}/health", timeout=2).json()
+                if health["services"]["rag"] in ("ready", "failed"):
+                    break
+            except (requests.RequestException, ValueError, KeyError):
+                pass
+            if time.monotonic() > deadline:
+                raise SystemExit(f"app.py não ficou pronto em {timeout:g}s; veja {log_path}")
+            time.sleep(0.5)
+    except BaseException:
+        stop_app(proc)
+        raise
+    print(f"ℹ️  app.py pronto em {base} (RAG: {health['services']['rag']})", file=sys.stderr)
+    return proc, base
+
+
+def stop_app(proc: subprocess.Popen) -> None:
+    proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+class LoadDriver:
+    """Gera as mensagens na agenda, registra o status HTTP e casa as respostas recebidas pelo Node falso."""
+
+    def __init__(self, webhook_url: str, node, qps: float, duration: float, mix, senders: int, poisson: bool, workers: int, seed: int):
+        self.webhook_url = webhook_url
+        self.node = node
+        self.qps = qps
+        self.duration = duration
+        self.mix = mix
+        self.senders = senders
+        self.poisson = poisson
+        self.rng = random.Random(seed)
+        self.image = tiny_image()
+        self.results = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="carga")
+
+    def _session(self) -> requests.Session:
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = requests.Session()
+        return s
+
+    def _message(self, i: int, kind: str) -> dict:
+        sender = f"5511900{self.rng.randrange(self.senders):05d}@c.us"
+        data = {"body": self.rng.choice(PERGUNTAS), "from": sender, "isGroupMsg": False}
+        if kind == "grupo":
+            data.update({"from": f"1203630{self.rng.randrange(max(1, self.senders // 10)):05d}@g.us", "author": sender,
+                         "isGroupMsg": True, "isBotMentioned": True})
+        elif kind == "imagem":
+            data.update({"body": "o que diz essa imagem?", "media_base64": self.image, "mimetype": "image/png"})
+        return data
+
+    def _send(self, i: int, kind: str, data: dict, scheduled: float) -> None:
+        trace_id = f"carga-{i:07d}"
+        late = time.monotonic() - scheduled
+        t0 = time.monotonic()
+        try:
+            r = self._session().post(self.webhook_url, json=data, headers={"X-Trace-Id": trace_id}, timeout=120)
+            status = r.status_code
+        except requests.RequestException as e:
+            status = f"erro: {e.__class__.__name__}"
+        with self._lock:
+            self.results.append({"trace_id": trace_id, "tipo": kind, "agendado": scheduled, "atraso_envio": late,
+                                 "http_status": status, "http_s": time.monotonic() - t0})
+
+    def run(self) -> float:
+        kinds, weights = zip(*self.mix)
+        start = time.monotonic() + 0.2
+        next_at = start
+        i = 0
+        while next_at < start + self.duration:
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            kind = self.rng.choices(kinds, weights)[0]
+            self._pool.submit(self._send, i, kind, self._message(i, kind), next_at)
+            i += 1
+            next_at += self.rng.expovariate(self.qps) if self.poisson else 1.0 / self.qps
+        self._pool.shutdown(wait=True)
+        return start
+
+    def collect(self, drain_timeout: float) -> None:
+        """Espera as respostas pendentes até `drain_timeout` e preenche a latência ponta a ponta."""
+        deadline = time.monotonic() + drain_timeout
+        while True:
+            pending = 0
+            for res in self.results:
+                if "e2e_s" in res or not (isinstance(res["http_status"], int) and 200 <= res["http_status"] < 300):
+                    continue
+                replies = [r for r in self.node.replies_for(res["trace_id"]) if not r[2].startswith("OCR:")]
+                if replies:
+                    res["e2e_s"] = replies[0][0] - res["agendado"]
+                    res["respostas"] = len(replies)
+                else:
+                    pending += 1
+            if not pending or time.monotonic() >= deadline:
+                return
+            time.sleep(0.2)
+
+
+def _report(driver: LoadDriver, start: float, args, services: dict, server: dict) -> dict:
+    results = driver.results
+    sent = len(results)
+    ok_http = [r for r in results if isinstance(r["http_status"], int) and 200 <= r["http_status"] < 300]
+    answered = [r for r in ok_http if "e2e_s" in r]
+    rejected = [r for r in results if r["http_status"] in (429, 503)]
+    last = max((r["agendado"] + r["e2e_s"] for r in answered), default=start)
+    errors = sent - len(answered)
+    por_tipo = {}
+    for kind, _ in driver.mix:
+        subset = [r for r in results if r["tipo"] == kind]
+        por_tipo[kind] = {
+            "enviadas": len(subset),
+            "respondidas": sum(1 for r in subset if "e2e_s" in r),
+            "ponta_a_ponta": latency_summary([r["e2e_s"] for r in subset if "e2e_s" in r]),
+        }
+    statuses = {}
+    for r in results:
+        statuses[str(r["http_status"])] = statuses.get(str(r["http_status"]), 0) + 1
+    return {
+        "commit": _git_commit(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "qps_alvo": args.qps, "duracao_s": args.duracao, "mix": dict(driver.mix), "remetentes": args.remetentes,
+            "chegadas": "poisson" if args.poisson else "fixas", "env": dict(e.split("=", 1) for e in args.env),
+            "servicos": {name: s.snapshot() for name, s in services.items()},
+        },
+        "enviadas": sent,
+        "respondidas": len(answered),
+        "vazao_rps": round(len(answered) / (last - start), 3) if answered and last > start else 0.0,
+        "taxa_erro": round(errors / sent, 4) if sent else 0.0,
+        "rejeitadas_429_503": len(rejected),
+        "sem_resposta": len(ok_http) - len(answered),
+        "http_status": statuses,
+        "ponta_a_ponta": latency_summary([r["e2e_s"] for r in answered]),
+        "webhook_http": latency_summary([r["http_s"] for r in results if isinstance(r["http_status"], int)]),
+        "atraso_do_gerador": latency_summary([r["atraso_envio"] for r in results]),
+        "por_tipo": por_tipo,
+        "servidor": server,
+    }
+
+
+def _print_report(rep: dict) -> None:
+    e2e, http = rep["ponta_a_ponta"], rep["webhook_http"]
+    print(f"\ncommit {rep['commit']}  qps alvo {rep['config']['qps_alvo']}  duração {rep['config']['duracao_s']}s")
+    print(f"enviadas {rep['enviadas']}  respondidas {rep['respondidas']}  vazão {rep['vazao_rps']} resp/s  "
+          f"erro {rep['taxa_erro'] * 100:.2f}%  (429/503: {rep['rejeitadas_429_503']}, sem resposta: {rep['sem_resposta']})")
+    print(f"{'':<14}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = [("ponta a ponta", e2e), ("webhook HTTP", http)] + [(f"  {k}", v["ponta_a_ponta"]) for k, v in rep["por_tipo"].items()]
+    for name, s in rows:
+        fmt = lambda v: f"{v:>10.1f}" if v is not None else f"{'-':>10}"
+        print(f"{name:<14}{s['n']:>7}{fmt(s['p50_ms'])}{fmt(s['p95_ms'])}{fmt(s['p99_ms'])}{fmt(s['max_ms'])}")
+    if rep["atraso_do_gerador"]["p99_ms"] and rep["atraso_do_gerador"]["p99_ms"] > 50:
+        print(f"⚠️  O gerador atrasou envios (p99 {rep['atraso_do_gerador']['p99_ms']} ms); aumente --conexoes.")
+
+
+def compare(path_a: str, path_b: str) -> None:
+    with open(path_a, encoding="utf-8") as f:
+        a = json.load(f)
+    with open(path_b, encoding="utf-8") as f:
+        b = json.load(f)
+    print(f"{'métrica':<26}{a.get('commit') or 'A':>12}{b.get('commit') or 'B':>12}{'Δ':>10}")
+    metrics = [("vazao_rps", a["vazao_rps"], b["vazao_rps"]), ("taxa_erro", a["taxa_erro"], b["taxa_erro"])]
+    for section in ("ponta_a_ponta", "webhook_http"):
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            metrics.append((f"{section}.{key}", a[section][key], b[section][key]))
+    for name, va, vb in metrics:
+        delta = f"{(vb - va) / va * 100:+.1f}%" if va and vb is not None else "-"
+        print(f"{name:<26}{str(va):>12}{str(vb):>12}{delta:>10}")
+    if a["config"]["qps_alvo"] != b["config"]["qps_alvo"] or a["config"]["mix"] != b["config"]["mix"]:
+        print("⚠️  As execuções usaram carga diferente (qps/mix); a comparação não é direta.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--qps", type=float, default=5.0)
+    parser.add_argument("--duracao", type=float, default=30.0, help="segundos de carga")
+    parser.add_argument("--mix", default="direta=0.7,grupo=0.2,imagem=0.1")
+    parser.add_argument("--remetentes", type=int, default=200, help="clientes distintos simulados")
+    parser.add_argument("--poisson", action="store_true", help="chegadas de Poisson em vez de intervalo fixo")
+    parser.add_argument("--conexoes", type=int, default=128, help="envios simultâneos no máximo")
+    parser.add_argument("--espera-final", type=float, default=60.0, help="segundos esperando respostas após a carga")
+    parser.add_argument("--env", action="append", default=[], help="variável do app.py, ex.: WEBHOOK_ASYNC=1 (repetível)")
+    parser.add_argument("--saida", help="grava o relatório JSON neste caminho")
+    parser.add_argument("--comparar", nargs=2, metavar=("A.json", "B.json"))
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.comparar:
+        compare(*args.comparar)
+        return
+
+    services = start_services(args)
+    try:
+        proc, base = launch_app(services, dict(e.split("=", 1) for e in args.env))
+    except BaseException:
+        for s in services.values():
+            s.stop()
+        raise
+    try:
+        print(f"ℹ️  Carga: {args.qps} msg/s por {args.duracao:g}s", file=sys.stderr)
+
+        driver = LoadDriver(f"{base}/webhook", services["node"], args.qps, args.duracao, _parse_mix(args.mix),
+                            args.remetentes, args.poisson, args.conexoes, args.semente)
+        start = driver.run()
+        driver.collect(args.espera_final)
+        try:
+            server = requests.get(f"{base}/metrics", timeout=10).json().get("instrumentacao")
+        except (requests.RequestException, ValueError):
+            server = None
+        rep = _report(driver, start, args, services, server)
+    finally:
+        stop_app(proc)
+        for s in services.values():
+            s.stop()
+
+    _print_report(rep)
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2)
+        print(f"Relatório gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
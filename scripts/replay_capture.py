@@ -0,0 +1,337 @@
+"""Reproduz uma captura do webhook (CAPTURE_TRAFFIC=1) respeitando os intervalos originais.
+
+Uso:
+    python scripts/replay_capture.py captures/webhook.jsonl --url http://127.0.0.1:5000 [--node-porta 3999]
+    python scripts/replay_capture.py captures/webhook.jsonl --iniciar [--env WEBHOOK_ASYNC=1] [--velocidade 2]
+
+Com --url o servidor já está rodando e precisa ter WPP_SERVER_URL apontando
+para o Node falso que este script sobe em --node-porta. Com --iniciar o app.py
+é iniciado como no scripts/load_test.py, contra Gemini, Groq e Node falsos
+(o conteúdo das respostas então não se compara ao gravado, só a latência).
+
+Os arquivos rotacionados (webhook.jsonl.1, .2, ...) entram automaticamente,
+do mais antigo ao mais novo. As mensagens de um mesmo remetente saem na ordem
+gravada, uma depois da outra; remetentes diferentes saem em paralelo. A
+latência de cada mensagem vai do horário em que ela deveria sair até a
+primeira resposta (fora o "OCR:") chegar ao Node, e é comparada com a
+gravada; o texto das respostas é comparado com o gravado.
+"""
+import os
+import sys
+import json
+import math
+import time
+import base64
+import difflib
+import argparse
+import threading
+from collections import deque
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import Behavior, FakeNode, add_arguments, start_services
+from load_test import launch_app, stop_app, tiny_image, latency_summary, _git_commit
+
+
+def capture_files(path: str) -> list[str]:
+    """O arquivo e seus rotacionados, do mais antigo (maior sufixo) ao atual."""
+    rotated = []
+    n = 1
+    while os.path.exists(f"{path}.{n}"):
+        rotated.append(f"{path}.{n}")
+        n += 1
+    return list(reversed(rotated)) + ([path] if os.path.exists(path) else [])
+
+
+def load_capture(path: str) -> tuple[list[dict], dict]:
+    """Lê a captura e devolve (entradas ordenadas por horário, respostas gravadas por trace_id)."""
+    files = capture_files(path)
+    if not files:
+        raise SystemExit(f"captura não encontrada: {path}")
+    inbound, outbound = [], {}
+    for name in files:
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("evento") == "entrada":
+                    inbound.append(event)
+                elif event.get("evento") == "saida" and event.get("ok") and event.get("trace_id"):
+                    outbound.setdefault(event["trace_id"], []).append(event)
+    inbound.sort(key=lambda e: e["t"])
+    return inbound, outbound
+
+
+def _answer(contents: list[str]) -> list[str]:
+    # A transcrição do OCR é eco da entrada; a resposta do agente é o que vem depois
+    return [c for c in contents if not c.startswith("OCR:")]
+
+
+class Replayer:
+    """Agenda as entradas gravadas, mantém a ordem por remetente e casa as respostas pelo X-Trace-Id."""
+
+    def __init__(self, base_url: str, node: FakeNode, events: list[dict], speed: float, workers: int, media_dir: str | None):
+        self.base_url = base_url.rstrip("/")
+        self.node = node
+        self.events = events
+        self.speed = speed
+        self.media_dir = media_dir
+        self.placeholder = tiny_image()
+        self.results = []
+        self.media_found = 0
+        self.media_placeholder = 0
+        self._queues = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay")
+
+    def _session(self) -> requests.Session:
+        s = getattr(self._local, "session", None)
+        if s is None:
+            s = self._local.session = requests.Session()
+        return s
+
+    def _media(self, info: dict) -> bytes:
+        sha = info.get("sha256")
+        path = os.path.join(self.media_dir, sha) if self.media_dir and sha else None
+        found = bool(path and os.path.exists(path))
+        with self._lock:
+            if found:
+                self.media_found += 1
+            else:
+                self.media_placeholder += 1
+        if found:
+            with open(path, "rb") as f:
+                return f.read()
+        return base64.b64decode(self.placeholder.split(",", 1)[1])
+
+    def _send(self, event: dict, scheduled: float) -> None:
+        trace_id = f"replay-{event['trace_id']}"[:64]
+        payload = dict(event["payload"])
+        info = payload.pop("media", None)
+        headers = {"X-Trace-Id": trace_id}
+        late = time.monotonic() - scheduled
+        try:
+            if event.get("rota") == "/webhook/media":
+                files = {"media": ("midia", self._media(info or {}), payload.get("mimetype") or "application/octet-stream")} if info else None
+                r = self._session().post(f"{self.base_url}/webhook/media", data=payload, files=files, headers=headers, timeout=120)
+            else:
+                if info:
+                    mimetype = payload.get("mimetype") or info.get("mimetype") or "image/png"
+                    payload["media_base64"] = f"data:{mimetype};base64," + base64.b64encode(self._media(info)).decode()
+                r = self._session().post(f"{self.base_url}/webhook", json=payload, headers=headers, timeout=120)
+            status = r.status_code
+        except requests.RequestException as e:
+            status = f"erro: {e.__class__.__name__}"
+        with self._lock:
+            self.results.append({"trace_id": trace_id, "original": event["trace_id"], "agendado": scheduled,
+                                 "atraso_envio": late, "http_status": status})
+
+    def _drain(self, key: str) -> None:
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                event, scheduled = queue.popleft()
+            self._send(event, scheduled)
+
+    def _enqueue(self, event: dict, scheduled: float) -> None:
+        p = event["payload"]
+        key = f"{p.get('from')}|{p.get('author') or ''}"
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is not None:
+                # Já há um envio desse remetente em andamento; este sai logo depois dele
+                queue.append((event, scheduled))
+                return
+            self._queues[key] = deque([(event, scheduled)])
+        self._pool.submit(self._drain, key)
+
+    def run(self) -> float:
+        t_first = self.events[0]["t"]
+        start = time.monotonic() + 0.2
+        for event in self.events:
+            scheduled = start + (event["t"] - t_first) / self.speed
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            self._enqueue(event, scheduled)
+        self._pool.shutdown(wait=True)
+        return start
+
+    def collect(self, expected: set, drain_timeout: float) -> None:
+        """Espera as respostas das mensagens que tiveram resposta na gravação, até `drain_timeout`."""
+        deadline = time.monotonic() + drain_timeout
+        while True:
+            pending = 0
+            for res in self.results:
+                replies = self.node.replies_for(res["trace_id"])
+                answer = [r for r in replies if not r[2].startswith("OCR:")]
+                if answer:
+                    res["e2e_s"] = answer[0][0] - res["agendado"]
+                    res["conteudo"] = _answer([r[2] for r in replies])
+                elif res["original"] in expected and isinstance(res["http_status"], int) and 200 <= res["http_status"] < 300:
+                    pending += 1
+            if not pending or time.monotonic() >= deadline:
+                return
+            time.sleep(0.2)
+
+
+def _recorded(events: list[dict], outbound: dict) -> dict:
+    """Latência e texto gravados por trace_id original."""
+    recorded = {}
+    for event in events:
+        sent = outbound.get(event["trace_id"], [])
+        contents = _answer([str(s["payload"].get("conteudo", "")) for s in sent])
+        answer = [s for s in sent if not str(s["payload"].get("conteudo", "")).startswith("OCR:")]
+        if answer:
+            recorded[event["trace_id"]] = {"e2e_s": answer[0]["t"] - event["t"], "conteudo": contents}
+    return recorded
+
+
+def _report(replayer: Replayer, recorded: dict, args, source: str) -> dict:
+    results = replayer.results
+    deltas, ratios, exact, examples = [], [], 0, []
+    missing = []
+    for res in results:
+        rec = recorded.get(res["original"])
+        if rec is None:
+            continue
+        if "e2e_s" not in res:
+            missing.append(res["original"])
+            continue
+        deltas.append(res["e2e_s"] - rec["e2e_s"])
+        a, b = "\n".join(rec["conteudo"]), "\n".join(res["conteudo"])
+        ratio = difflib.SequenceMatcher(None, a, b).ratio()
+        ratios.append(ratio)
+        exact += a == b
+        examples.append((ratio, res["original"], a, b))
+    compared = len(ratios)
+    examples.sort(key=lambda e: e[0])
+
+    def signed(values):
+        # Diferenças podem ser negativas: percentis sobre os valores com sinal, em ms
+        s = sorted(values)
+        pick = lambda p: round(s[max(0, math.ceil(p * len(s)) - 1)] * 1000, 1) if s else None
+        return {"n": len(s), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99)}
+
+    statuses = {}
+    for r in results:
+        statuses[str(r["http_status"])] = statuses.get(str(r["http_status"]), 0) + 1
+    return {
+        "commit": _git_commit(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "captura": source,
+        "velocidade": args.velocidade,
+        "enviadas": len(results),
+        "http_status": statuses,
+        "gravado": latency_summary([r["e2e_s"] for r in recorded.values()]),
+        "reproduzido": latency_summary([r["e2e_s"] for r in results if "e2e_s" in r]),
+        "diferenca_latencia": signed(deltas),
+        "atraso_do_gerador": latency_summary([r["atraso_envio"] for r in results]),
+        "conteudo": {
+            "comparadas": compared,
+            "identicas": exact,
+            "taxa_identicas": round(exact / compared, 4) if compared else None,
+            "similaridade_media": round(sum(ratios) / compared, 4) if compared else None,
+            "mais_diferentes": [
+                {"trace_id": t, "similaridade": round(r, 3), "gravado": a[:160], "reproduzido": b[:160]}
+                for r, t, a, b in examples[:5] if r < 1.0
+            ],
+        },
+        "sem_resposta": missing,
+        "midia": {"do_diretorio": replayer.media_found, "substituta": replayer.media_placeholder},
+    }
+
+
+def _print_report(rep: dict) -> None:
+    print(f"\ncaptura {rep['captura']}  velocidade {rep['velocidade']:g}x  commit {rep['commit']}")
+    print(f"enviadas {rep['enviadas']}  http {rep['http_status']}  sem resposta {len(rep['sem_resposta'])}")
+    print(f"{'':<16}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    fmt = lambda v: f"{v:>10.1f}" if v is not None else f"{'-':>10}"
+    for name, key in (("gravado", "gravado"), ("reproduzido", "reproduzido"), ("diferença", "diferenca_latencia")):
+        s = rep[key]
+        print(f"{name:<16}{s['n']:>7}{fmt(s['p50_ms'])}{fmt(s['p95_ms'])}{fmt(s['p99_ms'])}")
+    c = rep["conteudo"]
+    if c["comparadas"]:
+        print(f"respostas idênticas {c['identicas']}/{c['comparadas']} ({c['taxa_identicas'] * 100:.1f}%), "
+              f"similaridade média {c['similaridade_media']:.3f}")
+        for ex in c["mais_diferentes"]:
+            print(f"  {ex['trace_id']} ({ex['similaridade']:.2f})\n    gravado:     {ex['gravado']!r}\n    reproduzido: {ex['reproduzido']!r}")
+    if rep["midia"]["substituta"]:
+        print(f"ℹ️  {rep['midia']['substituta']} mídia(s) sem arquivo em --midia foram trocadas por uma imagem pequena.")
+    if rep["atraso_do_gerador"]["p99_ms"] and rep["atraso_do_gerador"]["p99_ms"] > 50:
+        print(f"⚠️  Envios saíram atrasados (p99 {rep['atraso_do_gerador']['p99_ms']} ms): fila por remetente ou poucas --conexoes.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("captura", help="arquivo JSONL gravado com CAPTURE_TRAFFIC=1")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url", help="URL base de um app.py já rodando")
+    target.add_argument("--iniciar", action="store_true", help="sobe o app.py contra serviços falsos")
+    parser.add_argument("--node-porta", type=int, default=3999, help="porta do Node falso com --url (padrão 3999)")
+    parser.add_argument("--velocidade", type=float, default=1.0, help="multiplicador do tempo real (2 = duas vezes mais rápido)")
+    parser.add_argument("--limite", type=int, help="reproduz só as N primeiras mensagens")
+    parser.add_argument("--midia", help="diretório com as mídias originais nomeadas pelo SHA-256")
+    parser.add_argument("--conexoes", type=int, default=128, help="envios simultâneos no máximo")
+    parser.add_argument("--espera-final", type=float, default=60.0, help="segundos esperando respostas após o último envio")
+    parser.add_argument("--env", action="append", default=[], help="variável do app.py com --iniciar (repetível)")
+    parser.add_argument("--saida", help="grava o relatório JSON neste caminho")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.velocidade <= 0:
+        raise SystemExit("--velocidade precisa ser positiva")
+
+    events, outbound = load_capture(args.captura)
+    events = events[:args.limite] if args.limite else events
+    if not events:
+        raise SystemExit("a captura não tem mensagens recebidas")
+    recorded = _recorded(events, outbound)
+    span_s = events[-1]["t"] - events[0]["t"]
+    print(f"ℹ️  {len(events)} mensagens em {span_s:.1f}s gravados ({len(recorded)} com resposta); "
+          f"reprodução em ~{span_s / args.velocidade:.1f}s", file=sys.stderr)
+
+    proc = None
+    if args.iniciar:
+        services = start_services(args)
+        try:
+            proc, base = launch_app(services, dict(e.split("=", 1) for e in args.env))
+        except BaseException:
+            for s in services.values():
+                s.stop()
+            raise
+    else:
+        node = FakeNode(Behavior(args.node_latencia, args.node_erro, 0.0, args.semente + 2), port=args.node_porta).start()
+        services = {"node": node}
+        base = args.url
+        print(f"ℹ️  Node falso em {node.url}; o servidor precisa de WPP_SERVER_URL={node.url}", file=sys.stderr)
+    try:
+        replayer = Replayer(base, services["node"], events, args.velocidade, args.conexoes, args.midia)
+        replayer.run()
+        replayer.collect(set(recorded), args.espera_final)
+        rep = _report(replayer, recorded, args, args.captura)
+    finally:
+        if proc is not None:
+            stop_app(proc)
+        for s in services.values():
+            s.stop()
+
+    _print_report(rep)
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(rep, f, ensure_ascii=False, indent=2)
+        print(f"Relatório gravado em {args.saida}")
+
+
+if __name__ == "__main__":
+    main()
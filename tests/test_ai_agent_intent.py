@@ -0,0 +1,19 @@
+from ai_agent import AIAgent
+from rag.model_resolver import ModelResolver
+
+
+def _agent():
+    agent = object.__new__(AIAgent)
+    agent.model_resolver = ModelResolver({"galaxy s25 ultra": "Samsung Galaxy S25 Ultra", "s25 ultra": "Samsung Galaxy S25 Ultra"})
+    return agent
+
+
+def test_filtro_sobre_modelo_citado_nao_vira_listagem():
+    intent = _agent()._classify("o s25 ultra tem 1TB?")
+    assert intent["tipo"] == "pergunta_tecnica"
+
+
+def test_filtro_sem_modelo_continua_no_catalogo():
+    intent = _agent()._classify("quais celulares tem 1TB?")
+    assert intent["tipo"] == "consulta_catalogo"
+    assert intent["consulta"]["ranges"][0][0] == "storage_gb"
@@ -0,0 +1,104 @@
+import ai_agent
+from ai_agent import AIAgent
+from history_store import create_history_store
+
+
+def _agent(reply, chunks=()):
+    """AIAgent sem inicialização: `_process_message` transmite `chunks` e devolve `reply`."""
+    agent = object.__new__(AIAgent)
+    agent.conversation_histories = create_history_store("sistema", backend="memory")
+
+    def _process(user_id, user_message, history):
+        sink = ai_agent._stream_sink.get()
+        for chunk in chunks:
+            if sink(chunk) is False:
+                break
+        return {"tipo": "texto", "conteudo": reply}
+
+    agent._process_message = _process
+    return agent
+
+
+class _Claim:
+    def __init__(self, result=True, started_result=True):
+        self.result = result
+        self.started_result = started_result
+        self.calls = []
+
+    def __call__(self, started=False):
+        self.calls.append(started)
+        return self.started_result if started else self.result
+
+
+def _history(agent, user="u"):
+    return [m["content"] for m in agent.conversation_histories.get_messages(user)[1:]]
+
+
+def test_resposta_transmitida_inteira_nao_e_reenviada():
+    agent = _agent("A.\n\nB.", chunks=("A.", "B."))
+    sent = []
+    resp = agent.process_message("u", "pergunta", on_chunk=sent.append)
+    assert sent == ["A.", "B."]
+    assert resp["transmitido"] is True
+
+
+def test_substituida_antes_do_primeiro_pedaco():
+    agent = _agent("A.\n\nB.", chunks=("A.", "B."))
+    sent = []
+    claim = _Claim(started_result=False)
+    assert agent.process_message("u", "pergunta", claim=claim, on_chunk=sent.append) is None
+    assert sent == []
+    assert claim.calls == [True]
+    assert _history(agent) == []
+
+
+def test_pedaco_enviado_compromete_a_resposta_mesmo_com_mensagem_nova():
+    agent = _agent("A.\n\nB.", chunks=("A.", "B."))
+    sent = []
+    # Mensagem nova chegou depois do primeiro pedaço: claim() comum daria False
+    claim = _Claim(result=False)
+    resp = agent.process_message("u", "pergunta", claim=claim, on_chunk=sent.append)
+    assert resp is not None and resp["transmitido"] is True
+    assert claim.calls == [True]
+    assert _history(agent) == ["pergunta", "A.\n\nB."]
+
+
+def test_sem_streaming_claim_falso_descarta():
+    agent = _agent("resposta")
+    assert agent.process_message("u", "pergunta", claim=_Claim(result=False)) is None
+    assert _history(agent) == []
+
+
+def test_resposta_parcial_envia_so_o_restante():
+    agent = _agent("A.\n\nB.\n\nC.", chunks=("A.",))
+    sent = []
+    resp = agent.process_message("u", "pergunta", on_chunk=sent.append)
+    assert sent == ["A."]
+    assert resp == {"tipo": "texto", "conteudo": "B.\n\nC."}
+    assert _history(agent) == ["pergunta", "A.\n\nB.\n\nC."]
+
+
+def test_falha_no_meio_envia_aviso_e_nao_a_resposta_inteira():
+    # Geração caiu depois do primeiro pedaço e a resposta final veio do fallback
+    agent = _agent("Resposta completa da reserva.", chunks=("A.",))
+    sent = []
+    resp = agent.process_message("u", "pergunta", on_chunk=sent.append)
+    assert resp == {"tipo": "texto", "conteudo": ai_agent.STREAM_CUT_NOTICE}
+    assert "Resposta completa" not in resp["conteudo"]
+    assert _history(agent) == ["pergunta", "A."]
+
+
+def test_pedaco_recusado_nao_entra_no_historico():
+    agent = _agent("A.\n\nB.\n\nC.", chunks=("A.", "B.", "C."))
+    sent = []
+
+    def _on_chunk(chunk):
+        # Depois do primeiro pedaço o aviso de timeout saiu e os envios são recusados
+        if sent:
+            return False
+        sent.append(chunk)
+        return True
+
+    agent.process_message("u", "pergunta", on_chunk=_on_chunk)
+    assert sent == ["A."]
+    assert _history(agent) == ["pergunta", "A."]
@@ -0,0 +1,85 @@
+import json
+import time
+from urllib.parse import quote
+
+import pytest
+
+import app as webapp
+
+
+@pytest.fixture
+def client(monkeypatch):
+    spools = []
+    spool_body = webapp._spool_body
+
+    def _tracked(stream, limit):
+        spool = spool_body(stream, limit)
+        spools.append(spool)
+        return spool
+
+    monkeypatch.setattr(webapp, "agent", object())
+    monkeypatch.setattr(webapp, "_spool_body", _tracked)
+    monkeypatch.setattr(webapp.coalescer, "window", 0)
+    return webapp.app.test_client(), spools
+
+
+def _post(client):
+    meta = quote(json.dumps({"from": "5511999999999", "body": "foto"}))
+    return client.post("/webhook/media", data=b"\x89PNG" + b"0" * 100,
+                       headers={"Content-Type": "image/png", "X-Message-Meta": meta})
+
+
+def test_midia_fechada_quando_fila_do_llm_cheia(client, monkeypatch):
+    http, spools = client
+    monkeypatch.setattr(webapp.SCHEDULER, "saturated", lambda: True)
+    assert _post(http).status_code == 429
+    assert len(spools) == 1 and spools[0].closed
+
+
+def test_midia_fechada_quando_fila_do_webhook_cheia(client, monkeypatch):
+    http, spools = client
+
+    class _Full:
+        def submit(self, job):
+            return False
+
+    monkeypatch.setattr(webapp.SCHEDULER, "saturated", lambda: False)
+    monkeypatch.setattr(webapp, "worker_pool", _Full())
+    assert _post(http).status_code == 503
+    assert len(spools) == 1 and spools[0].closed
+
+
+def test_erro_no_agente_libera_o_lote_agrupado(monkeypatch):
+    from message_coalescer import MessageCoalescer
+
+    class _Broken:
+        def process_message(self, *args, **kwargs):
+            raise RuntimeError("falhou")
+
+    sent = []
+    monkeypatch.setattr(webapp, "agent", _Broken())
+    monkeypatch.setattr(webapp.outbox, "put", lambda payload, on_sent=None: sent.append(payload))
+    done = []
+    c = MessageCoalescer(lambda job: (webapp.process_webhook_job(job), done.append(1)), window_ms=10)
+    c.add(webapp._build_job({"from": "5511", "body": "oi"}, "agora"))
+    for _ in range(200):
+        if done:
+            break
+        time.sleep(0.01)
+    assert sent and sent[0]["conteudo"].startswith("Tive um erro")
+    assert c.snapshot()["remetentes_ativos"] == 0
+
+
+def test_hedge_e_disjuntores_no_formato_prometheus(monkeypatch):
+    from metrics import METRICS
+    from rag.hedging import CircuitBreaker, HedgedCall
+
+    class _Agent:
+        file_search = None
+        hedge = HedgedCall(CircuitBreaker("gemini"), CircuitBreaker("groq", threshold=1), workers=1, backup_workers=1)
+
+    _Agent.hedge.backup.record_failure()
+    monkeypatch.setattr(webapp, "agent", _Agent())
+    text = METRICS.render_prometheus()
+    assert 'disjuntor_estado{estado="aberto",provedor="groq"} 1' in text
+    assert "hedge_disparos_total 0" in text and "hedge_orcamento_segundos 4.0" in text
@@ -0,0 +1,81 @@
+import asyncio
+
+from rag.bulk_ingest import sync_directory
+from rag.ingest_manifest import IngestManifest
+
+
+class _Client:
+    """Store falsa: a indexação só termina a partir da chamada de `finish()`."""
+
+    store_name = "fileSearchStores/teste"
+
+    def __init__(self):
+        self.uploads = []
+        self.deleted = []
+        self.ops = {}
+        self.instant = False
+
+    async def start_upload(self, path, display_name):
+        name = f"operations/{len(self.uploads)}"
+        self.uploads.append(display_name)
+        self.ops[name] = {"name": name, "done": False}
+        if self.instant:
+            self.finish()
+        return dict(self.ops[name])
+
+    async def get_operation(self, name):
+        return dict(self.ops[name])
+
+    async def delete_document(self, doc):
+        self.deleted.append(doc)
+
+    def finish(self):
+        self.instant = True
+        for name, op in self.ops.items():
+            op.update(done=True, response={"documentName": f"{self.store_name}/documents/{name.split('/')[-1]}"})
+
+
+def _sync(client, directory, manifest):
+    return asyncio.run(sync_directory(client, str(directory), manifest=manifest, prefix="docs",
+                                      poll_initial=0.01, poll_max=0.01))
+
+
+def test_timeout_de_indexacao_nao_duplica_o_documento(tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_POLL_TIMEOUT", "0")
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("ficha A")
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    client = _Client()
+
+    report = _sync(client, docs, manifest)
+    assert report["falhas"] == 1 and client.uploads == ["docs/a.txt"]
+    assert IngestManifest(manifest.path).get(client.store_name, "docs/a.txt")["pendente"]["operacao"] == "operations/0"
+
+    # Ainda indexando: nada é reenviado
+    report = _sync(client, docs, manifest)
+    assert client.uploads == ["docs/a.txt"] and report["indexando"] == 1
+
+    # Terminou: o documento é adotado sem novo upload
+    client.finish()
+    report = _sync(client, docs, manifest)
+    assert client.uploads == ["docs/a.txt"] and client.deleted == []
+    entry = manifest.get(client.store_name, "docs/a.txt")
+    assert entry["document"].endswith("/documents/0") and "pendente" not in entry
+
+
+def test_orfao_de_arquivo_alterado_e_apagado(tmp_path, monkeypatch):
+    monkeypatch.setenv("RAG_POLL_TIMEOUT", "0")
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    (docs / "a.txt").write_text("ficha A")
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    client = _Client()
+    _sync(client, docs, manifest)
+
+    (docs / "a.txt").write_text("ficha A revisada")
+    client.finish()
+    report = _sync(client, docs, manifest)
+    assert client.uploads == ["docs/a.txt", "docs/a.txt"]
+    assert client.deleted == [f"{client.store_name}/documents/0"]
+    assert report["enviados"] == 1 and report["falhas"] == 0
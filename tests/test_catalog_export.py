@@ -0,0 +1,82 @@
+import json
+import sqlite3
+
+import pytest
+
+from rag.catalog_export import ExportState, delta_path, export_catalog
+
+
+class _DB:
+    """Substituto do db_tools sobre SQLite: `executar_query(sql)` devolve uma lista de dicts."""
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:")
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("CREATE TABLE smartphones (id INTEGER PRIMARY KEY, modelo TEXT, fabricante TEXT, "
+                          "especificacoes_tecnicas TEXT, info_geral TEXT, versao INTEGER)")
+        self.conn.executemany(
+            "INSERT INTO smartphones VALUES (?, ?, 'Marca', ?, '{}', ?)",
+            ((i, f"Modelo {i}", json.dumps({"nfc": True}), i) for i in range(1, 10)),
+        )
+
+    def executar_query(self, query, params=None):
+        return [dict(r) for r in self.conn.execute(query, params or ())]
+
+
+def _lines(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+@pytest.fixture
+def ctx(tmp_path):
+    state = ExportState(str(tmp_path / "estado.db"))
+    yield _DB(), str(tmp_path / "export" / "smartphones.jsonl"), state
+    state.close()
+
+
+def test_completa_em_lotes_com_id(ctx):
+    db, out, _ = ctx
+    stats = export_catalog(db, out, batch_size=4)
+    assert stats["lotes"] == 3 and stats["emitidas"] == 9 and stats["arquivo"] == out
+    rows = _lines(out)
+    assert [r["id"] for r in rows] == list(range(1, 10))
+    assert rows[0]["especificacoes_tecnicas"] == {"nfc": True}
+
+
+def test_incremental_por_hash_grava_delta_separado(ctx):
+    db, out, state = ctx
+    export_catalog(db, out, batch_size=4)
+    first = export_catalog(db, out, incremental=True, batch_size=4, state=state)
+    assert first["arquivo"] == delta_path(out) and first["emitidas"] == 9
+
+    assert not export_catalog(db, out, incremental=True, batch_size=4, state=state)["mudou"]
+
+    db.conn.execute("UPDATE smartphones SET modelo = 'Modelo 2 Pro' WHERE id = 2")
+    db.conn.execute("DELETE FROM smartphones WHERE id = 7")
+    stats = export_catalog(db, out, incremental=True, batch_size=4, state=state)
+    assert (stats["emitidas"], stats["removidas"]) == (1, 1)
+    delta = _lines(delta_path(out))
+    assert delta[0]["id"] == 2 and delta[0]["modelo"] == "Modelo 2 Pro"
+    # O marcador volta com o mesmo tipo do `id` das linhas
+    assert delta[1] == {"id": 7, "removido": True}
+    # A exportação completa não foi substituída pelo delta
+    assert len(_lines(out)) == 9
+
+
+def test_incremental_por_marca_dagua_numerica(ctx):
+    db, out, state = ctx
+    first = export_catalog(db, out, incremental=True, change_column="versao", batch_size=4, state=state)
+    assert first["emitidas"] == 9
+    assert state.get_meta("watermark:smartphones:versao") == 9
+
+    # 10 > 9 numericamente (como texto, "10" < "9" e a marca ficaria presa)
+    db.conn.execute("UPDATE smartphones SET versao = 10 WHERE id = 3")
+    stats = export_catalog(db, out, incremental=True, change_column="versao", batch_size=4, state=state)
+    assert stats["emitidas"] == 1 and _lines(delta_path(out))[0]["id"] == 3
+    assert state.get_meta("watermark:smartphones:versao") == 10
+
+    db.conn.execute("UPDATE smartphones SET versao = 11 WHERE id = 5")
+    stats = export_catalog(db, out, incremental=True, change_column="versao", batch_size=4, state=state)
+    assert stats["emitidas"] == 1 and _lines(delta_path(out))[0]["id"] == 5
+    assert not export_catalog(db, out, incremental=True, change_column="versao", batch_size=4, state=state)["mudou"]
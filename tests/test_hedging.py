@@ -0,0 +1,99 @@
+import time
+import threading
+
+from rag.hedging import CircuitBreaker, HedgedCall
+from rag.llm_scheduler import SchedulerBusy
+
+
+def _hedge(workers=4, budget_ms=50, total_timeout=2.0, threshold=5):
+    return HedgedCall(CircuitBreaker("gemini", threshold=threshold, cooldown=60),
+                      CircuitBreaker("groq", threshold=threshold, cooldown=60),
+                      workers=workers, budget_ms=budget_ms, total_timeout=total_timeout, backup_workers=2)
+
+
+def _ok(text):
+    return bool(text)
+
+
+def test_principal_rapido_vence_sem_hedge():
+    hedge = _hedge()
+    assert hedge.call(lambda: "gemini", lambda: "groq", _ok) == ("gemini", "principal")
+    assert hedge.snapshot()["hedges"] == 0
+
+
+def test_principal_lento_dispara_o_reserva():
+    hedge = _hedge()
+    release = threading.Event()
+    try:
+        assert hedge.call(lambda: release.wait(5) and "gemini", lambda: "groq", _ok) == ("groq", "reserva")
+    finally:
+        release.set()
+
+
+def test_reserva_sai_mesmo_com_o_pool_do_principal_tomado():
+    hedge = _hedge(workers=4, total_timeout=1.0)
+    release = threading.Event()
+    try:
+        # 4 principais travados ocupam todas as threads do pool principal
+        for _ in range(4):
+            assert hedge.call(lambda: release.wait(10) and "gemini", lambda: "groq", _ok) == ("groq", "reserva")
+        t0 = time.monotonic()
+        assert hedge.call(lambda: "gemini", lambda: "groq", _ok) == ("groq", "reserva")
+        assert time.monotonic() - t0 < 0.5
+    finally:
+        release.set()
+
+
+def test_principal_com_erro_vai_direto_ao_reserva_e_abre_o_disjuntor():
+    hedge = _hedge(threshold=2)
+
+    def _fail():
+        raise RuntimeError("503")
+
+    for _ in range(2):
+        assert hedge.call(_fail, lambda: "groq", _ok) == ("groq", "reserva")
+    assert hedge.primary.state == "aberto"
+    # Disjuntor aberto: o principal nem é chamado
+    called = []
+    assert hedge.call(lambda: called.append(1) or "gemini", lambda: "groq", _ok) == ("groq", "reserva")
+    assert called == []
+
+
+def test_fila_local_cheia_nao_conta_como_falha():
+    hedge = _hedge(threshold=1)
+
+    def _busy():
+        raise SchedulerBusy("fila cheia")
+
+    assert hedge.call(_busy, lambda: "groq", _ok) == ("groq", "reserva")
+    assert hedge.primary.state == "fechado"
+
+
+def test_nenhum_serve_devolve_none():
+    hedge = _hedge(total_timeout=0.2)
+    assert hedge.call(lambda: "", lambda: "", _ok) == (None, None)
+    assert hedge.snapshot()["sem_resposta"] == 1
+
+
+def test_resposta_em_cache_nao_passa_pelo_hedge():
+    from ai_agent import AIAgent
+    from rag.answer_cache import AnswerCache
+
+    class _FS:
+        store_name = "store"
+
+        def __init__(self):
+            self.cache = AnswerCache(max_entries=8, ttl=60)
+            self.cache.put("store", "tem nfc?", "Sim.")
+
+        def query(self, pergunta):
+            return self.cache.get(self.store_name, pergunta)
+
+    class _NoHedge:
+        def call(self, *args):
+            raise AssertionError("cache hit não deveria passar pelo hedge")
+
+    agent = object.__new__(AIAgent)
+    agent.file_search, agent.groq, agent.hedge, agent.stream_replies = _FS(), object(), _NoHedge(), False
+    assert agent._rag_answer("Tem NFC?", history=[]) == ("Sim.", "principal")
+    assert agent.file_search.cache.hits == 1 and agent.file_search.cache.misses == 0
@@ -0,0 +1,73 @@
+import time
+import sqlite3
+
+from history_store import ConversationHistoryStore, SQLiteHistoryStore
+
+
+def _spilled(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def test_sessao_removida_por_memoria_volta_do_disco(tmp_path):
+    path = str(tmp_path / "spill.db")
+    store = ConversationHistoryStore("sistema", memory_budget=300, spill_path=path)
+    for u in range(4):
+        store.append(f"u{u}", "user", "x" * 100)
+    assert _spilled(path) == 3
+    assert store.get_messages("u0")[1] == {"role": "user", "content": "x" * 100}
+
+
+def test_sessoes_ociosas_nao_acumulam_no_disco(tmp_path):
+    path = str(tmp_path / "spill.db")
+    store = ConversationHistoryStore("sistema", idle_ttl=0.2, memory_budget=300, spill_path=path)
+    for u in range(4):
+        store.append(f"u{u}", "user", "x" * 100)
+    assert _spilled(path) == 3
+    time.sleep(0.3)
+    store.append("novo", "user", "oi")
+    assert _spilled(path) == 0
+    assert len(store) == 1
+    # Expirada também não volta se o usuário reaparece
+    assert store.get_messages("u0") == [{"role": "system", "content": "sistema"}]
+
+
+def test_sessao_ociosa_nao_vai_para_o_disco(tmp_path):
+    path = str(tmp_path / "spill.db")
+    store = ConversationHistoryStore("sistema", idle_ttl=0.1, spill_path=path)
+    store.append("a", "user", "oi")
+    time.sleep(0.15)
+    store.append("b", "user", "oi")
+    assert "a" not in store
+    assert _spilled(path) == 0
+
+
+def test_sqlite_sessao_ativa_mantem_mensagens_antigas(tmp_path):
+    store = SQLiteHistoryStore("sistema", path=str(tmp_path / "sessoes.db"), idle_ttl=0.3)
+    store.append("u", "user", "primeira")
+    for i in range(3):
+        time.sleep(0.15)
+        store.append("u", "user", f"msg {i}")
+    # A primeira mensagem tem mais que o TTL, mas a conversa nunca ficou ociosa
+    assert [m["content"] for m in store.get_messages("u")[1:]] == ["primeira", "msg 0", "msg 1", "msg 2"]
+
+
+def test_sqlite_sessao_ociosa_expira_inteira(tmp_path):
+    path = str(tmp_path / "sessoes.db")
+    store = SQLiteHistoryStore("sistema", path=path, idle_ttl=0.2)
+    store.append("u", "user", "antiga")
+    time.sleep(0.3)
+    assert store.get_messages("u")[1:] == []
+    store.append("outro", "user", "oi")
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT COUNT(*) FROM messages WHERE user_id = 'u'").fetchone()[0] == 0
+        assert db.execute("SELECT COUNT(*) FROM sessions WHERE user_id = 'u'").fetchone()[0] == 0
+
+
+def test_sqlite_conversa_nova_apos_expirar_nao_herda_mensagens(tmp_path):
+    store = SQLiteHistoryStore("sistema", path=str(tmp_path / "sessoes.db"), idle_ttl=0.2)
+    store._last_sweep = float("inf")  # sem varredura: só a checagem na gravação
+    store.append("u", "user", "antiga")
+    time.sleep(0.3)
+    store.append("u", "user", "nova")
+    assert [m["content"] for m in store.get_messages("u")[1:]] == ["nova"]
@@ -0,0 +1,54 @@
+import pytest
+
+from rag.ingest_manifest import IngestManifest, sync_document
+
+
+class _Manager:
+    """Store falsa síncrona: `timeout=True` simula indexação que não termina no prazo."""
+
+    store_name = "fileSearchStores/teste"
+
+    def __init__(self):
+        self.docs = {}
+        self.deleted = []
+        self.last_document_name = "anterior"
+        self.timeout = False
+
+    def list_documents(self):
+        return [{"name": name, "display_name": display} for name, display in self.docs.items()]
+
+    def upload_file(self, path, display_name):
+        self.last_document_name = None
+        name = f"{self.store_name}/documents/{len(self.docs) + len(self.deleted)}"
+        self.docs[name] = display_name
+        if self.timeout:
+            raise TimeoutError("indexação não terminou")
+        self.last_document_name = name
+
+    def delete_document(self, name):
+        self.deleted.append(name)
+        self.docs.pop(name, None)
+
+
+def test_timeout_nao_marca_o_arquivo_como_indexado(tmp_path):
+    pdf = tmp_path / "fichas.pdf"
+    pdf.write_bytes(b"v1")
+    manifest = IngestManifest(str(tmp_path / "manifest.json"))
+    manager = _Manager()
+    assert sync_document(manager, str(pdf), manifest=manifest)
+    first = manifest.get(manager.store_name, "fichas.pdf")["document"]
+
+    pdf.write_bytes(b"v2")
+    manager.timeout = True
+    with pytest.raises(TimeoutError):
+        sync_document(manager, str(pdf), manifest=manifest)
+    entry = IngestManifest(manifest.path).get(manager.store_name, "fichas.pdf")
+    # O documento antigo continua valendo: nada foi apagado e o sha é o anterior
+    assert entry["document"] == first and "pendente" in entry and manager.deleted == []
+
+    # Próxima execução reenvia e apaga a versão antiga e a órfã do timeout
+    manager.timeout = False
+    assert sync_document(manager, str(pdf), manifest=manifest)
+    entry = manifest.get(manager.store_name, "fichas.pdf")
+    assert list(manager.docs) == [entry["document"]] and "pendente" not in entry
+    assert len(manager.deleted) == 2
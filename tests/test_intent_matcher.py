@@ -0,0 +1,30 @@
+import pytest
+
+from intent_matcher import INTENT_MATCHER
+
+
+# Mensagens que a checagem por substring original já reconhecia, inclusive no plural
+@pytest.mark.parametrize("message, label", [
+    ("quais câmeras tem o s24", "pergunta_tecnica"),
+    ("baterias dos modelos", "pergunta_tecnica"),
+    ("preços do iphone", "pergunta_tecnica"),
+    ("compare s24 e s25", "pergunta_tecnica"),
+    ("diferenças entre eles", "pergunta_tecnica"),
+    ("memórias disponíveis", "pergunta_tecnica"),
+    ("telas maiores", "pergunta_tecnica"),
+    ("valores do a54", "pergunta_tecnica"),
+    ("processadores mais rápidos", "pergunta_tecnica"),
+    ("quais os melhores", "pergunta_tecnica"),
+    ("manda as fotos do s24", "pedido_foto"),
+    ("tem e-sim?", "pergunta_dual_sim"),
+    ("quais os mais vendidos", "pergunta_vendas"),
+    ("aceita pagamento por aproximação?", "pergunta_nfc"),
+])
+def test_recall_das_palavras_chave(message, label):
+    assert label in INTENT_MATCHER.labels(message)
+
+
+def test_palavra_inteira_evita_falso_positivo():
+    # Na checagem por substring, "oi" dentro de "noivo" virava cumprimento e "ram" casava com "programa"
+    assert INTENT_MATCHER.labels("meu noivo quer trocar") == set()
+    assert INTENT_MATCHER.labels("qual programa de fidelidade") == set()
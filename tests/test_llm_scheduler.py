@@ -0,0 +1,94 @@
+import time
+import threading
+
+import pytest
+
+from rag.llm_scheduler import LLMScheduler, SchedulerBusy, request_context
+
+
+def _acquire_all(sched, n, provider="gemini", hold=0.0):
+    waits = [None] * n
+
+    def _one(i):
+        waits[i] = sched.acquire(provider)
+        time.sleep(hold)
+        sched.release(provider)
+
+    threads = [threading.Thread(target=_one, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    return waits
+
+
+def test_todos_seguem_juntos_quando_a_pausa_de_cota_acaba():
+    sched = LLMScheduler({"gemini": 6000}, max_concurrency=8, queue_timeout=5)
+    sched.buckets["gemini"].capacity = 10
+    sched.buckets["gemini"].penalize(0.3)
+    waits = {}
+
+    def _call(tag, is_group, size):
+        with request_context(is_group=is_group, message_size=size):
+            waits[tag] = sched.acquire("gemini")
+        time.sleep(0.5)
+        sched.release("gemini")
+
+    # Chegam na ordem inversa da prioridade: quem acorda primeiro não é o primeiro da fila
+    specs = [("grupo_longa", True, 500), ("grupo_curta", True, 10), ("direta_longa", False, 500), ("direta_curta", False, 10)]
+    threads = [threading.Thread(target=_call, args=spec) for spec in specs]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    # Fichas e vagas sobrando: ninguém espera além da pausa nem pela chamada da frente
+    assert max(waits.values()) < 0.45, waits
+
+
+def test_vaga_liberada_acorda_o_proximo_sem_esperar_o_intervalo():
+    sched = LLMScheduler({"gemini": 6000}, max_concurrency=1, queue_timeout=5)
+    sched.buckets["gemini"].capacity = 10
+    sched.buckets["gemini"].tokens = 10
+    t0 = time.monotonic()
+    _acquire_all(sched, 4, hold=0.05)
+    assert time.monotonic() - t0 < 0.6
+
+
+def test_conversa_direta_passa_na_frente_de_grupo():
+    sched = LLMScheduler({"gemini": 6000}, max_concurrency=1, queue_timeout=5)
+    sched.acquire("gemini")
+    order = []
+
+    def _call(is_group, tag):
+        with request_context(is_group=is_group):
+            sched.acquire("gemini")
+        order.append(tag)
+        sched.release("gemini")
+
+    group = threading.Thread(target=_call, args=(True, "grupo"))
+    group.start()
+    time.sleep(0.05)
+    direct = threading.Thread(target=_call, args=(False, "direta"))
+    direct.start()
+    time.sleep(0.05)
+    sched.release("gemini")
+    group.join(2)
+    direct.join(2)
+    assert order == ["direta", "grupo"]
+
+
+def test_fila_cheia_e_espera_longa_levantam_scheduler_busy():
+    sched = LLMScheduler({"gemini": 6000}, max_concurrency=1, max_queue=1, queue_timeout=0.1)
+    sched.acquire("gemini")
+    with pytest.raises(SchedulerBusy):
+        sched.acquire("gemini")
+    assert sched.snapshot()["expiradas"] == 1
+    sched.release("gemini")
+
+
+def test_erro_de_cota_pausa_o_provedor():
+    sched = LLMScheduler({"gemini": 6000}, queue_timeout=5)
+    sched.acquire("gemini")
+    sched.release("gemini", Exception("429 RESOURCE_EXHAUSTED retry in 0.2s"))
+    assert sched.acquire("gemini") >= 0.15
+    sched.release("gemini")
@@ -0,0 +1,122 @@
+import time
+import threading
+
+from message_coalescer import MessageCoalescer
+
+
+def _job(body, sender="5511@c.us"):
+    return {"ts": "agora", "sender_id": sender, "actual_sender": sender, "message_body": body}
+
+
+class _Dispatch:
+    def __init__(self, result=True):
+        self.result = result
+        self.jobs = []
+        self.event = threading.Event()
+
+    def __call__(self, job):
+        self.jobs.append(job)
+        self.event.set()
+        return self.result
+
+    def next(self):
+        assert self.event.wait(2)
+        self.event.clear()
+        return self.jobs[-1]
+
+
+def test_mensagens_em_rajada_viram_um_lote():
+    dispatch = _Dispatch()
+    c = MessageCoalescer(dispatch, window_ms=30)
+    c.add(_job("oi"))
+    c.add(_job("tem o S24?"))
+    job = dispatch.next()
+    assert job["message_body"] == "oi\ntem o S24?"
+    assert job["coalesced"] == 2
+    assert job["claim"]() is True
+    assert c.snapshot()["remetentes_ativos"] == 0
+
+
+def test_lote_descartado_nao_volta_no_proximo():
+    dispatch = _Dispatch(result=False)
+    c = MessageCoalescer(dispatch, window_ms=20)
+    c.add(_job("primeira"))
+    dispatch.next()
+    assert c.snapshot()["remetentes_ativos"] == 0
+    dispatch.result = True
+    c.add(_job("segunda"))
+    assert dispatch.next()["message_body"] == "segunda"
+
+
+def test_mensagem_nova_substitui_resposta_ainda_nao_enviada():
+    dispatch = _Dispatch()
+    c = MessageCoalescer(dispatch, window_ms=20)
+    c.add(_job("primeira"))
+    first = dispatch.next()
+    c.add(_job("segunda"))
+    assert first["claim"]() is False
+    second = dispatch.next()
+    assert second["message_body"] == "primeira\nsegunda"
+    assert second["claim"]() is True
+
+
+def test_resposta_ja_iniciada_mantem_o_lote():
+    dispatch = _Dispatch()
+    c = MessageCoalescer(dispatch, window_ms=50)
+    c.add(_job("primeira"))
+    first = dispatch.next()
+    c.add(_job("segunda"))
+    # O primeiro pedaço sai antes da janela da segunda fechar
+    assert first["claim"](started=True) is True
+    second = dispatch.next()
+    assert second["message_body"] == "segunda"
+
+
+def test_resposta_iniciada_depois_do_lote_novo_sair_e_recusada():
+    dispatch = _Dispatch()
+    c = MessageCoalescer(dispatch, window_ms=20)
+    c.add(_job("primeira"))
+    first = dispatch.next()
+    c.add(_job("segunda"))
+    dispatch.next()
+    time.sleep(0.01)
+    assert first["claim"](started=True) is False
+
+
+def test_release_sem_claim_libera_o_remetente():
+    dispatch = _Dispatch()
+    c = MessageCoalescer(dispatch, window_ms=20)
+    c.add(_job("oi"))
+    dispatch.next()["release"]()
+    assert c.snapshot()["remetentes_ativos"] == 0
+    # A próxima mensagem sai sozinha, sem a já tratada
+    c.add(_job("tem o S25?"))
+    job = dispatch.next()
+    assert job["message_body"] == "tem o S25?" and c.snapshot()["substituidas"] == 0
+
+
+def test_release_depois_de_substituido_nao_mexe_no_lote_novo():
+    dispatch = _Dispatch()
+    c = MessageCoalescer(dispatch, window_ms=20)
+    c.add(_job("oi"))
+    old = dispatch.next()
+    c.add(_job("tem o S25?"))
+    new = dispatch.next()
+    old["release"]()
+    assert new["claim"]() is True
+
+
+def test_traces_das_mensagens_agrupadas_sao_fechados():
+    from tracing import Trace
+
+    dispatch = _Dispatch()
+    c = MessageCoalescer(dispatch, window_ms=30)
+    first, second = _job("oi"), _job("tem o S24?")
+    first["trace"], second["trace"] = Trace(), Trace()
+    c.add(first)
+    c.add(second)
+    job = dispatch.next()
+    assert job["trace"] is second["trace"] and second["trace"].duration is None
+    assert first["trace"].duration is not None
+    assert first["trace"].attrs == {"desfecho": "agrupada", "agrupada_em": second["trace"].trace_id}
+    assert second["trace"].attrs["traces_agrupados"] == [first["trace"].trace_id]
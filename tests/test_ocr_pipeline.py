@@ -0,0 +1,68 @@
+import io
+import os
+import threading
+
+import pytest
+
+import ocr_pipeline
+from ocr_pipeline import OCRPipeline, OCRRejected
+
+
+def _png(color=0) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("L", (40, 20), color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _die(*args):
+    # Simula o processo filho morrendo no meio do OCR (OOM, segfault do tesseract)
+    os._exit(1)
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    # Sem tesseract no ambiente de teste: o pool (fork) herda o stub
+    pytesseract = pytest.importorskip("pytesseract")
+    monkeypatch.setattr(pytesseract, "image_to_string", lambda img, lang=None: "texto da imagem")
+    p = OCRPipeline(workers=1, max_queue=4, max_bytes=100_000, cache_size=8)
+    yield p
+    p.shutdown()
+
+
+def _run(pipeline, data, timeout=10):
+    done = threading.Event()
+    out = {}
+    pipeline.submit(data, lambda r: (out.update(r), done.set()))
+    assert done.wait(timeout)
+    return out
+
+
+def test_segunda_imagem_igual_vem_do_cache(pipeline):
+    first = _run(pipeline, _png())
+    assert first["texto"] == "texto da imagem" and first["cache"] is False
+    second = _run(pipeline, _png())
+    assert second["cache"] is True and second["sha256"] == first["sha256"]
+    assert pipeline.stats["processadas"] == 1 and pipeline.stats["cache_hits"] == 1
+
+
+def test_imagem_grande_demais_e_recusada(pipeline):
+    with pytest.raises(OCRRejected):
+        pipeline.submit(b"x" * 100_001, lambda r: None)
+    assert pipeline.stats["rejeitadas"] == 1
+
+
+def test_bytes_invalidos_viram_falha_sem_cache(pipeline):
+    result = _run(pipeline, b"isto nao e uma imagem")
+    assert result["texto"].startswith("Falha ao processar imagem")
+    assert pipeline.stats["falhas"] == 1 and pipeline.snapshot()["cache_entradas"] == 0
+
+
+def test_pool_quebrado_e_recriado(pipeline, monkeypatch):
+    with monkeypatch.context() as m:
+        m.setattr(ocr_pipeline, "_ocr_worker", _die)
+        broken = _run(pipeline, _png(255))
+    assert broken["texto"].startswith("Falha ao processar imagem")
+    assert pipeline.stats["pools_recriados"] == 1
+    # O próximo OCR sobe um pool novo em vez de falhar para sempre
+    assert _run(pipeline, _png(255))["texto"] == "texto da imagem"
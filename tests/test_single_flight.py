@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from rag.single_flight import SingleFlight
+
+
+def test_chamadas_concorrentes_executam_uma_vez():
+    sf = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return "resposta"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(sf.do("k", slow)))
+    leader.start()
+    started.wait(1)
+    followers = [threading.Thread(target=lambda: results.append(sf.do("k", slow))) for _ in range(4)]
+    for t in followers:
+        t.start()
+    for t in [leader] + followers:
+        t.join(2)
+    assert calls == [1] and results == ["resposta"] * 5
+    assert sf.stats()["coalescidas"] == 4 and sf.stats()["em_andamento"] == 0
+
+
+def test_excecao_chega_a_todos_e_a_chave_e_liberada():
+    sf = SingleFlight()
+    with pytest.raises(ValueError):
+        sf.do("k", lambda: (_ for _ in ()).throw(ValueError("falhou")))
+    assert sf.do("k", lambda: 1) == 1
+    assert sf.stats()["execucoes"] == 2
+
+
+def test_versao_assincrona_compartilha_a_chamada():
+    sf = SingleFlight()
+    calls = []
+
+    async def query():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(sf.do_async("k", query) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["ok"] * 3 and calls == [1]
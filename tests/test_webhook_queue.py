@@ -0,0 +1,88 @@
+import time
+import threading
+
+from webhook_queue import WebhookWorkerPool, _ReplyGate
+
+
+def _wait_until(cond, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_resposta_depois_do_aviso_de_timeout_e_suprimida():
+    release = threading.Event()
+    allowed = []
+    notices = []
+
+    def handler(job):
+        release.wait(5)
+        allowed.append(job["may_reply"]())
+
+    pool = WebhookWorkerPool(handler, workers=1, max_queue=4, job_timeout=0.1, on_timeout=notices.append)
+    pool.start()
+    try:
+        assert pool.submit({"actual_sender": "a"})
+        assert _wait_until(lambda: notices)
+        release.set()
+        assert _wait_until(lambda: allowed)
+        assert allowed == [False]
+        assert pool.snapshot()["timeouts"] == 1
+    finally:
+        pool.stop()
+
+
+def test_sem_aviso_de_timeout_quando_a_resposta_ja_comecou():
+    release = threading.Event()
+    notices = []
+
+    def handler(job):
+        assert job["may_reply"]()
+        release.wait(5)
+
+    pool = WebhookWorkerPool(handler, workers=1, max_queue=4, job_timeout=0.1, on_timeout=notices.append)
+    pool.start()
+    try:
+        pool.submit({"actual_sender": "a"})
+        assert _wait_until(lambda: pool.snapshot()["timeouts"] == 1)
+        time.sleep(0.05)
+        assert notices == []
+    finally:
+        release.set()
+        pool.stop()
+
+
+def test_jobs_travados_nao_furam_o_limite_da_fila():
+    release = threading.Event()
+    started = []
+
+    def handler(job):
+        started.append(job["n"])
+        release.wait(5)
+
+    # 1 worker: 2 vagas de runner; a terceira mensagem espera na fila e as seguintes são recusadas
+    pool = WebhookWorkerPool(handler, workers=1, max_queue=1, job_timeout=0.05)
+    pool.start()
+    try:
+        accepted = 0
+        for n in range(6):
+            accepted += pool.submit({"n": n, "actual_sender": "a"})
+            time.sleep(0.15)
+        assert started == [0, 1]
+        assert accepted == 4
+        assert pool.snapshot()["rejeitados"] == 2
+    finally:
+        release.set()
+        pool.stop()
+
+
+def test_job_descartado_sem_rodar_e_liberado():
+    released = []
+    pool = WebhookWorkerPool(lambda job: None, workers=1, job_timeout=0.0)
+    pool._slots.acquire()
+    pool._start({"release": lambda: released.append(1)}, deadline=0.0, gate=_ReplyGate())
+    assert released == [1] and pool.stats["descartados"] == 1
+    pool.stop()
@@ -0,0 +1,150 @@
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from metrics import METRICS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_VALID_ID = re.compile(r"[A-Za-z0-9_.-]{1,64}")
+
+# Trace da mensagem em processamento; segue para o pool do hedge, o loop assíncrono e o outbox via contexto
+_current = contextvars.ContextVar("trace", default=None)
+
+
+class Trace:
+    """Linha do tempo de uma mensagem: um id e os spans (etapa, início, duração) registrados por qualquer thread."""
+
+    def __init__(self, trace_id: str | None = None, **attrs):
+        # Id recebido de fora (ex.: cabeçalho X-Trace-Id do Node) só é aceito se for curto e sem caracteres estranhos
+        self.trace_id = trace_id if trace_id and _VALID_ID.fullmatch(trace_id) else uuid.uuid4().hex[:16]
+        self.started_at = datetime.now()
+        self.t0 = time.perf_counter()
+        self.attrs = attrs
+        self.spans = []
+        self.duration = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, duration: float, attrs: dict) -> None:
+        with self._lock:
+            if self.duration is None:
+                self.spans.append((name, start - self.t0, duration, attrs))
+
+    def set(self, **attrs) -> None:
+        with self._lock:
+            self.attrs.update(attrs)
+
+    def finish(self, **attrs) -> None:
+        """Fecha o trace (só a primeira chamada conta); spans posteriores são ignorados."""
+        with self._lock:
+            if self.duration is not None:
+                return
+            self.attrs.update(attrs)
+            self.duration = time.perf_counter() - self.t0
+        TRACER.finished(self)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s[1])
+            return {
+                "trace_id": self.trace_id,
+                "inicio": self.started_at.isoformat(),
+                "duracao_ms": round(self.duration * 1000, 1) if self.duration is not None else None,
+                "atributos": dict(self.attrs),
+                "spans": [
+                    {"nome": name, "inicio_ms": round(start * 1000, 1), "duracao_ms": round(duration * 1000, 1), **attrs}
+                    for name, start, duration, attrs in spans
+                ],
+            }
+
+
+class Tracer:
+    """Guarda os traces recentes e grava os lentos em JSONL.
+
+    Variáveis: SLOW_REQUEST_MS (padrão 10000), SLOW_REQUEST_LOG
+    (padrão slow_requests.jsonl) e TRACE_KEEP (traces recentes em memória).
+    """
+
+    def __init__(self):
+        self.slow_threshold = float(os.getenv("SLOW_REQUEST_MS", "10000")) / 1000
+        self.slow_log = os.getenv("SLOW_REQUEST_LOG", os.path.join(BASE_DIR, "slow_requests.jsonl"))
+        self.keep = int(os.getenv("TRACE_KEEP", "200"))
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self.slow_count = 0
+
+    def finished(self, trace: Trace) -> None:
+        with self._lock:
+            self._recent[trace.trace_id] = trace
+            while len(self._recent) > self.keep:
+                self._recent.popitem(last=False)
+        if trace.duration >= self.slow_threshold:
+            self._write_slow(trace)
+
+    def _write_slow(self, trace: Trace) -> None:
+        data = trace.to_dict()
+        top = sorted(data["spans"], key=lambda s: s["duracao_ms"], reverse=True)[:3]
+        resumo = ", ".join(f"{s['nome']} {s['duracao_ms']:.0f} ms" for s in top)
+        print(f"🐢 Requisição lenta {trace.trace_id}: {data['duracao_ms']:.0f} ms ({resumo})", file=sys.stderr)
+        try:
+            with self._lock:
+                self.slow_count += 1
+                with open(self.slow_log, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(data, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Falha ao gravar o log de requisições lentas: {e}", file=sys.stderr)
+
+    def get(self, trace_id: str) -> Trace | None:
+        with self._lock:
+            return self._recent.get(trace_id)
+
+    def recent(self, limit: int = 50) -> list[dict]:
+        with self._lock:
+            traces = list(self._recent.values())[-limit:]
+        return [
+            {"trace_id": t.trace_id, "inicio": t.started_at.isoformat(), "duracao_ms": round(t.duration * 1000, 1), **t.attrs}
+            for t in reversed(traces)
+        ]
+
+
+TRACER = Tracer()
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+@contextmanager
+def use_trace(trace: Trace | None):
+    """Torna `trace` o trace atual dentro do bloco."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def record(name: str, start: float, duration: float, trace: Trace | None = None, **attrs) -> None:
+    """Registra uma etapa já medida (início em perf_counter) no trace e no histograma de /metrics."""
+    METRICS.stage(name, duration)
+    trace = trace or _current.get()
+    if trace is not None:
+        trace.add(name, start, duration, attrs)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Mede o bloco como um span do trace atual e como etapa em /metrics."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, t0, time.perf_counter() - t0, **attrs)
@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import logging
+from logging.handlers import RotatingFileHandler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _describe_bytes(raw: bytes, mimetype: str | None = None) -> dict:
+    return {"sha256": hashlib.sha256(raw).hexdigest(), "bytes": len(raw), "mimetype": mimetype}
+
+
+def _describe_file(fh, mimetype: str | None = None) -> dict:
+    digest = hashlib.sha256()
+    size = 0
+    fh.seek(0)
+    for chunk in iter(lambda: fh.read(64 * 1024), b""):
+        digest.update(chunk)
+        size += len(chunk)
+    fh.seek(0)
+    return {"sha256": digest.hexdigest(), "bytes": size, "mimetype": mimetype}
+
+
+class TrafficCapture:
+    """Grava o tráfego do webhook em JSONL com rotação, para reproduzir depois com scripts/replay_capture.py.
+
+    Cada linha é um evento: "entrada" (payload recebido, com a mídia trocada
+    pelo SHA-256 e pelo tamanho) ou "saida" (resposta enviada ao Node), ambos
+    com o horário e o trace_id que os liga. Desligado por padrão
+    (CAPTURE_TRAFFIC=1 liga); o arquivo contém números de telefone e o texto
+    das conversas.
+    """
+
+    def __init__(self, path: str | None = None, max_mb: float | None = None, backups: int | None = None, enabled: bool | None = None):
+        self.enabled = enabled if enabled is not None else os.getenv("CAPTURE_TRAFFIC", "0").lower() in ("1", "true", "yes")
+        self.path = path or os.getenv("CAPTURE_PATH", os.path.join(BASE_DIR, "captures", "webhook.jsonl"))
+        self.max_bytes = int(float(max_mb if max_mb is not None else os.getenv("CAPTURE_MAX_MB", "50")) * 1024 * 1024)
+        self.backups = int(backups if backups is not None else os.getenv("CAPTURE_BACKUPS", "10"))
+        self.stats = {"entradas": 0, "saidas": 0, "falhas": 0}
+        self._handler = None
+        if self.enabled:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            # O RotatingFileHandler já serializa as escritas e faz a rotação (webhook.jsonl.1, .2, ...)
+            self._handler = RotatingFileHandler(self.path, maxBytes=self.max_bytes, backupCount=self.backups, encoding="utf-8")
+            self._handler.setFormatter(logging.Formatter("%(message)s"))
+            print(f"ℹ️  Captura de tráfego ativa em {self.path} ({self.max_bytes / 1048576:g} MB x {self.backups + 1} arquivos)", file=sys.stderr)
+
+    def _write(self, event: dict) -> None:
+        try:
+            self._handler.handle(logging.makeLogRecord({"msg": json.dumps(event, ensure_ascii=False, default=str)}))
+            self.stats["entradas" if event["evento"] == "entrada" else "saidas"] += 1
+        except Exception as e:
+            self.stats["falhas"] += 1
+            print(f"⚠️ Falha ao capturar tráfego: {e}", file=sys.stderr)
+
+    def inbound(self, trace_id: str, route: str, data: dict, media=None) -> None:
+        """Registra um payload recebido; `media` é o arquivo da rota binária, se houver."""
+        if not self.enabled:
+            return
+        payload = dict(data)
+        media_b64 = payload.pop("media_base64", None)
+        try:
+            if media_b64:
+                header, _, b64 = str(media_b64).partition(",")
+                payload["media"] = _describe_bytes(base64.b64decode(b64 or header), payload.get("mimetype"))
+            elif media is not None:
+                payload["media"] = _describe_file(media, payload.get("mimetype"))
+        except Exception as e:
+            payload["media"] = {"erro": str(e)}
+        self._write({"evento": "entrada", "t": time.time(), "trace_id": trace_id, "rota": route, "payload": payload})
+
+    def outbound(self, trace_id: str | None, payload: dict, ok: bool) -> None:
+        if not self.enabled:
+            return
+        self._write({"evento": "saida", "t": time.time(), "trace_id": trace_id, "ok": ok, "payload": payload})
+
+    def snapshot(self) -> dict | None:
+        if not self.enabled:
+            return None
+        return {"arquivo": self.path, **self.stats}
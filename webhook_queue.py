@@ -0,0 +1,155 @@
+import sys
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+
+
+class _ReplyGate:
+    """Decide uma única vez quem responde ao cliente: o handler ou o aviso de timeout."""
+
+    def __init__(self):
+        self._owner = None
+        self._lock = threading.Lock()
+
+    @property
+    def owner(self) -> str | None:
+        with self._lock:
+            return self._owner
+
+    def take(self, party: str) -> bool:
+        with self._lock:
+            if self._owner is None:
+                self._owner = party
+            return self._owner == party
+
+
+class WebhookWorkerPool:
+    """Fila de jobs em memória com um pool fixo de workers.
+
+    O webhook só enfileira a mensagem e responde 202; os workers executam o
+    handler (agente + envio ao Node.js) respeitando um timeout por job.
+    O job recebe `may_reply()`: o handler deve chamá-la antes de enviar algo
+    ao cliente e desistir se ela retornar False (o aviso de timeout já saiu).
+    Jobs descartados sem rodar têm `release()` chamado, se existir.
+    """
+
+    def __init__(self, handler, workers: int = 4, max_queue: int = 100, job_timeout: float = 60.0, on_timeout=None):
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.job_timeout = float(job_timeout)
+        self.on_timeout = on_timeout
+        self.jobs = queue.Queue(maxsize=max(1, int(max_queue)))
+        # Executor separado: um job travado ocupa um runner, não o worker que consome a fila.
+        # As vagas limitam os runners; com todas ocupadas por jobs travados, os workers
+        # param de consumir e a fila (WEBHOOK_QUEUE_SIZE) volta a recusar mensagens
+        self._runner = ThreadPoolExecutor(max_workers=self.workers * 2, thread_name_prefix="webhook-job")
+        self._slots = threading.BoundedSemaphore(self.workers * 2)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self.stats = {"enfileirados": 0, "rejeitados": 0, "concluidos": 0, "falhas": 0, "timeouts": 0, "descartados": 0}
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        for i in range(self.workers):
+            t = threading.Thread(target=self._loop, name=f"webhook-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self) -> None:
+        self._stopping.set()
+        for _ in self._threads:
+            try:
+                self.jobs.put_nowait(None)
+            except queue.Full:
+                pass
+        self._runner.shutdown(wait=False)
+
+    def submit(self, job: dict) -> bool:
+        """Enfileira o job. Retorna False se a fila estiver cheia."""
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            self._count("rejeitados")
+            return False
+        self._count("enfileirados")
+        return True
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            data = dict(self.stats)
+        data.update({
+            "fila": self.jobs.qsize(),
+            "capacidade": self.jobs.maxsize,
+            "workers": self.workers,
+            "job_timeout": self.job_timeout,
+        })
+        return data
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def _loop(self) -> None:
+        while not self._stopping.is_set():
+            job = self.jobs.get()
+            if job is None:
+                break
+            try:
+                self._run(job)
+            finally:
+                self.jobs.task_done()
+
+    def _start(self, job: dict, deadline: float, gate: _ReplyGate) -> None:
+        try:
+            # Job que passou do prazo antes de começar (ou cujo aviso de timeout já saiu) não roda
+            if time.monotonic() >= deadline or gate.owner == "timeout":
+                self._count("descartados")
+                self._release(job)
+                return
+            self.handler(job)
+        finally:
+            self._slots.release()
+
+    @staticmethod
+    def _release(job: dict) -> None:
+        release = job.get("release")
+        if release:
+            try:
+                release()
+            except Exception as e:
+                print(f"⚠️ Falha ao liberar job descartado: {e}", file=sys.stderr)
+
+    def _run(self, job: dict) -> None:
+        ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        gate = _ReplyGate()
+        job["may_reply"] = lambda: gate.take("handler")
+        self._slots.acquire()
+        deadline = time.monotonic() + self.job_timeout
+        try:
+            future = self._runner.submit(self._start, job, deadline, gate)
+        except RuntimeError:
+            # Pool parado enquanto o worker esperava uma vaga
+            self._slots.release()
+            self._release(job)
+            return
+        try:
+            future.result(timeout=self.job_timeout)
+            self._count("concluidos")
+        except FutureTimeout:
+            self._count("timeouts")
+            print(f"[{ts}] ⏱️ Job excedeu {self.job_timeout:g}s (remetente={job.get('actual_sender')})", file=sys.stderr)
+            if not gate.take("timeout"):
+                # A resposta já começou a sair; o aviso só confundiria o cliente
+                return
+            if self.on_timeout:
+                try:
+                    self.on_timeout(job)
+                except Exception as e:
+                    print(f"[{ts}] ⚠️ Falha ao tratar timeout: {e}", file=sys.stderr)
+        except Exception as e:
+            self._count("falhas")
+            print(f"[{ts}] 🚨 Erro no worker do webhook: {e}", file=sys.stderr)
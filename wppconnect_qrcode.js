@@ -7,6 +7,8 @@ const { exec } = require('child_process');
 // --- Configuração --- 
 const PORT = 3000;
 const FLASK_WEBHOOK_URL = 'http://localhost:5001/webhook';
+// 'binary' envia imagens cruas para /webhook/media em vez de base64 dentro do JSON
+const MEDIA_UPLOAD_MODE = process.env.MEDIA_UPLOAD_MODE || 'base64';
 const SESSION_NAME = 'loja-celulares';
 
 const app = express();
@@ -25,7 +27,8 @@ app.post('/process-response', async (req, res) => {
     }
 
     const responsePayload = req.body;
-    console.log('\n--- RESPOSTA RECEBIDA DO PYTHON ---');
+    const traceId = req.get('X-Trace-Id');
+    console.log(`\n--- RESPOSTA RECEBIDA DO PYTHON${traceId ? ` (trace ${traceId})` : ''} ---`);
     console.log(JSON.stringify(responsePayload, null, 2));
 
     const { tipo, recipient_phone } = responsePayload;
@@ -185,16 +188,34 @@ async function startWppClient() {
                     mentionedJidList: message.mentionedJidList || [],
                     isBotMentioned: message.mentionedJidList && botId ? message.mentionedJidList.includes(botId) : false
                 };
+                let mediaBuffer = null;
                 if (message.isMedia && (message.type === 'image' || (message.mimetype && message.mimetype.startsWith('image')))) {
                     try {
                         const buffer = await wppClient.decryptFile(message);
-                        payload.media_base64 = `data:${message.mimetype || 'image/jpeg'};base64,${buffer.toString('base64')}`;
                         payload.mimetype = message.mimetype || 'image/jpeg';
+                        if (MEDIA_UPLOAD_MODE === 'binary') {
+                            mediaBuffer = buffer;
+                        } else {
+                            payload.media_base64 = `data:${payload.mimetype};base64,${buffer.toString('base64')}`;
+                        }
                     } catch (e) {
                         console.warn('⚠️ Falha ao obter mídia para OCR:', e.message);
                     }
                 }
                 
+                if (mediaBuffer) {
+                    // Corpo binário; metadados no cabeçalho para não copiar a imagem
+                    await axios.post(`${FLASK_WEBHOOK_URL}/media`, mediaBuffer, {
+                        headers: {
+                            'Content-Type': payload.mimetype,
+                            'X-Message-Meta': encodeURIComponent(JSON.stringify(payload))
+                        },
+                        maxBodyLength: Infinity
+                    });
+                    console.log(`✓ [${ts}] Mensagem com mídia binária encaminhada para o Flask: ${FLASK_WEBHOOK_URL}/media`);
+                    return;
+                }
+
                 try {
                     await axios.post(FLASK_WEBHOOK_URL, payload, { headers: { 'Content-Type': 'application/json' } });
                     console.log(`✓ [${ts}] Mensagem encaminhada para o Flask: ${FLASK_WEBHOOK_URL}`);